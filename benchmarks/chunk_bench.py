@@ -0,0 +1,159 @@
+"""
+Property checks and a throughput benchmark for the message chunker.
+
+The checks generate random markdown (prose, fenced code in several languages, emoji and CJK text)
+and verify, for both character and byte limits, that every chunk fits the limit, that every chunk
+has balanced fences, that continued code blocks are reopened with their original language, and that
+removing the added fences reproduces the input. Streaming the same text in random deltas must give
+the same chunks. The benchmark compares the chunker with the previous fixed-offset slicing on
+multi-megabyte replies. Run with:
+
+    python benchmarks/chunk_bench.py --cases 500 --sizes 1 4 16
+"""
+import argparse
+import bisect
+import random
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from src.utils.chunking import FENCE_CLOSE, FENCE_PATTERN, iter_chunks
+
+LANGUAGES = ["python", "js", "rust", "", "c++", "bash"]
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "naïve", "café", "😀", "👩‍💻", "漢字", "テスト", "x" * 40]
+
+
+def legacy_chunk_message(message: str, chunk_size: int = 1990) -> List[str]:
+    chunks: List[str] = []
+    open_code_block = False
+    for i in range(0, len(message), chunk_size):
+        chunk = message[i:i + chunk_size]
+        if open_code_block:
+            chunk = "\n```python\n" + chunk
+        if chunk.count("```") % 2 != 0:
+            chunk += "\n```"
+            open_code_block = True
+        else:
+            open_code_block = False
+        chunks.append(chunk)
+    return chunks
+
+
+def random_markdown(rng: random.Random, blocks: int) -> str:
+    parts = []
+    for _ in range(blocks):
+        if rng.random() < 0.3:
+            language = rng.choice(LANGUAGES)
+            lines = ["    " * rng.randint(0, 3) + " ".join(rng.choices(WORDS, k=rng.randint(0, 12)))
+                     for _ in range(rng.randint(1, 60))]
+            parts.append(f"```{language}\n" + "\n".join(lines) + "\n```")
+        else:
+            sentences = [" ".join(rng.choices(WORDS, k=rng.randint(1, 30))) + rng.choice([".", "!", "?", ""])
+                         for _ in range(rng.randint(1, 20))]
+            parts.append(" ".join(sentences))
+    return "\n\n".join(parts)
+
+
+def size(text: str, measure: str) -> int:
+    return len(text) if measure == "chars" else len(text.encode("utf-8"))
+
+
+def block_states(text: str) -> Tuple[List[int], List[Optional[str]]]:
+    """Returns the start of every fence in `text` and the open block's language right after each one."""
+    starts, states, language = [], [], None
+    for match in FENCE_PATTERN.finditer(text):
+        language = match.group(1) if language is None else None
+        starts.append(match.start())
+        states.append(language)
+    return starts, states
+
+
+def check(text: str, limit: int, measure: str, rng: random.Random) -> None:
+    chunks = list(iter_chunks(text, limit, measure))
+
+    deltas, i = [], 0
+    while i < len(text):
+        step = rng.randint(1, 64)
+        deltas.append(text[i:i + step])
+        i += step
+    assert list(iter_chunks(deltas, limit, measure)) == chunks, "streamed chunks differ"
+
+    starts, states = block_states(text)
+
+    def open_block(position: int) -> Optional[str]:
+        index = bisect.bisect_left(starts, position)
+        return states[index - 1] if index else None
+
+    # Each chunk, minus the fences the chunker added, must be the next piece of the original text
+    cursor = 0
+    for chunk in chunks:
+        assert size(chunk, measure) <= limit, f"chunk of {size(chunk, measure)} {measure} over {limit}"
+        assert chunk.strip(), "blank chunk"
+        assert len(FENCE_PATTERN.findall(chunk)) % 2 == 0, "unbalanced fences"
+        while True:
+            body, language = chunk, open_block(cursor)
+            if language is not None and body.startswith(f"```{language}\n"):
+                body = body[len(f"```{language}\n"):]
+            if text.startswith(body, cursor) and open_block(cursor + len(body)) is None:
+                break
+            trimmed = body[:-len(FENCE_CLOSE)]
+            if body.endswith(FENCE_CLOSE) and text.startswith(trimmed, cursor) and open_block(cursor + len(trimmed)) is not None:
+                body = trimmed
+                break
+            # Blank stretches are dropped rather than sent as messages
+            assert cursor < len(text) and text[cursor].isspace(), f"chunk doesn't continue the text: {chunk[:60]!r}"
+            cursor += 1
+        cursor += len(body)
+    assert not text[cursor:].strip(), "text lost at the end"
+
+
+def run_checks(cases: int, seed: int) -> None:
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    for case in range(cases):
+        text = random_markdown(rng, rng.randint(1, 30))
+        for measure, limit in (("chars", rng.choice([120, 500, 1990])), ("bytes", rng.choice([200, 800, 4000]))):
+            check(text, limit, measure, rng)
+    print(f"{cases} random documents x 2 measures passed in {time.perf_counter() - started:.1f}s")
+
+
+def run_benchmark(sizes_mb: List[int], seed: int) -> None:
+    rng = random.Random(seed)
+    print(f"{'size':>8} {'legacy':>10} {'chunker':>10} {'streamed':>10} {'chunks':>8}")
+    for megabytes in sizes_mb:
+        text = ""
+        while len(text) < megabytes * 1_000_000:
+            text += random_markdown(rng, 50) + "\n\n"
+        deltas = [text[i:i + 16] for i in range(0, len(text), 16)]
+
+        started = time.perf_counter()
+        legacy_chunk_message(text)
+        legacy = time.perf_counter() - started
+
+        started = time.perf_counter()
+        chunks = list(iter_chunks(text))
+        whole = time.perf_counter() - started
+
+        started = time.perf_counter()
+        list(iter_chunks(deltas))
+        streamed = time.perf_counter() - started
+
+        print(f"{megabytes:>6}MB {legacy:>9.3f}s {whole:>9.3f}s {streamed:>9.3f}s {len(chunks):>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=300, help="Random documents to check")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 4, 16], help="Benchmark sizes in megabytes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run_checks(args.cases, args.seed)
+    run_benchmark(args.sizes, args.seed)
+
+
+if __name__ == "__main__":
+    main()
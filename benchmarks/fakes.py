@@ -0,0 +1,297 @@
+"""
+Local stand-ins for the services the bots talk to, for benchmarks that must run without network access.
+
+- FakeBedrockRuntime: a bedrock-runtime client with `converse` and `converse_stream`
+- FakeOpenAI / FakeAsyncOpenAI: OpenAI clients with `chat.completions.create`, streaming or not
+- FakeDiscordChannel / FakeDiscordMessage: what `discord_bot.on_message` reads and sends through
+- FakeSlackClient: the Slack Web API methods `slack_bot.respond` calls
+
+The model fakes wait `latency` seconds before the first token, then emit `tokens_per_second`, and report
+usage like the real APIs. Replies echo the prompt's size, so identical prompts get identical replies.
+They also mimic provider prompt caching: Bedrock caches the prefix before each cachePoint block, OpenAI
+any prefix of at least 1024 tokens, and later requests starting with a cached prefix report it as read.
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+WORDS = ["the", "model", "replies", "with", "some", "plausible", "tokens", "about", "it", "and"]
+OPENAI_MIN_CACHED_TOKENS = 1024
+
+
+class FakeModel:
+    def __init__(self, latency: float = 0.2, tokens_per_second: float = 200.0, reply_tokens: int = 60) -> None:
+        """
+        Shared timing and reply generation of the fake model APIs.
+
+        Args:
+            latency (float): Seconds before the first token. Defaults to 0.2.
+            tokens_per_second (float): Generation speed after the first token; 0 emits everything at once.
+            reply_tokens (int): Tokens per reply. Defaults to 60.
+        """
+        self.latency: float = latency
+        self.tokens_per_second: float = tokens_per_second
+        self.reply_tokens: int = reply_tokens
+        self.calls: int = 0
+        self.input_tokens: int = 0
+        self.output_tokens: int = 0
+        self.cache_read_tokens: int = 0
+        self.cache_write_tokens: int = 0
+        self._prefixes: Dict[str, int] = {}  # Cached prompt prefix hash -> its tokens
+        self._lock = threading.Lock()
+
+    def _start(self, prompt_chars: int) -> List[str]:
+        prompt_tokens = max(1, prompt_chars // 4)
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += prompt_tokens
+            self.output_tokens += self.reply_tokens
+        words = itertools.islice(itertools.cycle(WORDS), prompt_chars % len(WORDS), None)
+        return [next(words) + " " for _ in range(self.reply_tokens)]
+
+    def _token_delay(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _prompt_cache(self, parts: List[Tuple[Any, bool]]) -> Dict[str, int]:
+        """
+        Looks up a prompt in the fake prompt cache.
+
+        Args:
+            parts: The prompt's parts in order, each with whether a cache entry may end after it.
+
+        Returns:
+            Dict[str, int]: The tokens read from the longest cached prefix and written for new entries.
+        """
+        read = written = 0
+        hasher = hashlib.sha256()
+        chars = 0
+        with self._lock:
+            for part, cacheable in parts:
+                encoded = json.dumps(part, sort_keys=True)
+                hasher.update(encoded.encode("utf-8"))
+                chars += len(encoded)
+                digest = hasher.hexdigest()
+                if digest in self._prefixes:
+                    read, written = self._prefixes[digest], 0
+                elif cacheable:
+                    self._prefixes[digest] = chars // 4
+                    written = chars // 4 - read
+            self.cache_read_tokens += read
+            self.cache_write_tokens += written
+        return {"read": read, "write": written}
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+        }
+
+
+class FakeBedrockRuntime(FakeModel):
+    """A bedrock-runtime client answering converse and converse_stream locally."""
+
+    @staticmethod
+    def _prompt_chars(kwargs: Dict[str, Any]) -> int:
+        return sum(len(block.get("text", "")) for message in kwargs.get("messages", []) for block in message["content"])
+
+    def _usage(self, kwargs: Dict[str, Any], output_tokens: int) -> Dict[str, int]:
+        # A prefix is cached where a cachePoint block ends it, and found again at any later block boundary
+        blocks = [("system", block) for block in kwargs.get("system", [])]
+        blocks += [(message["role"], block) for message in kwargs.get("messages", []) for block in message["content"]]
+        parts = [
+            (block, i + 1 < len(blocks) and "cachePoint" in blocks[i + 1][1])
+            for i, block in enumerate(blocks) if "cachePoint" not in block[1]
+        ]
+        cache = self._prompt_cache(parts)
+        input_tokens = self._prompt_chars(kwargs) // 4
+        return {
+            "inputTokens": max(0, input_tokens - cache["read"] - cache["write"]),
+            "outputTokens": output_tokens,
+            "cacheReadInputTokens": cache["read"],
+            "cacheWriteInputTokens": cache["write"],
+        }
+
+    def converse(self, **kwargs: Any) -> Dict[str, Any]:
+        tokens = self._start(self._prompt_chars(kwargs))
+        usage = self._usage(kwargs, len(tokens))
+        time.sleep(self.latency + self._token_delay() * len(tokens))
+        return {
+            "output": {"message": {"role": "assistant", "content": [{"text": "".join(tokens)}]}},
+            "stopReason": "end_turn",
+            "usage": usage,
+        }
+
+    def converse_stream(self, **kwargs: Any) -> Dict[str, Any]:
+        tokens = self._start(self._prompt_chars(kwargs))
+        usage = self._usage(kwargs, len(tokens))
+        time.sleep(self.latency)
+
+        def events() -> Iterator[Dict[str, Any]]:
+            yield {"messageStart": {"role": "assistant"}}
+            for token in tokens:
+                time.sleep(self._token_delay())
+                yield {"contentBlockDelta": {"delta": {"text": token}, "contentBlockIndex": 0}}
+            yield {"messageStop": {"stopReason": "end_turn"}}
+            yield {"metadata": {"usage": usage}}
+
+        return {"stream": events()}
+
+
+def _openai_usage(prompt_tokens: int, completion_tokens: int, cached_tokens: int) -> Any:
+    return SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens),
+    )
+
+
+def _completion(text: str, usage: Any) -> Any:
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=text), finish_reason="stop")],
+        usage=usage,
+    )
+
+
+def _chunk(content: Optional[str], usage: Any = None) -> Any:
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=content))] if content is not None else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+def _openai_prompt_chars(kwargs: Dict[str, Any]) -> int:
+    return sum(len(message.get("content") or "") for message in kwargs.get("messages", []))
+
+
+def _openai_cached_tokens(model: FakeModel, kwargs: Dict[str, Any]) -> int:
+    # OpenAI caches prompt prefixes automatically once they are long enough; approximated per message
+    cache = model._prompt_cache([(message, True) for message in kwargs.get("messages", [])])
+    return cache["read"] if cache["read"] >= OPENAI_MIN_CACHED_TOKENS else 0
+
+
+class FakeOpenAI(FakeModel):
+    """A blocking OpenAI client answering chat.completions.create locally."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, stream: bool = False, **kwargs: Any) -> Any:
+        chars = _openai_prompt_chars(kwargs)
+        tokens = self._start(chars)
+        usage = _openai_usage(chars // 4, len(tokens), _openai_cached_tokens(self, kwargs))
+        time.sleep(self.latency)
+        if not stream:
+            time.sleep(self._token_delay() * len(tokens))
+            return _completion("".join(tokens), usage)
+
+        def chunks() -> Iterator[Any]:
+            for token in tokens:
+                time.sleep(self._token_delay())
+                yield _chunk(token)
+            if kwargs.get("stream_options", {}).get("include_usage"):
+                yield _chunk(None, usage)
+
+        return chunks()
+
+
+class FakeAsyncOpenAI(FakeModel):
+    """An asyncio OpenAI client answering chat.completions.create locally."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, stream: bool = False, **kwargs: Any) -> Any:
+        chars = _openai_prompt_chars(kwargs)
+        tokens = self._start(chars)
+        usage = _openai_usage(chars // 4, len(tokens), _openai_cached_tokens(self, kwargs))
+        await asyncio.sleep(self.latency)
+        if not stream:
+            await asyncio.sleep(self._token_delay() * len(tokens))
+            return _completion("".join(tokens), usage)
+
+        async def chunks() -> AsyncIterator[Any]:
+            for token in tokens:
+                await asyncio.sleep(self._token_delay())
+                yield _chunk(token)
+            if kwargs.get("stream_options", {}).get("include_usage"):
+                yield _chunk(None, usage)
+
+        return chunks()
+
+
+class FakeTransport:
+    def __init__(self, latency: float = 0.05) -> None:
+        """
+        Counts and delays the messages a bot posts or edits, like a chat platform's HTTP API.
+
+        Args:
+            latency (float): Seconds per post or edit. Defaults to 0.05.
+        """
+        self.latency: float = latency
+        self.sent: int = 0
+        self.edited: int = 0
+        self.bytes: int = 0
+
+
+class FakeDiscordMessage:
+    """The parts of discord.Message used by discord_bot, for both incoming and sent messages."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, content: str, channel: "FakeDiscordChannel", author: Any = None) -> None:
+        self.id = next(self._ids)
+        self.content = content
+        self.channel = channel
+        self.author = author
+
+    async def edit(self, content: str) -> "FakeDiscordMessage":
+        await asyncio.sleep(self.channel.transport.latency)
+        self.channel.transport.edited += 1
+        self.channel.transport.bytes += len(content.encode("utf-8"))
+        self.content = content
+        return self
+
+
+class FakeDiscordChannel:
+    """A text channel that accepts sends, with a name CHANNEL_CONFIG routes on."""
+
+    _ids = itertools.count(1000)
+
+    def __init__(self, name: str, transport: FakeTransport) -> None:
+        self.id = next(self._ids)
+        self.name = name
+        self.transport = transport
+
+    async def send(self, content: str) -> FakeDiscordMessage:
+        await asyncio.sleep(self.transport.latency)
+        self.transport.sent += 1
+        self.transport.bytes += len(content.encode("utf-8"))
+        return FakeDiscordMessage(content, self)
+
+
+class FakeSlackClient:
+    """An AsyncWebClient stand-in with the chat methods slack_bot.respond uses."""
+
+    def __init__(self, transport: FakeTransport) -> None:
+        self.transport = transport
+        self._ts = itertools.count(1)
+
+    async def chat_postMessage(self, channel: str, text: str, **kwargs: Any) -> Dict[str, Any]:
+        await asyncio.sleep(self.transport.latency)
+        self.transport.sent += 1
+        self.transport.bytes += len(text.encode("utf-8"))
+        return {"ok": True, "channel": channel, "ts": f"{next(self._ts)}.000000"}
+
+    async def chat_update(self, channel: str, ts: str, text: str, **kwargs: Any) -> Dict[str, Any]:
+        await asyncio.sleep(self.transport.latency)
+        self.transport.edited += 1
+        self.transport.bytes += len(text.encode("utf-8"))
+        return {"ok": True, "channel": channel, "ts": ts}
@@ -0,0 +1,210 @@
+"""
+Connection pooling benchmark for the model clients, against a local HTTPS server that answers like
+OpenAI chat completions and Bedrock converse after `--latency` seconds.
+
+OpenAI: `--models` clients take turns sending bursts of `--fanout` concurrent requests, `--gap` seconds
+apart, so each model is idle for a while between its bursts. One pool per model with httpx defaults
+(the old behaviour) is compared with the shared pool from src/utils/transport.py.
+
+Bedrock: `--threads` concurrent converse calls per burst on one client with botocore's default 10-connection
+pool is compared with `bedrock_client_config()`.
+
+The server counts TCP connections; each one is a TLS handshake the client paid for. Needs the openssl
+binary for the certificate (plain HTTP is used without it). Run with:
+
+    python benchmarks/http_pool_bench.py --models 12 --fanout 16 --rounds 24 --gap 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+import boto3
+from botocore.config import Config
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+CHAT_REPLY = json.dumps({
+    "id": "chatcmpl-bench", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "Salem."}}],
+    "usage": {"prompt_tokens": 12, "completion_tokens": 2, "total_tokens": 14},
+}).encode()
+CONVERSE_REPLY = json.dumps({
+    "output": {"message": {"role": "assistant", "content": [{"text": "Salem."}]}},
+    "stopReason": "end_turn", "usage": {"inputTokens": 12, "outputTokens": 2, "totalTokens": 14},
+    "metrics": {"latencyMs": 1},
+}).encode()
+
+
+class FakeServer:
+    def __init__(self, latency: float, ssl_context: Optional[ssl.SSLContext]) -> None:
+        """
+        A minimal HTTP/1.1 keep-alive server on its own thread and event loop.
+        """
+        self.latency = latency
+        self.ssl_context = ssl_context
+        self.connections = 0
+        self.loop = asyncio.new_event_loop()
+        self.server: Any = None
+        ready = threading.Event()
+        threading.Thread(target=self._run, args=(ready,), daemon=True).start()
+        ready.wait()
+
+    @property
+    def url(self) -> str:
+        scheme = "https" if self.ssl_context else "http"
+        return f"{scheme}://localhost:{self.server.sockets[0].getsockname()[1]}"
+
+    def _run(self, ready: threading.Event) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.server = self.loop.run_until_complete(
+            asyncio.start_server(self._handle, "127.0.0.1", 0, ssl=self.ssl_context, backlog=1024)
+        )
+        ready.set()
+        self.loop.run_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                headers = {k.strip().lower(): v.strip() for k, _, v in (line.partition(":") for line in header_lines if line)}
+                await reader.readexactly(int(headers.get("content-length", 0)))
+                await asyncio.sleep(self.latency)
+                body = CONVERSE_REPLY if "/converse" in request_line else CHAT_REPLY
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+
+def make_certificate(directory: Path) -> Optional[ssl.SSLContext]:
+    if shutil.which("openssl") is None:
+        return None
+    cert, key = directory / "cert.pem", directory / "key.pem"
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", str(key), "-out", str(cert),
+         "-days", "1", "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost"],
+        check=True, capture_output=True,
+    )
+    # Trusted by httpx and botocore through the environment, like a corporate CA bundle would be
+    os.environ["SSL_CERT_FILE"] = os.environ["AWS_CA_BUNDLE"] = str(cert)
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+def summarize(name: str, latencies: List[float], connections: int, elapsed: float) -> None:
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(0.99 * (len(ordered) - 1)))]
+    print(f"  {name:<28} {len(latencies)} requests in {elapsed:.2f}s, {connections} connections, "
+          f"p50 {statistics.median(ordered) * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms, mean {statistics.fmean(ordered) * 1000:.1f} ms")
+
+
+async def openai_bursts(clients: List[AsyncOpenAI], fanout: int, rounds: int, gap: float) -> List[float]:
+    latencies: List[float] = []
+
+    async def one(client: AsyncOpenAI) -> None:
+        started = time.perf_counter()
+        await client.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": "Capital of Oregon?"}])
+        latencies.append(time.perf_counter() - started)
+
+    for round_ in range(rounds):
+        client = clients[round_ % len(clients)]
+        await asyncio.gather(*(one(client) for _ in range(fanout)))
+        await asyncio.sleep(gap)
+    return latencies
+
+
+def bench_openai(server: FakeServer, args: argparse.Namespace) -> None:
+    from src.utils.transport import async_openai_client_options, http_pool_stats
+
+    print(f"OpenAI: {args.models} models, bursts of {args.fanout}, {args.rounds} rounds {args.gap}s apart")
+    variants: Dict[str, Callable[[], List[AsyncOpenAI]]] = {
+        "one pool per model": lambda: [
+            AsyncOpenAI(base_url=server.url + "/v1", api_key="bench", http_client=DefaultAsyncHttpxClient())
+            for _ in range(args.models)
+        ],
+        "shared pool": lambda: [
+            AsyncOpenAI(base_url=server.url + "/v1", api_key="bench", **async_openai_client_options())
+            for _ in range(args.models)
+        ],
+    }
+    for name, build in variants.items():
+        clients = build()
+        before = server.connections
+        started = time.perf_counter()
+        latencies = asyncio.run(openai_bursts(clients, args.fanout, args.rounds, args.gap))
+        summarize(name, latencies, server.connections - before, time.perf_counter() - started)
+    print(f"  shared pool stats: {http_pool_stats().get('openai_async')}")
+
+
+def bench_bedrock(server: FakeServer, args: argparse.Namespace) -> None:
+    from src.utils.transport import bedrock_client_config, botocore_pool_stats
+
+    print(f"Bedrock: bursts of {args.threads} concurrent converse calls, {args.rounds} rounds")
+    session = boto3.Session(aws_access_key_id="bench", aws_secret_access_key="bench", region_name="us-east-1")
+    variants = {
+        "default botocore config": Config(retries={"mode": "legacy"}),
+        "bedrock_client_config()": bedrock_client_config(),
+    }
+    for name, config in variants.items():
+        client = session.client("bedrock-runtime", endpoint_url=server.url, config=config)
+        latencies: List[float] = []
+
+        def one(_: int) -> None:
+            started = time.perf_counter()
+            client.converse(modelId="meta.llama3-70b-instruct-v1:0", messages=[{"role": "user", "content": [{"text": "Hi"}]}])
+            latencies.append(time.perf_counter() - started)
+
+        before = server.connections
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            for _ in range(args.rounds):
+                list(executor.map(one, range(args.threads)))
+        summarize(name, latencies, server.connections - before, time.perf_counter() - started)
+        print(f"    pool: {botocore_pool_stats(client)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", type=int, default=12, help="OpenAI clients taking turns")
+    parser.add_argument("--fanout", type=int, default=16, help="Concurrent OpenAI requests per burst")
+    parser.add_argument("--threads", type=int, default=32, help="Concurrent Bedrock requests per burst")
+    parser.add_argument("--rounds", type=int, default=24)
+    parser.add_argument("--gap", type=float, default=0.5, help="Seconds between OpenAI bursts")
+    parser.add_argument("--latency", type=float, default=0.02, help="Server response time in seconds")
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger("urllib3.connectionpool").setLevel(logging.ERROR)  # "Connection pool is full" per request
+
+    with tempfile.TemporaryDirectory() as directory:
+        server = FakeServer(args.latency, make_certificate(Path(directory)))
+        if server.ssl_context is None:
+            print("openssl not found; measuring over plain HTTP, without TLS handshakes")
+        bench_openai(server, args)
+        bench_bedrock(server, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Load test for the async model-call path using stubbed Bedrock and OpenAI clients.
+
+Every stub sleeps for a fixed upstream latency, so throughput should rise roughly linearly with
+concurrency until the executor or event loop saturates. Run with:
+
+    python benchmarks/load_test.py --requests 200 --latency 0.2
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from src.bedrock.aws_bedrock_models import BedrockCompletions
+from src.chatgpt.chatgpt import GPTCompletions
+
+
+class StubBedrockClient:
+    """A blocking stand-in for the boto3 bedrock-runtime client."""
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+
+    def converse(self, **kwargs: Any) -> Dict[str, Any]:
+        time.sleep(self.latency)
+        return {"output": {"message": {"role": "assistant", "content": [{"text": "stub reply"}]}}}
+
+
+class StubAsyncOpenAI:
+    """A non-blocking stand-in for `AsyncOpenAI` exposing `chat.completions.create`."""
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs: Any) -> Any:
+        await asyncio.sleep(self.latency)
+        message = SimpleNamespace(content="stub reply")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def build_models(kind: str, count: int, latency: float, state_dir: Path) -> List[Any]:
+    """
+    Build one model instance per concurrent conversation, all sharing a single stub client.
+
+    Args:
+        kind (str): Either "bedrock" or "openai".
+        count (int): Number of instances to build.
+        latency (float): Simulated upstream latency in seconds.
+        state_dir (Path): Directory for the instances' state files.
+
+    Returns:
+        List[Any]: The model instances.
+    """
+    if kind == "bedrock":
+        client = StubBedrockClient(latency)
+        return [
+            BedrockCompletions(state_file=str(state_dir / f"bedrock_{i}.json"), client=client)
+            for i in range(count)
+        ]
+    async_client = StubAsyncOpenAI(latency)
+    return [
+        GPTCompletions(
+            "load test",
+            state_file=str(state_dir / f"openai_{i}.json"),
+            client=SimpleNamespace(),
+            async_client=async_client,
+        )
+        for i in range(count)
+    ]
+
+
+async def run_level(models: List[Any], total_requests: int) -> float:
+    """
+    Send `total_requests` messages spread over the given models and return requests per second.
+
+    Args:
+        models (List[Any]): One model per concurrent worker.
+        total_requests (int): Total number of messages to send.
+
+    Returns:
+        float: Achieved throughput in requests per second.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(total_requests):
+        queue.put_nowait(f"question {i}")
+
+    async def worker(model: Any) -> None:
+        while not queue.empty():
+            prompt = queue.get_nowait()
+            await model.async_send_message(prompt)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(model) for model in models))
+    return total_requests / (time.perf_counter() - start)
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in ("bedrock", "openai"):
+            print(f"\n{kind} (latency {args.latency:.3f}s, {args.requests} requests)")
+            print(f"{'concurrency':>12} {'req/s':>10}")
+            for concurrency in args.concurrency:
+                models = build_models(kind, concurrency, args.latency, Path(tmp))
+                throughput = await run_level(models, args.requests)
+                print(f"{concurrency:>12} {throughput:>10.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Replays recorded conversations through the Discord and Slack bots against local fakes of Bedrock,
+OpenAI, Discord and Slack (see benchmarks/fakes.py), so the whole message path can be load-tested
+without credentials or network access.
+
+User turns are read from the legacy gpt_state/*.json histories. Each simulated user sends its turns
+one after another, and up to `--concurrency` users are active at once. Discord messages go through
+`discord_bot.on_message`, spread over every channel in CHANNEL_CONFIG. Slack events go through
+`slack_bot.handle_message`, which acks and hands the work to the bot's worker loop. The report gives
+throughput, p50/p99 end-to-end latency (and ack latency for Slack), fake upstream usage and memory.
+Conversation state goes to a temporary store; gpt_state is never written. Run with:
+
+    python benchmarks/replay_bench.py --platform both --users 64 --turns 4 --concurrency 16 --latency 0.2
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+os.environ.update({
+    "SLACK_MODE": "flask",
+    "SLACK_BOT_TOKEN": "xoxb-benchmark",
+    "SLACK_SIGNING_SECRET": "benchmark-secret",
+    "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "benchmark"),
+    "METRICS_PORT": "0",
+})
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from fakes import (
+    FakeAsyncOpenAI, FakeBedrockRuntime, FakeDiscordChannel, FakeDiscordMessage, FakeOpenAI, FakeSlackClient,
+    FakeTransport,
+)
+
+DEFAULT_TRACES = str(ROOT_DIR / "gpt_state" / "*.json")
+FALLBACK_PROMPTS = ["ping", "Explain list comprehensions in Python.", "Summarize the previous answer in one line."]
+
+
+def load_prompts(pattern: str) -> List[str]:
+    """
+    Extracts the user turns of legacy history files, in either Bedrock or OpenAI message format.
+
+    Args:
+        pattern (str): Glob of JSON history files.
+
+    Returns:
+        List[str]: The user prompts, or a few built-in ones if none were found.
+    """
+    prompts = []
+    for path in sorted(glob.glob(pattern)):
+        try:
+            with open(path) as f:
+                history = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        if not isinstance(history, list):
+            continue
+        for message in history:
+            if not isinstance(message, dict) or message.get("role") != "user":
+                continue
+            content = message.get("content")
+            if isinstance(content, list):
+                content = "".join(block.get("text", "") for block in content if isinstance(block, dict))
+            if content:
+                prompts.append(content)
+    return prompts or FALLBACK_PROMPTS
+
+
+def install_fakes(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Points the model classes, stores and Slack client at local fakes before the bots are imported.
+    """
+    from slack_sdk import WebClient
+    from slack_sdk.web import SlackResponse
+
+    def fake_api_call(self: WebClient, api_method: str, **kwargs: Any) -> SlackResponse:
+        data = {"ok": True, "url": "https://bench.slack.com/", "team_id": "T0", "user_id": "U0BOT", "bot_id": "B0"}
+        return SlackResponse(client=self, http_verb="POST", api_url=api_method, req_args={}, data=data,
+                             headers={}, status_code=200)
+
+    WebClient.api_call = fake_api_call  # The Flask-mode Bolt app calls auth.test when it is created
+
+    import src.bedrock.aws_bedrock_models as bedrock
+    import src.chatgpt.chatgpt as chatgpt
+    import src.state.conversation_store as conversation_store
+    from model_config import MODEL_CONFIG
+
+    timing = dict(latency=args.latency, tokens_per_second=args.tokens_per_second, reply_tokens=args.reply_tokens)
+    fakes = {"bedrock": FakeBedrockRuntime(**timing), "openai": FakeOpenAI(**timing), "async_openai": FakeAsyncOpenAI(**timing)}
+    bedrock._shared_client = fakes["bedrock"]
+    chatgpt.OpenAI = lambda *a, **k: fakes["openai"]
+    chatgpt.AsyncOpenAI = lambda *a, **k: fakes["async_openai"]
+
+    state_dir = Path(tempfile.mkdtemp(prefix="replay-"))
+    conversation_store._default_store = conversation_store.SQLiteConversationStore(state_dir / "conversations.db")
+
+    for config in MODEL_CONFIG.values():
+        if not args.cache:
+            config["cache"] = None  # Every replayed turn should reach the fake upstream
+        elif config.get("cache"):
+            config["cache"] = {**config["cache"], "disk": False}
+        if args.prompt_cache:
+            config["prompt_cache"] = True  # The fakes accept cachePoint blocks for every model
+        if not args.respect_limits:
+            # Measure the bots rather than the configured provider quotas
+            config["limits"] = {"max_in_flight": args.concurrency, "max_queue": args.concurrency * 2}
+    return fakes
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def drive(users: int, turns: int, concurrency: int, prompts: List[str],
+                send: Callable[[int, int, str], Awaitable[float]]) -> Dict[str, Any]:
+    """
+    Runs `users` sequential conversations of `turns` messages, at most `concurrency` at a time.
+
+    Args:
+        send: Sends turn `t` of user `u` and returns when it has been answered.
+    """
+    latencies: List[float] = []
+    errors = 0
+    slots = asyncio.Semaphore(concurrency)
+
+    async def user(u: int) -> None:
+        nonlocal errors
+        async with slots:
+            for t in range(turns):
+                prompt = prompts[(u * turns + t) % len(prompts)]
+                started = time.perf_counter()
+                try:
+                    await send(u, t, prompt)
+                    latencies.append(time.perf_counter() - started)
+                except Exception as e:
+                    errors += 1
+                    print(f"WARNING: turn {t} of user {u} failed. Reason: {e!r}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(u) for u in range(users)))
+    elapsed = time.perf_counter() - started
+    return {"latencies": latencies, "errors": errors, "elapsed": elapsed}
+
+
+async def replay_discord(args: argparse.Namespace, prompts: List[str]) -> Dict[str, Any]:
+    import discord_bot
+    from model_config import CHANNEL_CONFIG
+
+    transport = FakeTransport(args.transport_latency)
+    channels = [FakeDiscordChannel(name, transport) for name in CHANNEL_CONFIG]
+
+    async def send(u: int, t: int, prompt: str) -> None:
+        channel = channels[u % len(channels)]
+        await discord_bot.on_message(FakeDiscordMessage(prompt, channel, author=SimpleNamespace(id=u)))
+
+    result = await drive(args.users, args.turns, args.concurrency, prompts, send)
+    result["transport"] = transport
+    return result
+
+
+async def replay_slack(args: argparse.Namespace, prompts: List[str]) -> Dict[str, Any]:
+    import slack_bot
+
+    transport = FakeTransport(args.transport_latency)
+    client = FakeSlackClient(transport)
+    loop = asyncio.get_running_loop()
+    pending: Dict[str, asyncio.Future] = {}
+    acks: List[float] = []
+    respond = slack_bot.respond
+
+    async def respond_and_signal(event: dict, slack_client: Any, event_id: str = None) -> None:
+        try:
+            await respond(event, slack_client, event_id)
+        finally:
+            future = pending.pop(event_id)
+            loop.call_soon_threadsafe(future.set_result, None)
+
+    slack_bot.respond = respond_and_signal  # handle_message looks it up when it hands off an event
+
+    async def send(u: int, t: int, prompt: str) -> None:
+        event_id = f"Ev{u:05d}{t:03d}"
+        done = pending[event_id] = loop.create_future()
+        event = {"type": "message", "channel": f"C{u % 8}", "user": f"U{u}", "text": prompt, "ts": f"{time.time():.6f}"}
+        started = time.perf_counter()
+        slack_bot.handle_message(event=event, body={"event_id": event_id}, client=client)
+        acks.append(time.perf_counter() - started)
+        await done
+
+    try:
+        result = await drive(args.users, args.turns, args.concurrency, prompts, send)
+    finally:
+        slack_bot.respond = respond
+    result["transport"] = transport
+    result["acks"] = acks
+    return result
+
+
+def report(platform: str, result: Dict[str, Any]) -> None:
+    latencies = result["latencies"]
+    transport = result["transport"]
+    print(f"\n{platform}: {len(latencies)} turns in {result['elapsed']:.2f}s, {result['errors']} errors")
+    print(f"  throughput  {len(latencies) / result['elapsed']:.1f} turns/s")
+    if latencies:
+        print(f"  latency     p50 {percentile(latencies, 0.5) * 1000:.0f} ms   p99 {percentile(latencies, 0.99) * 1000:.0f} ms"
+              f"   mean {statistics.mean(latencies) * 1000:.0f} ms")
+    if result.get("acks"):
+        acks = result["acks"]
+        print(f"  ack         p50 {percentile(acks, 0.5) * 1000:.1f} ms   p99 {percentile(acks, 0.99) * 1000:.1f} ms")
+    print(f"  transport   {transport.sent} posts, {transport.edited} edits, {transport.bytes / 1024:.0f} KiB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--platform", choices=["discord", "slack", "both"], default="both")
+    parser.add_argument("--users", type=int, default=32, help="Simulated users")
+    parser.add_argument("--turns", type=int, default=3, help="Messages per user")
+    parser.add_argument("--concurrency", type=int, default=16, help="Users active at once")
+    parser.add_argument("--traces", default=DEFAULT_TRACES, help="Glob of legacy JSON histories to take prompts from")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake model time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=400.0, help="Fake model generation speed")
+    parser.add_argument("--reply-tokens", type=int, default=80, help="Tokens per fake reply")
+    parser.add_argument("--transport-latency", type=float, default=0.02, help="Fake Discord/Slack API latency (s)")
+    parser.add_argument("--cache", action="store_true", help="Keep the configured response caches (in memory only)")
+    parser.add_argument("--respect-limits", action="store_true", help="Keep the configured rate limits")
+    parser.add_argument("--prompt-cache", action="store_true", help="Enable prompt caching for every model")
+    parser.add_argument("--tracemalloc", action="store_true", help="Track Python heap peaks (slower)")
+    args = parser.parse_args()
+
+    prompts = load_prompts(args.traces)
+    fakes = install_fakes(args)
+    print(f"{len(prompts)} prompts, {args.users} users x {args.turns} turns, concurrency {args.concurrency}, "
+          f"model latency {args.latency}s at {args.tokens_per_second:.0f} tok/s")
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    platforms = ["discord", "slack"] if args.platform == "both" else [args.platform]
+    for platform in platforms:
+        replay = replay_discord if platform == "discord" else replay_slack
+        report(platform, asyncio.run(replay(args, prompts)))
+
+    print("\nfake upstream:", {name: fake.stats() for name, fake in fakes.items()})
+    print(f"max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB", end="")
+    if args.tracemalloc:
+        print(f", Python heap peak {tracemalloc.get_traced_memory()[1] / 2 ** 20:.1f} MiB", end="")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Hit-rate and lookup-latency benchmark for the semantic response cache, on the conversations in gpt_state/.
+
+Two passes per cache variant:
+
+1. replay: every conversation is replayed turn by turn; each user turn is looked up, and on a miss the
+   stored assistant reply is cached. These questions are mostly distinct, so semantic hits that are not
+   exact repeats are possible false hits; list them with --show.
+2. reworded: every stored question is asked again as the first turn of a new conversation, reworded
+   (filler words, case, punctuation, "how do I" / "how to", a typo), as another user might ask it.
+
+Variants: the exact-match cache alone, and the semantic tier at several thresholds in both scopes.
+Lookup latency is also measured on an index filled to --entries questions. A tier pays for itself when
+its extra hit rate times the model latency exceeds its lookup cost. Run with:
+
+    python benchmarks/semantic_cache_bench.py --thresholds 0.95 0.9 0.85 0.8 --show 5
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from src.state.history import message_text
+from src.utils.response_cache import ResponseCache
+from src.utils.semantic_cache import SCOPES, HashingVectorizer, SemanticCache
+
+# (request, question text, stored reply) per user turn
+Turn = Tuple[Dict[str, Any], str, Optional[str]]
+
+FILLERS = ["hey, ", "quick question: ", "can you tell me ", "please ", ""]
+
+
+def load_conversations(state_dir: Path) -> List[List[Turn]]:
+    """
+    Reads the legacy per-model history files and turns each user message into the request the model
+    class would send for it (system prompt and earlier messages included).
+    """
+    conversations = []
+    for path in sorted(state_dir.glob("*.json")):
+        history = json.loads(path.read_text())
+        if not isinstance(history, list):
+            continue
+        openai_format = any(isinstance(message.get("content"), str) for message in history)
+        turns: List[Turn] = []
+        for i, message in enumerate(history):
+            if message.get("role") != "user":
+                continue
+            reply = history[i + 1] if i + 1 < len(history) and history[i + 1].get("role") == "assistant" else None
+            if openai_format:
+                request = {"model": path.stem, "temperature": 0.5, "messages": history[:i + 1]}
+            else:
+                request = {
+                    "modelId": path.stem, "system": [{"text": "You are a helpful assistant."}],
+                    "inferenceConfig": {"maxTokens": 1000, "temperature": 0.5, "topP": 0.9}, "messages": history[:i + 1],
+                }
+            turns.append((request, message_text(message["content"]), message_text(reply["content"]) if reply else None))
+        if turns:
+            conversations.append(turns)
+    return conversations
+
+
+def reword(text: str, rng: random.Random) -> str:
+    text = text.replace("how do I", "how to").replace("How do I", "How to") if rng.random() < 0.5 else text
+    words = text.split()
+    long_words = [i for i, word in enumerate(words) if len(word) > 4 and word.isalpha()]
+    if long_words and rng.random() < 0.5:
+        i = rng.choice(long_words)
+        j = rng.randrange(1, len(words[i]) - 1)
+        words[i] = words[i][:j - 1] + words[i][j] + words[i][j - 1] + words[i][j + 1:]  # Swap two letters
+    text = " ".join(words)
+    text = text.rstrip("?.!") + rng.choice(["?", "", " ?", "."])
+    text = rng.choice(FILLERS) + (text[0].lower() + text[1:] if text else text)
+    return text
+
+
+def first_turn(request: Dict[str, Any], question: str) -> Dict[str, Any]:
+    messages = request["messages"]
+    lead = messages[:1] if messages and messages[0].get("role") == "system" else []
+    content = question if isinstance(messages[-1]["content"], str) else [{"text": question}]
+    return {**request, "messages": lead + [{"role": "user", "content": content}]}
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * (len(ordered) - 1)))] if ordered else 0.0
+
+
+def run_variant(conversations: List[List[Turn]], cache: ResponseCache, seed: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    false_hits: List[Tuple[str, str]] = []
+    asked: Dict[str, str] = {}  # Replies by question, to tell a semantic hit on a repeat from a false one
+
+    def lookup(request: Dict[str, Any]) -> Optional[str]:
+        started = time.perf_counter()
+        reply = cache.get(request)
+        latencies.append(time.perf_counter() - started)
+        return reply
+
+    replay_hits = replay_total = 0
+    for turns in conversations:
+        for request, question, reply in turns:
+            replay_total += 1
+            cached = lookup(request)
+            if cached is not None:
+                replay_hits += 1
+                if asked.get(question.strip().lower()) != cached:
+                    false_hits.append((question, cached))
+            elif reply:
+                cache.put(request, reply)
+                asked[question.strip().lower()] = reply
+
+    rng = random.Random(seed)
+    reworded_hits = reworded_total = 0
+    for turns in conversations:
+        for request, question, reply in turns:
+            if reply:
+                reworded_total += 1
+                reworded_hits += lookup(first_turn(request, reword(question, rng))) is not None
+
+    return {
+        "replay_hit_rate": replay_hits / replay_total if replay_total else 0.0,
+        "false_hits": false_hits,
+        "reworded_hit_rate": reworded_hits / reworded_total if reworded_total else 0.0,
+        "p50_us": percentile(latencies, 0.5) * 1e6,
+        "p99_us": percentile(latencies, 0.99) * 1e6,
+    }
+
+
+def scale_latency(entries: int, lookups: int, dim: int) -> Tuple[float, float]:
+    cache = SemanticCache(max_entries=entries, threshold=0.9, scope="prompt", embed=HashingVectorizer(dim))
+    rng = random.Random(0)
+    vocabulary = "python list dict loop class function error import async thread file json sort string regex".split()
+
+    def request(i: int) -> Dict[str, Any]:
+        words = " ".join(rng.choice(vocabulary) for _ in range(12))
+        return {"modelId": "bench", "messages": [{"role": "user", "content": [{"text": f"question {i}: {words}"}]}]}
+
+    for i in range(entries):
+        cache.put(request(i), "reply")
+    latencies = []
+    for i in range(lookups):
+        probe = request(entries + i)
+        started = time.perf_counter()
+        cache.get(probe)
+        latencies.append(time.perf_counter() - started)
+    return percentile(latencies, 0.5) * 1e6, percentile(latencies, 0.99) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--state-dir", type=Path, default=ROOT_DIR / "gpt_state")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.95, 0.9, 0.85, 0.8])
+    parser.add_argument("--entries", type=int, nargs="+", default=[1024, 4096], help="Index sizes for the latency test")
+    parser.add_argument("--model-latency", type=float, default=2.0, help="Seconds a model reply takes, for break-even")
+    parser.add_argument("--show", type=int, default=0, help="Print this many false hits per variant")
+    parser.add_argument("--dim", type=int, default=512, help="HashingVectorizer dimensions")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    conversations = load_conversations(args.state_dir)
+    print(f"{sum(len(turns) for turns in conversations)} user turns in {len(conversations)} conversations\n")
+    print(f"{'variant':<28}{'replay hits':>12}{'false hits':>12}{'reworded hits':>15}{'p50 us':>9}{'p99 us':>9}{'saved/msg ms':>14}")
+
+    baseline = run_variant(conversations, ResponseCache(ttl=None), args.seed)
+    variants = [("exact only", baseline)]
+    for scope in SCOPES:
+        for threshold in args.thresholds:
+            semantic = SemanticCache(threshold=threshold, ttl=None, scope=scope, embed=HashingVectorizer(args.dim))
+            variants.append((f"semantic {scope} >= {threshold}", run_variant(conversations, ResponseCache(ttl=None, semantic=semantic), args.seed)))
+
+    for name, result in variants:
+        # Time saved per message by hits beyond the exact cache's, minus the extra lookup cost
+        extra = (result["reworded_hit_rate"] - baseline["reworded_hit_rate"]) * args.model_latency
+        saved = (extra - (result["p50_us"] - baseline["p50_us"]) / 1e6) * 1000
+        print(f"{name:<28}{result['replay_hit_rate']:>12.1%}{len(result['false_hits']):>12}"
+              f"{result['reworded_hit_rate']:>15.1%}{result['p50_us']:>9.1f}{result['p99_us']:>9.1f}{saved:>14.1f}")
+        for question, cached in result["false_hits"][:args.show]:
+            print(f"    {question[:60]!r} -> {cached[:60]!r}")
+
+    print("\nLookup latency on a full index (semantic tier alone):")
+    for entries in args.entries:
+        p50, p99 = scale_latency(entries, 500, args.dim)
+        print(f"  {entries:>6} entries: p50 {p50:.1f} us, p99 {p99:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Ack-latency test for slack_bot's /slack/events route using a fake Slack Web API and a fake OpenAI client.
+
+Signed events are posted through the Flask test client at the given concurrency while each model
+reply takes `--model-latency` seconds. Every event is also re-delivered once as a Slack retry. The
+route must ack well inside Slack's 3 second deadline regardless of model latency, and each event must
+be answered exactly once. Run with:
+
+    python benchmarks/slack_ack_bench.py --events 200 --concurrency 32
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+SIGNING_SECRET = "benchmark-secret"
+os.environ.update({
+    "SLACK_MODE": "flask",
+    "SLACK_BOT_TOKEN": "xoxb-benchmark",
+    "SLACK_SIGNING_SECRET": SIGNING_SECRET,
+    "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "benchmark"),
+})
+
+from slack_sdk import WebClient
+from slack_sdk.signature import SignatureVerifier
+from slack_sdk.web import SlackResponse
+
+SLACK_CALLS: Dict[str, int] = {}
+SLACK_CALLS_LOCK = threading.Lock()
+
+
+def fake_api_call(self: WebClient, api_method: str, **kwargs: Any) -> SlackResponse:
+    """Stand-in for the Slack Web API: records the call and returns a canned success response."""
+    with SLACK_CALLS_LOCK:
+        SLACK_CALLS[api_method] = SLACK_CALLS.get(api_method, 0) + 1
+    data = {"ok": True, "ts": f"{time.time():.6f}"}
+    if api_method == "auth.test":
+        data.update(url="https://bench.slack.com/", team="bench", user="bot", team_id="T0", user_id="U0BOT", bot_id="B0")
+    return SlackResponse(
+        client=self, http_verb="POST", api_url=api_method, req_args={}, data=data, headers={}, status_code=200
+    )
+
+
+WebClient.api_call = fake_api_call
+
+import slack_bot
+
+
+class FakeAsyncOpenAI:
+    """Streams a fixed reply after a fixed latency."""
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs: Any) -> Any:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+
+        async def chunks():
+            for word in ["Salem ", "is ", "the ", "capital."]:
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word))])
+
+        return chunks()
+
+
+def signed_post(client: Any, payload: Dict[str, Any], retry: bool = False) -> float:
+    body = json.dumps(payload)
+    timestamp = str(int(time.time()))
+    headers = {
+        "X-Slack-Request-Timestamp": timestamp,
+        "X-Slack-Signature": SignatureVerifier(SIGNING_SECRET).generate_signature(timestamp=timestamp, body=body),
+        "Content-Type": "application/json",
+    }
+    if retry:
+        headers.update({"X-Slack-Retry-Num": "1", "X-Slack-Retry-Reason": "http_timeout"})
+    start = time.perf_counter()
+    response = client.post("/slack/events", data=body, headers=headers)
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200, response.status_code
+    return elapsed
+
+
+def event_payload(i: int) -> Dict[str, Any]:
+    return {
+        "type": "event_callback",
+        "team_id": "T0",
+        "api_app_id": "A0",
+        "event_id": f"Ev{i:06d}",
+        "event_time": int(time.time()),
+        "event": {
+            "type": "message", "channel": "C0", "user": f"U{i % 50}", "text": f"question {i}",
+            "ts": f"{time.time():.6f}", "channel_type": "channel",
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--model-latency", type=float, default=2.0)
+    args = parser.parse_args()
+
+    fake_openai = FakeAsyncOpenAI(args.model_latency)
+    slack_bot.gpt_completions.async_client = fake_openai
+    local = threading.local()
+
+    def deliver(i: int) -> List[float]:
+        if not hasattr(local, "client"):
+            local.client = slack_bot.flask_app.test_client()
+        payload = event_payload(i)
+        return [signed_post(local.client, payload), signed_post(local.client, payload, retry=True)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        latencies = [latency for pair in executor.map(deliver, range(args.events)) for latency in pair]
+    acked_in = time.perf_counter() - start
+
+    deadline = time.monotonic() + args.model_latency * 5 + 10
+    while SLACK_CALLS.get("chat.postMessage", 0) < args.events and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"deliveries: {len(latencies)} ({args.events} events + 1 retry each) in {acked_in:.2f}s")
+    print(f"ack latency ms: p50={statistics.median(latencies) * 1000:.1f} p99={p99 * 1000:.1f} max={latencies[-1] * 1000:.1f}")
+    print(f"model calls: {fake_openai.calls}, replies posted: {SLACK_CALLS.get('chat.postMessage', 0)}, "
+          f"duplicates dropped: {slack_bot.event_dedup.duplicates}")
+    print("PASS" if p99 < 3.0 and SLACK_CALLS.get("chat.postMessage", 0) == args.events else "FAIL")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Startup-time benchmark for model initialization.
+
+Compares the old behaviour (one boto3 client per model, built one after another) with concurrent
+eager initialization on a shared client and with lazy handles. No network access is needed: client
+construction and state loading are local. Run with:
+
+    python benchmarks/startup_bench.py --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")  # OpenAI() refuses to build without a key
+
+import boto3
+
+import src.bedrock.aws_bedrock_models as bedrock
+import src.utils.utils as utils
+from model_config import MODEL_CONFIG
+
+
+def reset_shared_state() -> None:
+    bedrock._shared_client = None
+
+
+def sequential_per_model_clients() -> None:
+    for config in MODEL_CONFIG.values():
+        if config["class"] == "BedrockCompletions":
+            client = boto3.Session(region_name="us-east-1").client("bedrock-runtime")
+            bedrock.BedrockCompletions(
+                model=config["model"], system_prompt=config["system_prompt"],
+                state_file=config["state_file"], client=client,
+            ).message_history
+        else:
+            utils.build_model(config).message_history
+
+
+def concurrent_shared_client() -> None:
+    utils.initialize_models(lazy=False)
+
+
+def lazy_handles() -> None:
+    utils.initialize_models(lazy=True)
+
+
+def measure(fn: Callable[[], None], repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        reset_shared_state()
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'strategy':<34} {'median ms':>10} {'min ms':>10}")
+    for name, fn in [
+        ("sequential, client per model", sequential_per_model_clients),
+        ("concurrent, shared client", concurrent_shared_client),
+        ("lazy handles (time to connect)", lazy_handles),
+    ]:
+        timings = measure(fn, args.repeat)
+        print(f"{name:<34} {statistics.median(timings):>10.1f} {min(timings):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
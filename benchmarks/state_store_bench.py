@@ -0,0 +1,87 @@
+"""
+Benchmark of per-turn save latency against history length for each conversation state backend.
+
+The legacy backend rewrites the whole history as one JSON file, as the completion classes used to;
+the store backends only append the new turn. Run with:
+
+    python benchmarks/state_store_bench.py --lengths 10 100 1000 5000
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from src.state.conversation_store import AppendOnlyLogStore, SQLiteConversationStore
+
+KEY = ("bench", "channel", "user")
+
+
+def make_turn(i: int) -> List[Dict[str, Any]]:
+    return [
+        {"role": "user", "content": [{"text": f"question {i} " + "x" * 200}]},
+        {"role": "assistant", "content": [{"text": f"answer {i} " + "y" * 800}]},
+    ]
+
+
+def legacy_saver(path: Path) -> Callable[[List[Dict[str, Any]], List[Dict[str, Any]]], None]:
+    def save(history: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> None:
+        with open(path, 'w') as f:
+            json.dump(history, f)
+    return save
+
+
+def store_saver(store: Any) -> Callable[[List[Dict[str, Any]], List[Dict[str, Any]]], None]:
+    def save(history: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> None:
+        store.append(KEY, new)
+    return save
+
+
+def time_saves(save: Callable, length: int, samples: int) -> float:
+    """
+    Grow a history to `length` messages, then time `samples` further turns.
+
+    Returns:
+        float: Mean save latency in milliseconds.
+    """
+    history: List[Dict[str, Any]] = []
+    for i in range(length // 2):
+        new = make_turn(i)
+        history.extend(new)
+        save(history, new)
+
+    elapsed = 0.0
+    for i in range(samples):
+        new = make_turn(length + i)
+        history.extend(new)
+        start = time.perf_counter()
+        save(history, new)
+        elapsed += time.perf_counter() - start
+    return elapsed / samples * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--samples", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'messages':>10} {'legacy json':>12} {'sqlite wal':>12} {'append log':>12}  (ms per save)")
+    for length in args.lengths:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_dir = Path(tmp)
+            results = [
+                time_saves(legacy_saver(tmp_dir / "state.json"), length, args.samples),
+                time_saves(store_saver(SQLiteConversationStore(tmp_dir / "conversations.db")), length, args.samples),
+                time_saves(store_saver(AppendOnlyLogStore(tmp_dir / "logs")), length, args.samples),
+            ]
+        print(f"{length:>10} " + " ".join(f"{r:>12.3f}" for r in results))
+
+
+if __name__ == "__main__":
+    main()
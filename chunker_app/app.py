@@ -1,30 +1,99 @@
-from flask import Flask, request, render_template
+import base64
+import gzip
+import json
+import zlib
+from flask import Flask, Response, request, render_template
 
 app = Flask(__name__)
 
-def chunk_text(text, chunk_size=2000):
-    # Split the text into chunks
-    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
-    
-    # Add position indicators
-    if len(chunks) == 1:
-        chunks[0] = f"$$START$$ {chunks[0]} $$END$$"
-    else:
-        chunks[0] = f"$$START$$ {chunks[0]}"
-        for i in range(1, len(chunks) - 1):
-            chunks[i] = f"$$CONTINUE$$ {chunks[i]}"
-        chunks[-1] = f"$$END$$ {chunks[-1]}"
-    
+# Largest chunk size accepted from API clients; Discord messages are capped at 2000 characters
+MAX_CHUNK_SIZE = 2000
+
+def compress_text(text):
+    # gzip+base64 envelope; base64 has no whitespace, so any cut point survives Discord's trimming
+    return base64.b64encode(gzip.compress(text.encode("utf-8"), mtime=0)).decode("ascii")
+
+def chunk_text(text, chunk_size=2000, compress=False):
+    # Discord trims whitespace around messages, so the checksum covers the stripped text
+    text = text.strip()
+    crc = f"{zlib.crc32(text.encode('utf-8')):08x}"
+    flag = ""
+    if compress:
+        # Only worth it when the envelope is actually smaller than the text
+        packed = compress_text(text)
+        if len(packed) < len(text):
+            text, flag = packed, ":gz"
+
+    # Each chunk is "<marker>[index/total:crc32(:gz)] <payload>" and must fit in chunk_size as a whole
+    total = 1
+    while True:
+        payload_size = chunk_size - len(f"$$CONTINUE$$[{total}/{total}:{crc}{flag}] ")
+        payloads = split_payloads(text, payload_size)
+        if len(payloads) <= total:
+            break
+        total = len(payloads)
+
+    chunks = []
+    for i, payload in enumerate(payloads, start=1):
+        marker = "$$START$$" if i == 1 else "$$END$$" if i == len(payloads) else "$$CONTINUE$$"
+        chunks.append(f"{marker}[{i}/{len(payloads)}:{crc}{flag}] {payload}")
     return chunks
 
+def split_payloads(text, size):
+    # Cut between two non-space characters where possible, so no chunk starts or ends with
+    # whitespace that Discord would trim away
+    payloads = []
+    start = 0
+    while start < len(text):
+        cut = min(start + size, len(text))
+        if cut < len(text):
+            for candidate in range(cut, start + size // 2, -1):
+                if not text[candidate - 1].isspace() and not text[candidate].isspace():
+                    cut = candidate
+                    break
+        payloads.append(text[start:cut])
+        start = cut
+    return payloads
+
 @app.route("/", methods=["GET", "POST"])
 def home():
     chunks = []
     if request.method == "POST":
         input_text = request.form.get("input_text")
         if input_text:
-            chunks = chunk_text(input_text)
+            chunks = chunk_text(input_text, compress=request.form.get("compress") == "on")
     return render_template("index.html", chunks=chunks)
 
+@app.route("/api/chunks", methods=["POST"])
+def api_chunks():
+    # Accepts {"text": ..., "chunk_size": 2000, "compress": false} as JSON, or the raw text as the body
+    # with chunk_size/compress as query parameters. Streams one JSON object per line (NDJSON).
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        text = payload.get("text") or ""
+        chunk_size = payload.get("chunk_size", MAX_CHUNK_SIZE)
+        compress = bool(payload.get("compress", False))
+    else:
+        text = request.get_data(as_text=True)
+        chunk_size = request.args.get("chunk_size", MAX_CHUNK_SIZE, type=int)
+        compress = request.args.get("compress", "").lower() in ("1", "true", "yes")
+
+    if not text.strip():
+        return Response(json.dumps({"error": "No text to chunk"}), status=400, mimetype="application/json")
+    if not isinstance(chunk_size, int) or not 100 <= chunk_size <= MAX_CHUNK_SIZE:
+        return Response(
+            json.dumps({"error": f"chunk_size must be between 100 and {MAX_CHUNK_SIZE}"}),
+            status=400,
+            mimetype="application/json"
+        )
+
+    chunks = chunk_text(text, chunk_size=chunk_size, compress=compress)
+
+    def generate():
+        for i, chunk in enumerate(chunks, start=1):
+            yield json.dumps({"index": i, "total": len(chunks), "chunk": chunk}) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8080, debug=True)
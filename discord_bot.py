@@ -1,29 +1,184 @@
 import os
+import signal
+import asyncio
 import discord
+from functools import partial
 import src.utils.utils as utils
-from model_config import CHANNEL_CONFIG
-from typing import Optional
+from src.utils.config_registry import ConfigChange, ConfigRegistry
+from src.utils.fanout import FanOutError, StreamStarter, fallback, labelled, race
+from src.utils.log import get_logger, new_correlation_id
+from src.utils.metrics import CHUNK_SEND_LATENCY, FANOUT_ANSWERS, REGISTRY, StatsGauges, serve_metrics
+from src.state.shared_backend import get_shared_backend
+from src.utils.reassembly import ChunkReassembler, ReassemblyError, SharedChunkReassembler
+from src.utils.scheduler import Scheduler, SchedulerBusyError
+from src.utils.sessions import SessionManager, hold_turns
+from src.utils.streaming import AsyncProgressiveReply
+from src.utils.transport import http_pool_stats
+from typing import AsyncIterator, Dict, Optional, Tuple
 
-# Dictionary to store chunks per user
-USER_CHUNKS: dict[int, list[str]] = {}
+# Partial $$START$$/$$CONTINUE$$/$$END$$ messages per user, bounded in memory and expiring; kept in the
+# shared backend instead when SHARED_STATE_URL is set, so any process can complete a message
+CHUNK_LIMITS = dict(
+    ttl=float(os.getenv("CHUNK_TTL", "600")),
+    max_user_bytes=int(os.getenv("CHUNK_MAX_USER_BYTES", str(512 * 1024))),
+    max_total_bytes=int(os.getenv("CHUNK_MAX_TOTAL_BYTES", str(32 * 1024 * 1024))),
+)
+SHARED_BACKEND = get_shared_backend()
+REASSEMBLER = (
+    SharedChunkReassembler(SHARED_BACKEND, **CHUNK_LIMITS) if SHARED_BACKEND else ChunkReassembler(**CHUNK_LIMITS)
+)
 
-# Initialize models
-MODELS = utils.initialize_models()
+# Models and channel routes: from the TOML/YAML file in BOT_CONFIG, reloaded when it changes or on SIGHUP,
+# or from model_config.py if it is not set
+CONFIG = ConfigRegistry(
+    os.getenv("BOT_CONFIG") or None,
+    poll_interval=float(os.getenv("BOT_CONFIG_POLL_INTERVAL", "5")),
+)
+
+# Model clients are built on first use or by the warm-up started once the bot is connected
+MODELS = utils.initialize_models(model_config=CONFIG.models)
+
+BUSY_REPLY = "The model is busy right now. Please try again in a moment."
+
+# One conversation per user in each channel (or per thread), bounded in memory
+SESSIONS = SessionManager(
+    max_sessions=int(os.getenv("MAX_SESSIONS", "1000")),
+    idle_timeout=float(os.getenv("SESSION_IDLE_TIMEOUT", "1800")),
+)
+
+# Per-model rate limits, concurrency caps and bounded queues from MODEL_CONFIG["limits"]
+SCHEDULER = Scheduler(CONFIG.models)
+
+# Served on METRICS_PORT once the bot starts; set METRICS_PORT=0 to disable
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+REGISTRY.register(StatsGauges("llm_config", "Bot configuration registry.", CONFIG.stats))
+REGISTRY.register(StatsGauges("llm_scheduler", "Model scheduler state.", SCHEDULER.stats, label="model"))
+REGISTRY.register(StatsGauges("llm_sessions", "Conversation sessions held in memory.", SESSIONS.stats))
+REGISTRY.register(StatsGauges("llm_chunk_reassembly", "Chunked message reassembly.", REASSEMBLER.stats))
+REGISTRY.register(StatsGauges("llm_http_pool", "HTTP connection pools of the model clients.", http_pool_stats, label="client"))
+REGISTRY.register(StatsGauges(
+    "llm_response_cache",
+    "Response cache state.",
+    lambda: {key: model.cache.stats() for key, model in list(MODELS.items()) if model.initialized and model.cache},
+    label="model",
+))
+REGISTRY.register(StatsGauges(
+    "llm_compaction",
+    "Background conversation compaction.",
+    lambda: {key: model.compactor.stats() for key, model in list(MODELS.items()) if model.initialized and model.compactor},
+    label="model",
+))
+
+logger = get_logger(__name__)
 
 def create_discord_client() -> discord.Client:
     """
     Create and configure the Discord client.
 
+    DISCORD_SHARD_COUNT enables sharding: "auto" runs every shard Discord recommends in this process;
+    a number N splits the bot into N shards, of which this process runs those in DISCORD_SHARD_IDS
+    (comma-separated, all of them by default). Each guild's messages go to one shard, so with
+    CONVERSATION_STORE=shared and SHARED_STATE_URL, several processes or machines split the load.
+
     Returns:
         discord.Client: A configured instance of the Discord client.
     """
     intents = discord.Intents.default()
     intents.message_content = True
-    return discord.Client(intents=intents)
+    shard_count = os.getenv("DISCORD_SHARD_COUNT")
+    if not shard_count:
+        return discord.Client(intents=intents)
+    if shard_count == "auto":
+        return discord.AutoShardedClient(intents=intents)
+    shard_ids = os.getenv("DISCORD_SHARD_IDS")
+    return discord.AutoShardedClient(
+        intents=intents,
+        shard_count=int(shard_count),
+        shard_ids=[int(shard_id) for shard_id in shard_ids.split(",")] if shard_ids else None,
+    )
 
 # Initialize Discord client
 client = create_discord_client()
 
+def conversation_key(message: discord.Message) -> Tuple[str, str, str]:
+    """
+    Build the conversation key of a message: the whole thread for thread messages, otherwise the author in the channel.
+
+    Args:
+        message (discord.Message): The incoming message.
+
+    Returns:
+        Tuple[str, str, str]: The (platform, channel, user/thread) key.
+    """
+    if isinstance(message.channel, discord.Thread):
+        return ("discord", str(message.channel.id), "")
+    return ("discord", str(message.channel.id), str(message.author.id))
+
+def channel_route(channel: discord.abc.Messageable) -> Optional[dict]:
+    """
+    Look up the route of a channel by ID, or by name for channels configured by name; threads use their parent's.
+
+    Args:
+        channel (discord.abc.Messageable): The channel a message was sent in.
+
+    Returns:
+        Optional[dict]: The channel's route, or None for channels the bot doesn't answer in (e.g. DMs).
+    """
+    if isinstance(channel, discord.Thread):
+        parent = channel.parent
+        return CONFIG.route(channel.parent_id, getattr(parent, "name", None))
+    return CONFIG.route(getattr(channel, "id", None), getattr(channel, "name", None))
+
+def apply_config_change(change: ConfigChange) -> None:
+    """
+    Rebuild the clients of the models a configuration reload added or changed, and drop removed ones.
+
+    Sessions of other models stay live. Sessions of changed models are evicted, which persists them,
+    so their conversations continue from the store under the new configuration.
+
+    Args:
+        change (ConfigChange): What the reload changed.
+    """
+    models = CONFIG.models
+    rebuilt = change["added"] + change["changed"]
+    utils.forget_summarizers(change["changed"] + change["removed"])
+    SCHEDULER.reconfigure(models, change["changed"] + change["removed"])
+    for model_key in change["changed"] + change["removed"]:
+        SESSIONS.drop_model(model_key)
+    for model_key in change["removed"]:
+        MODELS.pop(model_key, None)
+    for model in MODELS.values():
+        model.model_config = models  # Where models not built yet will look up their summarizer
+    for model_key in rebuilt:
+        MODELS[model_key] = utils.LazyModel(model_key, models[model_key], models)
+    if rebuilt:
+        asyncio.ensure_future(asyncio.to_thread(utils.warm_up, {key: MODELS[key] for key in rebuilt}))
+
+CONFIG.subscribe(apply_config_change)
+
+def route_sessions(route: dict, key: Tuple[str, str, str]) -> Dict[str, object]:
+    """
+    Get the session of each model of a route for a conversation.
+
+    With several models, each one keeps its own conversation, stored under the model key appended to the
+    user/thread part of the conversation key, since their histories differ (and so may their formats).
+
+    Args:
+        route (dict): The channel's route, from ROUTES.
+        key (Tuple[str, str, str]): The (platform, channel, user/thread) key of the conversation.
+
+    Returns:
+        Dict[str, object]: The sessions by model key, in the route's order.
+    """
+    if len(route["models"]) == 1:
+        model_key = route["models"][0]
+        return {model_key: SESSIONS.get(model_key, MODELS[model_key], key)}
+    platform, channel, user = key
+    return {
+        model_key: SESSIONS.get(model_key, MODELS[model_key], (platform, channel, f"{user}/{model_key}"))
+        for model_key in route["models"]
+    }
+
 async def send_reply(channel: discord.TextChannel, message: str) -> None:
     """
     Send the assistant's reply in chunks if necessary.
@@ -33,14 +188,131 @@ async def send_reply(channel: discord.TextChannel, message: str) -> None:
         message (str): The message to be sent.
     """
     for chunk in utils.chunk_message(message):
-        await channel.send(chunk)
+        with CHUNK_SEND_LATENCY.time(platform="discord", operation="send"):
+            await channel.send(chunk)
+
+async def stream_reply(channel: discord.TextChannel, deltas: AsyncIterator[str]) -> None:
+    """
+    Stream the assistant's reply by posting a message and editing it as text arrives.
+
+    Args:
+        channel (discord.TextChannel): The channel to send the reply to.
+        deltas (AsyncIterator[str]): The streamed text deltas of the reply.
+    """
+    reply = AsyncProgressiveReply(
+        send=channel.send,
+        edit=lambda sent, text: sent.edit(content=text),
+    )
+    async for delta in deltas:
+        await reply.feed(delta)
+    await reply.finish()
+
+async def answer(channel: discord.TextChannel, model_key: str, model: object, prompt: str) -> None:
+    """
+    Send a prompt to the model and post its reply, streaming it if the model is configured to.
+
+    Args:
+        channel (discord.TextChannel): The channel to send the reply to.
+        model_key (str): The key of the model in MODEL_CONFIG.
+        model (object): The model instance to call.
+        prompt (str): The user's prompt.
+    """
+    scheduler = SCHEDULER.for_model(model_key)
+    # Charge the whole request that will be sent, system prompt and trimmed history included
+    tokens = model.prompt_tokens(prompt)
+    try:
+        if CONFIG.models[model_key].get("stream"):
+            await stream_reply(channel, scheduler.stream(lambda: model.async_stream_message(prompt), tokens=tokens))
+        else:
+            assistant_reply = await scheduler.run(lambda: model.async_send_message(prompt), tokens=tokens)
+            await send_reply(channel, assistant_reply)
+    except SchedulerBusyError:
+        await send_reply(channel, BUSY_REPLY)
+
+def model_stream(model_key: str, model: object, prompt: str) -> AsyncIterator[str]:
+    """
+    Stream a model's reply to a prompt through the model's scheduler.
+
+    Args:
+        model_key (str): The key of the model in MODEL_CONFIG.
+        model (object): The model instance to call.
+        prompt (str): The user's prompt.
+
+    Returns:
+        AsyncIterator[str]: The text deltas of the reply.
+    """
+    scheduler = SCHEDULER.for_model(model_key)
+    return scheduler.stream(lambda: model.async_stream_message(prompt), tokens=model.prompt_tokens(prompt))
+
+async def compare_replies(channel: discord.TextChannel, starts: Dict[str, StreamStarter]) -> None:
+    """
+    Stream the replies of several models at once, each in its own message headed by the model key.
+
+    A model that fails gets an error message of its own; the others are not affected.
+
+    Args:
+        channel (discord.TextChannel): The channel to send the replies to.
+        starts (Dict[str, StreamStarter]): Stream starters by model key.
+    """
+    async def compare_one(model_key: str, start: StreamStarter) -> None:
+        try:
+            await stream_reply(channel, labelled(model_key, start()))
+        except SchedulerBusyError:
+            await send_reply(channel, f"**{model_key}**\n{BUSY_REPLY}")
+        except Exception as e:
+            await send_reply(channel, f"**{model_key}**\nThere was a problem calling the model: {e}")
+        else:
+            FANOUT_ANSWERS.inc(strategy="compare", model=model_key)
+
+    await asyncio.gather(*(compare_one(model_key, start) for model_key, start in starts.items()))
+
+async def answer_route(channel: discord.TextChannel, route: dict, sessions: Dict[str, object], prompt: str) -> None:
+    """
+    Send a prompt to the models of a channel's route and post the reply, or replies, they produce.
+
+    "race" streams whichever model starts answering first and cancels the others; "fallback" moves
+    down the list while models fail or time out; "compare" streams every model's reply side by side.
+
+    Args:
+        channel (discord.TextChannel): The channel to send the reply to.
+        route (dict): The channel's route, from ROUTES.
+        sessions (Dict[str, object]): The conversation's session of each model of the route.
+        prompt (str): The user's prompt.
+    """
+    if route["strategy"] == "single":
+        model_key, model = next(iter(sessions.items()))
+        await answer(channel, model_key, model, prompt)
+        return
+
+    starts = {model_key: partial(model_stream, model_key, model, prompt) for model_key, model in sessions.items()}
+    if route["strategy"] == "compare":
+        await compare_replies(channel, starts)
+        return
+    try:
+        if route["strategy"] == "race":
+            _, deltas = await race(starts)
+        else:
+            _, deltas = await fallback(list(starts.items()), timeout=route["timeout"])
+    except FanOutError as e:
+        if all(isinstance(error, SchedulerBusyError) for error in e.errors.values()):
+            await send_reply(channel, BUSY_REPLY)
+            return
+        raise
+    await stream_reply(channel, deltas)
 
 @client.event
 async def on_ready() -> None:
     """
     Event triggered when the bot is ready.
     """
-    print(f'Logged in as {client.user}')
+    shards = getattr(client, "shard_ids", None) or [client.shard_id]
+    logger.info("logged_in", extra={"fields": {"user": str(client.user), "shards": shards, "shard_count": client.shard_count}})
+    if CONFIG.path:
+        # Reloads are committed on this loop; on_ready runs again after reconnects, which both calls tolerate
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGHUP, CONFIG.request_reload)
+        CONFIG.watch(loop)
+    await asyncio.to_thread(utils.warm_up, MODELS)
 
 @client.event
 async def on_message(message: discord.Message) -> None:
@@ -53,34 +325,45 @@ async def on_message(message: discord.Message) -> None:
     if message.author == client.user:
         return
 
+    new_correlation_id(message.id)
     user_id = message.author.id
     user_message = message.content
-    channel_name = message.channel.name
+    route = channel_route(message.channel)
 
-    if channel_name not in CHANNEL_CONFIG:
+    if route is None:
         return  # Do nothing if the message is not in the specified channels
 
-    model_key = CHANNEL_CONFIG[channel_name]
-    model = MODELS[model_key]
+    sessions = route_sessions(route, conversation_key(message))
 
-    if user_message.startswith("$$START$$"):
-        full_message = utils.handle_chunked_message(user_id, user_message, user_chunks=USER_CHUNKS)
+    if REASSEMBLER.is_chunk(user_message):
+        # Only the reassembled message is sent to the model, never the individual chunks
+        try:
+            # A shared reassembler waits for a lock across processes, which mustn't block the event loop
+            full_message = await asyncio.to_thread(
+                utils.handle_chunked_message, user_id, user_message, reassembler=REASSEMBLER
+            )
+        except ReassemblyError as e:
+            await send_reply(message.channel, f"Couldn't reassemble your message: {e}")
+            return
         if full_message:
             try:
-                assistant_reply = model.send_message(full_message)
-                await send_reply(message.channel, assistant_reply)
+                async with hold_turns(sessions.values()):
+                    await answer_route(message.channel, route, sessions, full_message)
             except Exception as e:
                 await send_reply(message.channel, f"There was a problem calling the model: {e}")
     elif user_message.startswith("$$CLEAR CONTEXT$$"):
-        model.clear_context()  # Clear context
+        async with hold_turns(sessions.values()):  # After any turn still being answered
+            for model in sessions.values():
+                model.clear_context()  # Clear context
         try:
             await send_reply(message.channel, 'Context Cleared.')
         except Exception as e:
             await send_reply(message.channel, f"There was a problem calling the model: {e}")
     else:
         try:
-            assistant_reply = model.send_message(user_message)
-            await send_reply(message.channel, assistant_reply)
+            # Messages of one conversation (a user's, or a whole thread's) are answered one after another
+            async with hold_turns(sessions.values()):
+                await answer_route(message.channel, route, sessions, user_message)
         except Exception as e:
             await send_reply(message.channel, f"There was a problem calling the model: {e}")
 
@@ -89,12 +372,14 @@ def main() -> None:
     Main function to run the bot.
     """
     token = os.getenv("DISCORD_BOT_TOKEN")
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT)
     try:
         client.run(token)
     except discord.errors.DiscordServerError as e:
-        print(f"Discord server error: {e}")
+        logger.error("discord_server_error", extra={"fields": {"reason": str(e)}})
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        logger.exception("unexpected_error")
 
 if __name__ == "__main__":
     main()
@@ -1,44 +1,98 @@
 # model_config.py
 
+# Response cache settings shared by the deterministic-enough models; "disk" adds a SQLite tier in gpt_state/,
+# and with SHARED_STATE_URL set, replies are also shared between bot processes unless "shared" is False
+# An optional "semantic" entry, e.g. {"threshold": 0.9, "scope": "prompt"}, also reuses replies to reworded
+# questions (in memory, needs numpy), as long as their negations and numbers are the same; "scope": "prompt"
+# matches across conversations, for standalone questions
+DEFAULT_CACHE = {"max_entries": 512, "ttl": 24 * 60 * 60, "disk": True}
+
+# Background summarization of long conversations: once the turns not yet summarized take more than
+# "trigger_tokens" (default: 3/4 of the model's context_budget), all but the last "keep_recent" messages
+# are folded into a rolling summary by the cheap MODEL_CONFIG entry named in "model"
+DEFAULT_COMPACTION = {"model": "chatgpt", "keep_recent": 8}
+
+# Scheduler limits per model: requests/tokens per minute, concurrent upstream calls and queued requests
+BEDROCK_LIMITS = {"rpm": 60, "tpm": 100_000, "max_in_flight": 4, "max_queue": 32}
+
 MODEL_CONFIG = {
     "chatgpt": {
         "class": "GPTCompletions",
         "system_prompt": "Help the user with general questions",
-        "state_file": None  # No state file needed for GPTCompletions
+        "state_file": None,  # No state file needed for GPTCompletions
+        "stream": True,
+        "context_budget": 16000,  # Max prompt tokens per request
+        "cache": None,  # Sampled at temperature 2, so identical prompts should not share replies
+        "compaction": DEFAULT_COMPACTION,
+        "prompt_cache": True,
+        "limits": {"rpm": 500, "tpm": 200_000, "max_in_flight": 16, "max_queue": 64}
     },
     "llama3": {
         "class": "BedrockCompletions",
         "model": 'meta.llama3-70b-instruct-v1:0',
         "system_prompt": "You are a helpful assistant. You will be asked a lot of python coding questions.",
-        "state_file": 'llama3_completions_state.json'
+        "state_file": 'llama3_completions_state.json',
+        "stream": True,
+        "context_budget": 6000,
+        "cache": DEFAULT_CACHE,
+        "compaction": DEFAULT_COMPACTION,
+        "prompt_cache": False,
+        "limits": BEDROCK_LIMITS
     },
     "jamba_instruct": {
         "class": "BedrockCompletions",
         "model": 'ai21.jamba-instruct-v1:0',
         "system_prompt": "You are a helpful assistant. You will be asked a lot of python coding questions.",
-        "state_file": 'jamba_instruct_state.json'
+        "state_file": 'jamba_instruct_state.json',
+        "stream": True,
+        "context_budget": 16000,
+        "cache": DEFAULT_CACHE,
+        "compaction": DEFAULT_COMPACTION,
+        "prompt_cache": False,
+        "limits": BEDROCK_LIMITS
     },
     "mistral_large": {
         "class": "BedrockCompletions",
         "model": 'mistral.mistral-large-2402-v1:0',
         "system_prompt": "You are a helpful assistant. You will be asked a lot of python coding questions.",
-        "state_file": 'mistral_large_state.json'
+        "state_file": 'mistral_large_state.json',
+        "stream": True,
+        "context_budget": 16000,
+        "cache": DEFAULT_CACHE,
+        "compaction": DEFAULT_COMPACTION,
+        "prompt_cache": False,
+        "limits": BEDROCK_LIMITS
     },
     "command_r_plus": {
         "class": "BedrockCompletions",
         "model": 'cohere.command-r-plus-v1:0',
         "system_prompt": "You are a helpful assistant. You will be asked a lot of python coding questions.",
-        "state_file": 'command_r_plus.state.json'
+        "state_file": 'command_r_plus.state.json',
+        "stream": True,
+        "context_budget": 16000,
+        "cache": DEFAULT_CACHE,
+        "compaction": DEFAULT_COMPACTION,
+        "prompt_cache": False,
+        "limits": BEDROCK_LIMITS
     },
     "titan_text_premier": {
         "class": "BedrockCompletions",
         "model": 'amazon.titan-text-premier-v1:0',
         "system_prompt": None,
-        "state_file": 'titan_g1_premier.json'
+        "state_file": 'titan_g1_premier.json',
+        "stream": True,
+        "context_budget": 8000,
+        "cache": DEFAULT_CACHE,
+        "compaction": DEFAULT_COMPACTION,
+        "prompt_cache": False,
+        "limits": BEDROCK_LIMITS
     }
 }
 
-# Channel configuration
+# Channel configuration: a MODEL_CONFIG key, or several models with a fan-out "strategy" (Discord only):
+# "race" streams the first to start answering and cancels the rest, "compare" streams them all side by side,
+# and "fallback" tries them in order, moving on when one fails or takes more than "timeout" seconds to start.
+# Each model keeps its own conversation; with "race" and "fallback", only the model that answered records the turn.
 CHANNEL_CONFIG = {
     "chatgpt-channel": "chatgpt",
     "llama3-channel": "llama3",
@@ -46,4 +100,7 @@ CHANNEL_CONFIG = {
     "mistral-large-channel": "mistral_large",
     "command-r-plus-channel": "command_r_plus",
     "titan-text-premier-channel": "titan_text_premier",
+    "race-channel": {"models": ["llama3", "mistral_large", "chatgpt"], "strategy": "race"},
+    "compare-channel": {"models": ["chatgpt", "llama3", "command_r_plus"], "strategy": "compare"},
+    "fallback-channel": {"models": ["mistral_large", "llama3", "chatgpt"], "strategy": "fallback", "timeout": 10},
 }
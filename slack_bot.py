@@ -1,61 +1,211 @@
 from pathlib import Path
 import sys
 import os
-from slack_sdk import WebClient
+import asyncio
+from typing import Any, Awaitable, Callable, Tuple
 from slack_sdk.errors import SlackApiError
-from slack_bolt import App
 from flask import Flask, request, Response
-import json
 
 ROOT_DIR = Path(__file__).resolve().parent
 sys.path.append(str(ROOT_DIR))
 
-from src.chatgpt import GPTAssistant, GPTCompletions  # Import the GPTAssistant class
+from model_config import MODEL_CONFIG
+from src.chatgpt.chatgpt import GPTAssistant  # Import the GPTAssistant class
+from src.utils.utils import build_model
+from src.utils.events import BackgroundLoop, EventDeduplicator
+from src.utils.log import get_logger, new_correlation_id
+from src.utils.metrics import CONTENT_TYPE, REGISTRY, StatsGauges
+from src.utils.scheduler import Scheduler, SchedulerBusyError
+from src.utils.sessions import SessionManager, hold_turns
+from src.utils.streaming import AsyncProgressiveReply, SLACK_EDIT_INTERVAL
+from src.utils.transport import http_pool_stats
 
-# Initialize Slack Bolt App with your bot token and signing secret
-app = App(token=os.getenv("SLACK_BOT_TOKEN"), signing_secret=os.getenv("SLACK_SIGNING_SECRET"))
-
-# Initialize the Flask app for handling the challenge verification
-flask_app = Flask(__name__)
+# "flask" serves /slack/events from the WSGI app below; "asgi" serves `asgi_app` with an async Bolt app,
+# e.g. `SLACK_MODE=asgi uvicorn slack_bot:asgi_app --port 3000`
+SLACK_MODE = os.getenv("SLACK_MODE", "flask")
 
 # Initialize the GPTAssistant
 assistant_name = "Obi"
-instructions = "Help the user with general questions"
-gpt_completions = GPTCompletions(instructions)
+# Built from the same MODEL_CONFIG entry as the Discord bot's: context budget, caches and compaction
+gpt_completions = build_model(MODEL_CONFIG["chatgpt"])
+
+# One conversation per user in each channel (or per thread), bounded in memory
+sessions = SessionManager(
+    max_sessions=int(os.getenv("MAX_SESSIONS", "1000")),
+    idle_timeout=float(os.getenv("SESSION_IDLE_TIMEOUT", "1800")),
+)
+
+# Rate limits and bounded queueing for the OpenAI calls, from MODEL_CONFIG["chatgpt"]["limits"]
+scheduler = Scheduler(MODEL_CONFIG)
+
+# Slack re-delivers events it did not see acked within 3 seconds; each event_id is handled once
+event_dedup = EventDeduplicator()
+
+# Exported on /metrics next to the per-call metrics recorded by the model classes
+REGISTRY.register(StatsGauges("llm_scheduler", "Model scheduler state.", scheduler.stats, label="model"))
+REGISTRY.register(StatsGauges("llm_sessions", "Conversation sessions held in memory.", sessions.stats))
+REGISTRY.register(StatsGauges("llm_http_pool", "HTTP connection pools of the model clients.", http_pool_stats, label="client"))
+REGISTRY.register(StatsGauges(
+    "llm_slack_events", "Slack event deduplication.", lambda: {"duplicates": event_dedup.duplicates}
+))
+if gpt_completions.compactor is not None:
+    REGISTRY.register(StatsGauges(
+        "llm_compaction", "Background conversation compaction.", lambda: {"chatgpt": gpt_completions.compactor.stats()},
+        label="model"
+    ))
+if gpt_completions.cache is not None:
+    REGISTRY.register(StatsGauges(
+        "llm_response_cache", "Response cache state.", lambda: {"chatgpt": gpt_completions.cache.stats()}, label="model"
+    ))
+
+logger = get_logger(__name__)
+
+def reply_callbacks(client: Any, channel_id: str) -> Tuple[Callable[[str], Awaitable[str]], Callable[[str, str], Awaitable[Any]]]:
+    """
+    Build async post/update callables over either a blocking WebClient or an AsyncWebClient.
+
+    Blocking client calls run in a thread so they never stall the event loop.
+
+    Args:
+        client (Any): The Slack client Bolt passed to the listener.
+        channel_id (str): The channel to reply in.
+
+    Returns:
+        Tuple: A coroutine function posting a message and returning its ts, and one updating a message by ts.
+    """
+    async def call(method: str, **kwargs: Any) -> Any:
+        func = getattr(client, method)
+        if asyncio.iscoroutinefunction(func):
+            return await func(**kwargs)
+        return await asyncio.to_thread(func, **kwargs)
+
+    async def post(text: str) -> str:
+        return (await call("chat_postMessage", channel=channel_id, text=text))["ts"]
+
+    async def update(ts: str, text: str) -> Any:
+        return await call("chat_update", channel=channel_id, ts=ts, text=text)
 
-# Event listener for messages
-@app.message("")
-def handle_message(event, say):
+    return post, update
+
+async def respond(event: dict, client: Any, event_id: str = None) -> None:
+    """
+    Stream the model's answer to a Slack message, outside of Slack's request cycle.
+
+    Args:
+        event (dict): The Slack message event.
+        client (Any): The Slack client Bolt passed to the listener.
+        event_id (str, optional): The event's ID, used as the correlation ID of its logs.
+    """
+    new_correlation_id(event_id)
     user_input = event.get('text', '')
     channel_id = event.get('channel')
+    # Thread replies share the thread's conversation; top-level messages get one per user
+    conversation_key = ("slack", channel_id, event.get('thread_ts') or event.get('user', ''))
+    session = sessions.get("chatgpt", gpt_completions, conversation_key)
+    post, update = reply_callbacks(client, channel_id)
+
+    # Messages of one conversation (a user's, or a whole thread's) are answered one after another
+    async with hold_turns([session]):
+        try:
+            # Post the reply as soon as the first tokens arrive and keep editing it as the rest streams in
+            reply = AsyncProgressiveReply(
+                send=post, edit=update, limit=4000, min_interval=SLACK_EDIT_INTERVAL, measure="bytes", platform="slack"
+            )
+            deltas = scheduler.for_model("chatgpt").stream(
+                lambda: session.async_stream_message(user_input), tokens=session.prompt_tokens(user_input)
+            )
+            async for delta in deltas:
+                await reply.feed(delta)
+            await reply.finish()
+
+        except SchedulerBusyError:
+            await post("The model is busy right now. Please try again in a moment.")
+        except SlackApiError as e:
+            logger.error("slack_send_failed", extra={"fields": {"reason": e.response['error']}})
+        except Exception as e:
+            logger.error("model_call_failed", extra={"fields": {"model": "chatgpt", "reason": str(e)}})
+
+if SLACK_MODE == "asgi":
+    from slack_bolt.async_app import AsyncApp
+    from slack_bolt.adapter.asgi.async_handler import AsyncSlackRequestHandler
+
+    app = AsyncApp(token=os.getenv("SLACK_BOT_TOKEN"), signing_secret=os.getenv("SLACK_SIGNING_SECRET"))
+    background_tasks: set = set()
+
+    # Event listener for messages; Bolt acks before listeners run, so only hand the work off here
+    @app.message("")
+    async def handle_message(event, body, client):
+        if event_dedup.seen(body.get('event_id')):
+            return
+        task = asyncio.create_task(respond(event, client, body.get('event_id')))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+    # Bolt answers Slack's url_verification challenge itself
+    slack_handler = AsyncSlackRequestHandler(app)
+
+    async def asgi_app(scope: dict, receive: Callable, send: Callable) -> None:
+        # Serve /metrics beside the Slack endpoints
+        if scope["type"] == "http" and scope["path"] == "/metrics":
+            body = REGISTRY.render().encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", CONTENT_TYPE.encode()), (b"content-length", str(len(body)).encode())],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        await slack_handler(scope, receive, send)
+else:
+    from slack_bolt import App
+    from slack_bolt.adapter.flask import SlackRequestHandler
+
+    # Initialize Slack Bolt App with your bot token and signing secret
+    app = App(token=os.getenv("SLACK_BOT_TOKEN"), signing_secret=os.getenv("SLACK_SIGNING_SECRET"))
+    handler = SlackRequestHandler(app)
+
+    # Model calls and Slack API updates run here, never on the thread serving the HTTP request
+    worker = BackgroundLoop("slack-worker")
+
+    # Event listener for messages
+    @app.message("")
+    def handle_message(event, body, client):
+        if event_dedup.seen(body.get('event_id')):
+            return
+        worker.submit(respond(event, client, body.get('event_id')))
 
-    try:
-        # Send the user message to GPTAssistant and get the response
-        assistant_reply = gpt_completions.send_message(user_input)
+    # Initialize the Flask app for handling the challenge verification
+    flask_app = Flask(__name__)
 
-        # Split and send the response in chunks if necessary
-        for i in range(0, len(assistant_reply), 4000):  # Slack limit is 4000 characters
-            chunk = assistant_reply[i:i + 4000]
-            say(text=chunk, channel=channel_id)
+    # Route to handle Slack events and challenge verification
+    @flask_app.route("/slack/events", methods=["POST"])
+    def slack_events():
+        # Parse the request payload
+        event_data = request.get_json(silent=True) or {}
 
-    except SlackApiError as e:
-        print(f"Error sending message: {e.response['error']}")
-    except Exception as e:
-        print(f"There was a problem calling the OpenAI API: {e}")
+        # Handle Slack challenge verification
+        if "challenge" in event_data:
+            return Response(event_data["challenge"], status=200, mimetype="text/plain")
 
-# Route to handle Slack events and challenge verification
-@flask_app.route("/slack/events", methods=["POST"])
-def slack_events():
-    # Parse the request payload
-    event_data = request.get_json()
+        # Ack retries of events we already accepted straight away, and ask Slack to stop retrying
+        if request.headers.get("X-Slack-Retry-Num") and event_data.get("event_id") in event_dedup:
+            return Response("", status=200, headers={"X-Slack-No-Retry": "1"})
 
-    # Handle Slack challenge verification
-    if "challenge" in event_data:
-        return Response(event_data["challenge"], status=200, mimetype="text/plain")
+        # Let Bolt verify and ack the event; the listener hands the work to the worker loop
+        return handler.handle(request)
 
-    # Let Bolt handle the other events (if it's not a challenge request)
-    return app.server.dispatch(request)
+    # Prometheus scrape endpoint
+    @flask_app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(REGISTRY.render(), status=200, content_type=CONTENT_TYPE)
 
 # Run the Flask app to listen for Slack events
 if __name__ == "__main__":
-    flask_app.run(port=3000)
\ No newline at end of file
+    if SLACK_MODE == "asgi":
+        try:
+            import uvicorn
+        except ImportError:  # Only needed to serve the ASGI app without an external server
+            raise RuntimeError("SLACK_MODE=asgi needs the uvicorn package (pip install uvicorn)")
+        uvicorn.run(asgi_app, port=3000)
+    else:
+        flask_app.run(port=3000, threaded=True)
@@ -1,25 +1,109 @@
 import sys
+import copy
+import asyncio
 import boto3
-import json
+import botocore.session
+import functools
+import threading
+from contextlib import aclosing
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import os
-from typing import List, Dict, Optional
+from typing import Any, AsyncIterator, Iterator, List, Dict, Optional, Sequence, Tuple
 
 aws_access_key_id = os.getenv("BOT_AWS_ACCESS_KEY_ID")
 aws_secret_access_key = os.getenv("BOT_AWS_SECRET_ACCESS_KEY")
 
 ROOT_DIR = Path(__file__).resolve().parent.parent.parent
-print(f"ROOT_DIR: {ROOT_DIR}")
 sys.path.append(str(ROOT_DIR))
 
+from src.state.conversation_store import (
+    ConversationKey, ConversationStore, get_default_store, import_legacy_state, legacy_key
+)
+from src.state.history import HistoryEntry, store_history
+from src.utils.compaction import SUMMARY_PREFIX, Compactor
+from src.utils.context_window import ContextWindow, TokenLedger, approximate_token_count
+from src.utils.metrics import STATE_SAVE_LATENCY, ModelCall, observe_model_call
+from src.utils.response_cache import ResponseCache
+from src.utils.single_flight import SingleFlight
+from src.utils.transport import bedrock_client_config, botocore_pool_stats, register_pool
+
 GPT_STATE_DIR = ROOT_DIR / 'gpt_state'
 
+# boto3 has no native asyncio support, so async calls run on a dedicated pool sized for
+# concurrent conversations rather than asyncio's CPU-bound default executor.
+BEDROCK_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("BEDROCK_MAX_WORKERS", "32")),
+    thread_name_prefix="bedrock",
+)
+
+_client_lock = threading.Lock()
+_shared_client: Optional[Any] = None
+
+def get_aws_session() -> boto3.Session:
+    """
+    Returns a new boto3 session with the bot's AWS credentials, e.g. for the bedrock and s3 clients of batch jobs.
+
+    Returns:
+        boto3.Session: The session.
+    """
+    return boto3.Session(
+        aws_access_key_id=aws_access_key_id,
+        aws_secret_access_key=aws_secret_access_key,
+        region_name="us-east-1",
+    )
+
+def get_bedrock_client() -> Any:
+    """
+    Returns the bedrock-runtime client shared by every BedrockCompletions instance.
+
+    boto3 clients are thread-safe, so one session and client, with one connection pool, serve all models.
+    The client is built on first use; building it is guarded because boto3 sessions themselves are not
+    thread-safe. Its pool size, timeouts and retries come from `bedrock_client_config`.
+
+    Returns:
+        Any: The shared bedrock-runtime client.
+    """
+    global _shared_client
+    with _client_lock:
+        if _shared_client is None:
+            client = get_aws_session().client("bedrock-runtime", config=bedrock_client_config())
+            register_pool("bedrock", lambda: botocore_pool_stats(client))
+            _shared_client = client
+        return _shared_client
+
+# Marks the end of a prompt prefix Bedrock may cache; only some model families support it
+# (e.g. Anthropic Claude 3.5+ and Amazon Nova), see the "prompt_cache" setting in MODEL_CONFIG
+CACHE_POINT = {"cachePoint": {"type": "default"}}
+
+@functools.lru_cache(maxsize=None)
+def converse_supports_prompt_cache() -> bool:
+    """
+    Checks whether the installed botocore knows Converse cachePoint blocks. Older releases reject them
+    before sending the request, and report no cache read/write token counts.
+
+    Returns:
+        bool: True if system content blocks accept "cachePoint".
+    """
+    service_model = botocore.session.get_session().get_service_model("bedrock-runtime")
+    return "cachePoint" in service_model.shape_for("SystemContentBlock").members
+
+# Sampling settings of every chat request, and of single-turn batch requests so their answers match the bot's
+INFERENCE_CONFIG = {"maxTokens": 1000, "temperature": 0.5, "topP": 0.9}
+
 class BedrockCompletions:
     def __init__(
         self, 
         system_prompt: str = "You are a helpful assistant.", 
         model: str = "meta.llama3-70b-instruct-v1:0", 
-        state_file: str = "bedrock_completions_state.json"
+        state_file: str = "bedrock_completions_state.json",
+        client: Optional[Any] = None,
+        store: Optional[ConversationStore] = None,
+        conversation_key: Optional[ConversationKey] = None,
+        context_budget: Optional[int] = None,
+        cache: Optional[ResponseCache] = None,
+        compactor: Optional[Compactor] = None,
+        prompt_cache: bool = False
     ) -> None:
         """
         Initializes the BedrockCompletions class with AWS client, system prompt, model, and state file.
@@ -28,58 +112,391 @@ class BedrockCompletions:
             system_prompt (str): The initial system prompt for the assistant.
             model (str): The model ID from AWS Bedrock's list of approved models.
             state_file (str): The filename to store the state of message history.
+            client (Optional[Any]): A preconfigured bedrock-runtime client. Defaults to the shared client.
+            store (Optional[ConversationStore]): Where the history is persisted. Defaults to the shared store.
+            conversation_key (Optional[ConversationKey]): The conversation to use. Defaults to the model's
+                shared history migrated from `state_file`.
+            context_budget (Optional[int]): Maximum prompt tokens sent per request. The full history is sent if omitted.
+            cache (Optional[ResponseCache]): Reuses replies to identical requests. Caching is off if omitted.
+            compactor (Optional[Compactor]): Summarizes older turns of long conversations in the background.
+                Older turns are only trimmed by `context_budget` if omitted.
+            prompt_cache (bool): Marks the stable prompt prefix with cachePoint blocks so Bedrock can cache it.
+                Only enable it for models that support prompt caching. Defaults to False.
+
+        Raises:
+            ValueError: If `prompt_cache` is set but the installed botocore doesn't support cachePoint blocks.
         """
-        self.client = boto3.client(
-            "bedrock-runtime",
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key,
-            region_name="us-east-1",
-        )
+        if prompt_cache and not converse_supports_prompt_cache():
+            raise ValueError(
+                f"prompt_cache needs a boto3/botocore release whose Converse API supports cachePoint "
+                f"(botocore {botocore.__version__} doesn't); upgrade it or disable prompt_cache for {model}"
+            )
+        self.client = client or get_bedrock_client()
         self.state_file: Path = GPT_STATE_DIR / state_file
         self.model: str = model
         self.system_prompt: List[Dict[str, str]] = [{"text": system_prompt}] if system_prompt else []
-        self.message_history: List[Dict[str, List[Dict[str, str]]]] = []
-        self.load_state()
+        self.store: ConversationStore = store or get_default_store()
+        self.conversation_key: ConversationKey = conversation_key or legacy_key(self.state_file)
+        self._message_history: Optional[List[Dict[str, List[Dict[str, str]]]]] = None
+        self._persisted_count: int = 0
+        self.context_window: Optional[ContextWindow] = ContextWindow(context_budget) if context_budget else None
+        # Token counts of this session's history, updated as messages are added or rolled back
+        self._tokens: TokenLedger = self._new_ledger()
+        self.cache: Optional[ResponseCache] = cache
+        self.compactor: Optional[Compactor] = compactor
+        # Rolling summary of the leading messages, {"text": str, "upto": int}; loaded with the history
+        self.summary: Optional[Dict[str, Any]] = None
+        self.generation: int = 0  # Bumped when the context is cleared, so late compactions are discarded
+        self.prompt_cache: bool = prompt_cache
+        # Where the trimmed context window started last turn; kept in place so the prompt prefix is stable
+        self._window_start: int = 0
+        # Shared with every session copy, so identical concurrent requests reach Bedrock once
+        self.single_flight: SingleFlight = SingleFlight()
+        # Serializes the async turns of this session, from appending the prompt to recording the reply
+        self._history_lock: asyncio.Lock = asyncio.Lock()
+        # Held by the bots around a whole turn, posting the reply included; see SessionManager
+        self.turn_lock: asyncio.Lock = asyncio.Lock()
+
+    @property
+    def message_history(self) -> List[Dict[str, List[Dict[str, str]]]]:
+        """
+        The conversation's messages, loaded from the store on first access.
+        """
+        if self._message_history is None:
+            self.load_state()
+        return self._message_history
+
+    @message_history.setter
+    def message_history(self, messages: List[Dict[str, List[Dict[str, str]]]]) -> None:
+        self._message_history = messages
 
-    def save_state(self, max_messages: int = 20) -> None:
+    def for_conversation(self, conversation_key: ConversationKey) -> "BedrockCompletions":
         """
-        Saves the message history to a file, truncating if there are more than a specified number of user messages.
+        Returns a copy of this model bound to another conversation.
+
+        The copy shares the client, store, cache and context window, so it is cheap to create.
+        Its history is loaded lazily from the store.
 
         Args:
-            max_messages (int): The maximum number of user messages to retain in the message history.
+            conversation_key (ConversationKey): The conversation the copy should use.
+
+        Returns:
+            BedrockCompletions: The model bound to `conversation_key`.
+        """
+        session = copy.copy(self)
+        session.conversation_key = conversation_key
+        session._message_history = None
+        session._persisted_count = 0
+        session.summary = None
+        session._window_start = 0
+        session._history_lock = asyncio.Lock()
+        session._tokens = session._new_ledger()
+        session.turn_lock = asyncio.Lock()
+        return session
+
+    def save_state(self, completed_only: bool = False) -> None:
         """
-        user_messages = [msg for msg in self.message_history if msg["role"] == "user"]
-        
-        if len(user_messages) > max_messages:
-            self.message_history = self.message_history[-5:]
+        Persists the messages added since the last save.
 
-        with open(self.state_file, 'w') as f:
-            json.dump(self.message_history, f)
+        The full history is kept; `context_window` bounds what is actually sent to the model.
+
+        Args:
+            completed_only (bool): Leaves out a trailing user message still waiting for its reply, e.g. when
+                a session is saved while a request is in flight. Defaults to False.
+        """
+        end = len(self.message_history)
+        if completed_only:
+            while end > self._persisted_count and self.message_history[end - 1].get("role") == "user":
+                end -= 1
+        with STATE_SAVE_LATENCY.time(store=type(self.store).__name__):
+            self.store.append(self.conversation_key, self.message_history[self._persisted_count:end])
+        self._persisted_count = end
 
     def clear_context(self) -> None:
         """
         Clears the context by resetting the message history and saving an empty state.
         """
         self.message_history = []
-        with open(self.state_file, 'w') as f:
-            json.dump(self.message_history, f)
+        self.store.clear(self.conversation_key)
+        self._persisted_count = 0
+        self.summary = None
+        self.generation += 1
+        self._window_start = 0
 
     def load_state(self) -> None:
         """
-        Loads the message history from a file if it exists and is not empty.
+        Loads the message history from the store, importing the legacy JSON state file on first use.
         """
-        if self.state_file.exists():
-            try:
-                with open(self.state_file, 'r') as f:
-                    file_content = f.read().strip()
+        if self.conversation_key == legacy_key(self.state_file):
+            import_legacy_state(self.store, self.state_file)
+        self.message_history = self.store.load(self.conversation_key)
+        self._persisted_count = len(self.message_history)
+        summary = self.store.load_summary(self.conversation_key)
+        self.summary = summary if summary and summary["upto"] <= len(self.message_history) else None
+
+    def sync(self) -> bool:
+        """
+        Drops the in-memory history if the stored conversation changed since this session last read or
+        wrote it, e.g. because another process answered in it. It is reloaded on next access.
+
+        Returns:
+            bool: Whether the history was dropped.
+        """
+        if self._message_history is None or self.store.count(self.conversation_key) == self._persisted_count:
+            return False
+        self._message_history = None
+        self.summary = None
+        self.generation += 1
+        self._window_start = 0
+        return True
+
+    def summary_start(self) -> int:
+        """
+        Returns the position of the first message not covered by the rolling summary.
+        """
+        return self.summary["upto"] if self.summary else 0
+
+    def apply_summary(self, summary: Dict[str, Any], generation: int) -> bool:
+        """
+        Installs and persists a new rolling summary produced by the compactor.
+
+        Args:
+            summary (Dict[str, Any]): {"text": str, "upto": int}.
+            generation (int): The `generation` the summary was computed for.
+
+        Returns:
+            bool: False if the conversation was cleared since, in which case the summary is discarded.
+        """
+        if generation != self.generation or summary["upto"] > len(self.message_history):
+            return False
+        self.store.save_summary(self.conversation_key, summary)
+        self.summary = summary
+        return True
+
+    def _window(self, history: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Lays out the conversation part of a request: the summary exchange, if any, and where the part
+        of `history` that is sent starts, trimmed to the context budget if one is configured.
+
+        With `prompt_cache`, the window start only moves when the budget overflows, so the prefix
+        stays byte-identical across turns.
+
+        Args:
+            history (List[Dict[str, Any]]): The message history to send, ending with the new user message.
+
+        Returns:
+            Tuple[List[Dict[str, Any]], int]: The summary messages and the position of the first history message sent.
+        """
+        start = self.summary_start()
+        # Not every Bedrock model accepts a system prompt, so the summary opens the conversation instead
+        prefix = [
+            {"role": "user", "content": [{"text": SUMMARY_PREFIX + self.summary["text"]}]},
+            {"role": "assistant", "content": [{"text": "Understood."}]},
+        ] if self.summary else []
+        if self.context_window is None:
+            return prefix, start
+        reserved = sum(self.context_window.text_tokens(block["text"]) for block in self.system_prompt)
+        reserved += sum(self.context_window.message_tokens(message) for message in prefix)
+        if self.prompt_cache:
+            self._window_start = self.context_window.stable_start(
+                history, max(start, self._window_start), reserved=reserved, first_role="user", ledger=self._tokens
+            )
+            return prefix, self._window_start
+        fitted = self.context_window.fit(history, reserved=reserved, first_role="user", start=start, ledger=self._tokens)
+        return prefix, len(history) - len(fitted)
+
+    def prompt_tokens(self, user_input: str) -> int:
+        """
+        Estimates the input tokens of the request a turn with this input would send: the system prompt,
+        the summary and the history left after trimming, not just the new message.
+
+        Args:
+            user_input (str): The user's input message.
+
+        Returns:
+            int: The estimated prompt tokens.
+        """
+        history = self.message_history + [{"role": "user", "content": [{"text": user_input}]}]
+        window_start = self._window_start
+        prefix, start = self._window(history)
+        self._window_start = window_start  # Only a request that is sent moves the window
+        count_text = self.context_window.text_tokens if self.context_window is not None else approximate_token_count
+        self._tokens.sync(history)
+        return (
+            sum(count_text(block["text"]) for block in self.system_prompt)
+            + sum(self._tokens.message_tokens(message) for message in prefix)
+            + self._tokens.total(start)
+        )
+
+    def _converse_kwargs(self) -> Dict[str, Any]:
+        """
+        Builds the keyword arguments for a converse call from the current message history,
+        trimmed to the context budget if one is configured.
+
+        With `prompt_cache`, the request is laid out so its prefix stays byte-identical across turns:
+        the window start only moves when the budget overflows, and cache points follow the system prompt,
+        the summary and the previous turn.
+
+        Returns:
+            Dict[str, Any]: The request parameters for `client.converse`.
+        """
+        prefix, start = self._window(self.message_history)
+        messages = self.message_history[start:]
+
+        system = self.system_prompt
+        messages = prefix + list(messages)
+        if self.prompt_cache:
+            system = system + [CACHE_POINT] if system else system
+            # After the summary exchange, and after the turn before the new user message
+            positions = {len(prefix) - 1} if prefix else set()
+            if len(messages) > 1:
+                positions.add(len(messages) - 2)
+            for position in positions:
+                message = messages[position]
+                messages[position] = {**message, "content": message["content"] + [CACHE_POINT]}
+
+        return {
+            "modelId": self.model,
+            "messages": messages,
+            "system": system,
+            "inferenceConfig": dict(INFERENCE_CONFIG),
+            "additionalModelRequestFields": {},
+        }
+
+    def single_turn_kwargs(self, prompt: str) -> Dict[str, Any]:
+        """
+        Builds the keyword arguments for a converse call answering one prompt with the system prompt
+        and chat settings, without the conversation history.
+
+        Args:
+            prompt (str): The prompt.
+
+        Returns:
+            Dict[str, Any]: The request parameters for `client.converse`.
+        """
+        return {
+            "modelId": self.model,
+            "messages": [{"role": "user", "content": [{"text": prompt}]}],
+            "system": self.system_prompt,
+            "inferenceConfig": dict(INFERENCE_CONFIG),
+            "additionalModelRequestFields": {},
+        }
+
+    @staticmethod
+    def _text_message(text: str) -> Dict[str, Any]:
+        return {"role": "assistant", "content": [{"text": text}]}
+
+    def _new_ledger(self) -> TokenLedger:
+        return self.context_window.ledger() if self.context_window is not None else TokenLedger()
+
+    def _discard_message(self, message: Dict[str, Any]) -> None:
+        # Removes this very message after a failed call; an earlier, equal prompt of the user stays
+        history = self.message_history
+        for i in range(len(history) - 1, -1, -1):
+            if history[i] is message:
+                del history[i]
+                return
+
+    def _cached_reply(self, kwargs: Dict[str, Any], approximate: bool = True) -> Optional[str]:
+        return self.cache.get(kwargs, approximate) if self.cache is not None else None
+
+    def _cache_reply(self, kwargs: Dict[str, Any], reply: str) -> None:
+        if self.cache is not None and reply:
+            self.cache.put(kwargs, reply)
+
+    def _record_reply(self, assistant_message: Dict[str, Any]) -> str:
+        """
+        Appends an assistant message to the history and persists it.
+
+        Args:
+            assistant_message (Dict[str, Any]): The assistant message in converse format.
+
+        Returns:
+            str: The assistant's response text.
+        """
+        self.message_history.append(assistant_message)
+        self.save_state()
+        if self.compactor is not None:
+            self.compactor.maybe_compact(self)
+
+        return assistant_message['content'][0]['text']
+
+    @staticmethod
+    def _record_usage(usage: Dict[str, Any], call: ModelCall) -> None:
+        call.usage(
+            usage.get("inputTokens"),
+            usage.get("outputTokens"),
+            usage.get("cacheReadInputTokens"),
+            usage.get("cacheWriteInputTokens"),
+        )
+
+    def _converse(self, kwargs: Dict[str, Any], call: ModelCall) -> Dict[str, Any]:
+        """
+        Calls converse and records the token usage Bedrock reports.
+
+        Args:
+            kwargs (Dict[str, Any]): The converse request parameters.
+            call (ModelCall): The metrics of the call.
+
+        Returns:
+            Dict[str, Any]: The raw converse response.
+        """
+        response = self.client.converse(**kwargs)
+        self._record_usage(response.get("usage", {}), call)
+        return response
+
+    def complete(self, prompt: str, max_tokens: int = 1000) -> str:
+        """
+        Answers a single prompt outside the conversation, e.g. to summarize it. Nothing is added to the history.
+
+        Args:
+            prompt (str): The prompt.
+            max_tokens (int): Maximum tokens to generate. Defaults to 1000.
+
+        Returns:
+            str: The model's reply.
+        """
+        kwargs = {
+            "modelId": self.model,
+            "messages": [{"role": "user", "content": [{"text": prompt}]}],
+            "inferenceConfig": {"maxTokens": max_tokens, "temperature": 0.2},
+        }
+        with observe_model_call(self.model) as call, call.upstream():
+            response = self._converse(kwargs, call)
+        return response["output"]["message"]["content"][0]["text"]
 
-                    if not file_content:
-                        self.message_history = []
-                    else:
-                        self.message_history = json.loads(file_content)
-            except json.JSONDecodeError:
-                print(f"WARNING: '{self.state_file}' contains invalid JSON. Initializing with an empty history.")
-                self.message_history = []
+    async def async_ask(self, prompt: str) -> Dict[str, Any]:
+        """
+        Asynchronously answers one prompt as the first turn of a fresh conversation, e.g. for batch runs.
+        Nothing is added to the history, and only exact repeats are answered from the response cache.
+
+        Args:
+            prompt (str): The prompt.
+
+        Returns:
+            Dict[str, Any]: {"reply": str, "input_tokens": int, "output_tokens": int, "cached": bool}
+        """
+        kwargs = self.single_turn_kwargs(prompt)
+        with observe_model_call(self.model) as call:
+            # Exact matches only: a batch of similar prompts should get an answer each
+            reply = self._cached_reply(kwargs, approximate=False)
+            if reply is not None:
+                call.cached()
+            else:
+                loop = asyncio.get_running_loop()
+                with call.upstream():
+                    response = await self.single_flight.ado(
+                        ResponseCache.make_key(kwargs),
+                        lambda: loop.run_in_executor(BEDROCK_EXECUTOR, lambda: self._converse(kwargs, call)),
+                    )
+                reply = response["output"]["message"]["content"][0]["text"]
+                self._cache_reply(kwargs, reply)
+        return {
+            "reply": reply,
+            "input_tokens": call.input_tokens,
+            "output_tokens": call.output_tokens,
+            "cached": call.outcome == "cached",
+        }
 
     def send_message(self, user_input: str) -> Optional[str]:
         """
@@ -97,23 +514,211 @@ class BedrockCompletions:
         })
 
         try:
-            response = self.client.converse(
-                modelId=self.model,
-                messages=self.message_history,
-                system=self.system_prompt,
-                inferenceConfig={"maxTokens": 1000, "temperature": 0.5, "topP": 0.9},
-                additionalModelRequestFields={}
-            )
+            with observe_model_call(self.model) as call:
+                kwargs = self._converse_kwargs()
+                cached = self._cached_reply(kwargs)
+                if cached is not None:
+                    call.cached()
+                    return self._record_reply(self._text_message(cached))
+
+                with call.upstream():
+                    response = self.single_flight.do(
+                        ResponseCache.make_key(kwargs), lambda: self._converse(kwargs, call)
+                    )
+                reply = self._record_reply(response["output"]["message"])
+                self._cache_reply(kwargs, reply)
+                return reply
 
-            assistant_message = response["output"]["message"]
-            self.message_history.append(assistant_message)
-            self.save_state()
+        except Exception:
+            return None  # Logged with its reason by observe_model_call
 
-            return assistant_message['content'][0]['text']
+    async def async_send_message(self, user_input: str) -> str:
+        """
+        Asynchronously sends a user input message to the model without blocking the event loop.
 
-        except Exception as e:
-            print(f"ERROR: Can't invoke '{self.model}'. Reason: {e}")
-            return None
+        Unlike `send_message`, errors are raised to the caller and the unanswered user message
+        is removed from the history so the conversation keeps alternating roles.
+
+        Args:
+            user_input (str): The user's input message to send to the model.
+
+        Returns:
+            str: The assistant's response text.
+        """
+        # One turn at a time: overlapping turns would break role alternation and the rollback
+        async with self._history_lock:
+            user_message = {"role": "user", "content": [{"text": user_input}]}
+            self.message_history.append(user_message)
+            with observe_model_call(self.model) as call:
+                kwargs = self._converse_kwargs()
+                cached = self._cached_reply(kwargs)
+                if cached is not None:
+                    call.cached()
+                    return self._record_reply(self._text_message(cached))
+
+                loop = asyncio.get_running_loop()
+                try:
+                    with call.upstream():
+                        response = await self.single_flight.ado(
+                            ResponseCache.make_key(kwargs),
+                            lambda: loop.run_in_executor(BEDROCK_EXECUTOR, lambda: self._converse(kwargs, call)),
+                        )
+                except BaseException:  # Also when the caller cancels the request or stops reading the stream
+                    self._discard_message(user_message)
+                    raise
+
+                reply = self._record_reply(response["output"]["message"])
+                self._cache_reply(kwargs, reply)
+                return reply
+
+    def _iter_stream_text(self, response: Dict[str, Any], call: ModelCall) -> Iterator[str]:
+        """
+        Yields the text deltas from a converse_stream response, recording the usage in its metadata event.
+
+        Args:
+            response (Dict[str, Any]): The raw converse_stream response.
+            call (ModelCall): The metrics of the call.
+
+        Yields:
+            str: Each non-empty text delta in arrival order.
+        """
+        for event in response["stream"]:
+            if "metadata" in event:
+                self._record_usage(event["metadata"].get("usage", {}), call)
+            text = event.get("contentBlockDelta", {}).get("delta", {}).get("text")
+            if text:
+                yield text
+
+    def stream_message(self, user_input: str) -> Iterator[str]:
+        """
+        Sends a user input message with converse_stream and yields the response as it is generated.
+
+        The full reply is appended to the history once the stream completes.
+
+        Args:
+            user_input (str): The user's input message to send to the model.
+
+        Yields:
+            str: Text deltas of the assistant's response.
+        """
+        user_message = {"role": "user", "content": [{"text": user_input}]}
+        self.message_history.append(user_message)
+
+        with observe_model_call(self.model) as call:
+            kwargs = self._converse_kwargs()
+            cached = self._cached_reply(kwargs)
+            if cached is not None:
+                call.cached()
+                yield cached
+                self._record_reply(self._text_message(cached))
+                return
+
+            parts: List[str] = []
+            try:
+                with call.upstream():
+                    upstream = self.single_flight.stream(
+                        ResponseCache.make_key(kwargs),
+                        lambda: self._iter_stream_text(self.client.converse_stream(**kwargs), call),
+                    )
+                    for text in upstream:
+                        call.delta()
+                        parts.append(text)
+                        yield text
+            except BaseException:
+                self._discard_message(user_message)
+                raise
+
+            self._cache_reply(kwargs, self._record_reply(self._text_message("".join(parts))))
+
+    async def _upstream_stream(self, kwargs: Dict[str, Any], call: ModelCall) -> AsyncIterator[str]:
+        """
+        Runs a blocking converse_stream on the Bedrock executor and hands its deltas back to the
+        event loop through a queue. If the consumer stops reading, the executor thread stops too
+        and closes the response stream rather than reading the reply to its end.
+
+        Args:
+            kwargs (Dict[str, Any]): The converse_stream request parameters.
+            call (ModelCall): The metrics of the call.
+
+        Yields:
+            str: Text deltas in arrival order.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        stopped = threading.Event()
+
+        def produce() -> None:
+            response = None
+            try:
+                response = self.client.converse_stream(**kwargs)
+                for text in self._iter_stream_text(response, call):
+                    if stopped.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, text)
+            except Exception as e:
+                if not stopped.is_set():
+                    loop.call_soon_threadsafe(queue.put_nowait, e)
+            else:
+                if not stopped.is_set():
+                    loop.call_soon_threadsafe(queue.put_nowait, done)
+            finally:
+                stream = (response or {}).get("stream")
+                if stopped.is_set() and hasattr(stream, "close"):
+                    stream.close()  # Releases the HTTP connection
+
+        loop.run_in_executor(BEDROCK_EXECUTOR, produce)
+
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stopped.set()
+
+    async def async_stream_message(self, user_input: str) -> AsyncIterator[str]:
+        """
+        Asynchronously streams the response to a user input message.
+
+        Args:
+            user_input (str): The user's input message to send to the model.
+
+        Yields:
+            str: Text deltas of the assistant's response.
+        """
+        # One turn at a time: overlapping turns would break role alternation and the rollback
+        async with self._history_lock:
+            user_message = {"role": "user", "content": [{"text": user_input}]}
+            self.message_history.append(user_message)
+            with observe_model_call(self.model) as call:
+                kwargs = self._converse_kwargs()
+                cached = self._cached_reply(kwargs)
+                if cached is not None:
+                    call.cached()
+                    yield cached
+                    self._record_reply(self._text_message(cached))
+                    return
+
+                parts: List[str] = []
+                try:
+                    with call.upstream():
+                        upstream = self.single_flight.astream(
+                            ResponseCache.make_key(kwargs), lambda: self._upstream_stream(kwargs, call)
+                        )
+                        async with aclosing(upstream):
+                            async for text in upstream:
+                                call.delta()
+                                parts.append(text)
+                                yield text
+                except BaseException:
+                    self._discard_message(user_message)
+                    raise
+
+                self._cache_reply(kwargs, self._record_reply(self._text_message("".join(parts))))
 
     def get_message_history(self) -> List[Dict[str, List[Dict[str, str]]]]:
         """
@@ -123,3 +728,26 @@ class BedrockCompletions:
             List[Dict[str, List[Dict[str, str]]]]: The list of messages in the conversation history.
         """
         return self.message_history
+
+    def iter_message_history(
+        self,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        order: str = "asc",
+        roles: Optional[Sequence[str]] = None
+    ) -> Iterator[HistoryEntry]:
+        """
+        Lazily iterates over the persisted history, reading it from the store page by page.
+
+        Args:
+            after (Optional[str]): Cursor of the entry to continue after. Starts at the beginning if omitted.
+            limit (Optional[int]): Maximum number of entries. Unlimited if omitted.
+            order (str): "asc" for oldest first, "desc" for newest first. Defaults to "asc".
+            roles (Optional[Sequence[str]]): Roles to keep, e.g. ("user", "assistant"). All roles if omitted.
+
+        Returns:
+            Iterator[HistoryEntry]: The messages, each with the cursor to continue after it.
+        """
+        if self.conversation_key == legacy_key(self.state_file):
+            import_legacy_state(self.store, self.state_file)
+        return store_history(self.store, self.conversation_key, after, limit, order, roles)
@@ -1,22 +1,93 @@
 from pathlib import Path
 import sys
-from openai import OpenAI
+import asyncio
+import copy
+from contextlib import aclosing
+from openai import APIConnectionError, AssistantEventHandler, AsyncAssistantEventHandler, AsyncOpenAI, OpenAI
+from openai.types.beta.threads import Message, Run
 import json
-from typing import List, Dict, Optional
+from typing import Any, AsyncIterator, Iterator, List, Dict, Optional, Sequence, Tuple
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(ROOT_DIR))
 
+from src.state.conversation_store import (
+    ConversationKey, ConversationStore, get_default_store, import_legacy_state, legacy_key
+)
+from src.state.history import HistoryEntry, check_order, filter_history, store_history
+from src.utils.compaction import SUMMARY_PREFIX, Compactor
+from src.utils.context_window import ContextWindow, TokenLedger, get_token_counter
+from src.utils.metrics import STATE_SAVE_LATENCY, ModelCall, observe_model_call
+from src.utils.response_cache import ResponseCache
+from src.utils.single_flight import SingleFlight
+from src.utils.transport import async_openai_client_options, openai_client_options
+
 GPT_STATE_DIR = ROOT_DIR / 'gpt_state'
 GPT_STATE_DIR.mkdir(exist_ok=True)  # Ensure the directory exists
 
+# Streamed completions only report token usage, in a final chunk without choices, when asked to
+STREAM_OPTIONS = {"stream": True, "stream_options": {"include_usage": True}}
+
+ASSISTANT_RUN_INSTRUCTIONS = "Help the user with general questions"
+ASSISTANT_PENDING_REPLY = "Assistant is still processing..."
+# Delivers the reply of an interrupted run, which the user hasn't seen, ahead of the next reply
+ASSISTANT_RESUMED_REPLY = "Reply to your previous message:\n{reply}\n\n"
+ASSISTANT_PAGE_SIZE = 100  # The largest page the Assistants messages API returns
+# Run states the Assistants API will not leave on its own; a run in any other state is still working
+TERMINAL_RUN_STATES = {"requires_action", "cancelled", "completed", "failed", "expired", "incomplete"}
+
+class _RunTracker(AssistantEventHandler):
+    """
+    Follows an Assistants run through its stream events: the latest run object (ID, status, usage)
+    and the text of the last message it completed.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.run: Optional[Run] = None
+        self.reply: Optional[str] = None
+        self.resumed: Optional[str] = None  # Reply of the pending run collected before this one
+
+    def on_event(self, event: Any) -> None:
+        if isinstance(event.data, Run):
+            self.run = event.data
+
+    def on_message_done(self, message: Message) -> None:
+        self.reply = _message_text(message)
+
+
+class _AsyncRunTracker(AsyncAssistantEventHandler):
+    """
+    The asyncio counterpart of `_RunTracker`.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.run: Optional[Run] = None
+        self.reply: Optional[str] = None
+        self.resumed: Optional[str] = None  # Reply of the pending run collected before this one
+
+    async def on_event(self, event: Any) -> None:
+        if isinstance(event.data, Run):
+            self.run = event.data
+
+    async def on_message_done(self, message: Message) -> None:
+        self.reply = _message_text(message)
+
+
+def _message_text(message: Message) -> str:
+    return "".join(block.text.value for block in message.content if block.type == "text")
+
+
 class GPTAssistant:
     def __init__(
         self, 
         assistant_name: str, 
         instructions: str, 
         model: str = "gpt-4o-mini", 
-        state_file: str = "assistant_state.json"
+        state_file: str = "assistant_state.json",
+        client: Optional[OpenAI] = None,
+        async_client: Optional[AsyncOpenAI] = None
     ) -> None:
         """
         Initializes the GPTAssistant with an assistant name, instructions, model, and state file.
@@ -26,11 +97,18 @@ class GPTAssistant:
             instructions (str): Instructions for the assistant.
             model (str): The model ID for the assistant. Default is "gpt-4o-mini".
             state_file (str): The filename to store the assistant's state. Default is "assistant_state.json".
+            client (Optional[OpenAI]): A preconfigured OpenAI client. Defaults to one on the shared connection pool.
+            async_client (Optional[AsyncOpenAI]): A preconfigured AsyncOpenAI client. Defaults to one on the shared
+                connection pool.
         """
-        self.client = OpenAI()
+        self.client = client or OpenAI(**openai_client_options())
+        self.async_client = async_client or AsyncOpenAI(**async_openai_client_options())
         self.state_file: Path = GPT_STATE_DIR / state_file
+        self.model = model
         self.assistant = None
         self.thread = None
+        # A run whose stream was interrupted before it finished; see `resume` and `async_resume`
+        self.pending_run_id: Optional[str] = None
         self.load_state()
 
         if not self.assistant or not self.thread:
@@ -48,7 +126,8 @@ class GPTAssistant:
         """
         state = {
             "assistant_id": self.assistant.id,
-            "thread_id": self.thread.id
+            "thread_id": self.thread.id,
+            "pending_run_id": self.pending_run_id
         }
         with open(self.state_file, 'w') as f:
             json.dump(state, f)
@@ -62,41 +141,285 @@ class GPTAssistant:
                 state = json.load(f)
                 self.assistant = self.client.beta.assistants.retrieve(assistant_id=state["assistant_id"])
                 self.thread = self.client.beta.threads.retrieve(thread_id=state["thread_id"])
+                self.pending_run_id = state.get("pending_run_id")
+
+    def _run_request(self) -> Dict[str, Any]:
+        return {
+            "thread_id": self.thread.id,
+            "assistant_id": self.assistant.id,
+            "instructions": ASSISTANT_RUN_INSTRUCTIONS,
+        }
+
+    def _track_run(self, run: Optional[Run], call: Optional[ModelCall] = None) -> None:
+        """
+        Remembers a run that has not finished yet, or forgets it and records its usage once it has.
+
+        Args:
+            run (Optional[Run]): The latest state of the run, if it was created at all.
+            call (Optional[ModelCall]): The metrics of the call that started or resumed the run.
+        """
+        if run is None:
+            return
+        if run.status in TERMINAL_RUN_STATES:
+            self.pending_run_id = None
+            if call is not None and run.usage is not None:
+                call.usage(run.usage.prompt_tokens, run.usage.completion_tokens)
+        else:
+            self.pending_run_id = run.id
+        self.save_state()
+
+    def _run_reply(self, run: Optional[Run], reply: Optional[str]) -> Optional[str]:
+        """
+        Picks the reply of a run that has stopped streaming.
+
+        Args:
+            run (Optional[Run]): The latest state of the run.
+            reply (Optional[str]): The text of the last message the run completed, if it was streamed.
+
+        Returns:
+            Optional[str]: The reply, or None if the run is still pending.
+
+        Raises:
+            RuntimeError: If the run failed, expired or was cancelled.
+        """
+        if run is not None and run.id == self.pending_run_id:
+            return None
+        if run is None or run.status != "completed":
+            reason = run.last_error.message if run is not None and run.last_error else "no reply"
+            raise RuntimeError(f"Assistant run ended with status {run.status if run else 'unknown'}: {reason}")
+        return reply
+
+    def _stream_run(self, user_input: str, tracker: _RunTracker) -> Iterator[str]:
+        """
+        Adds a user message to the thread and streams a run on it.
+
+        Args:
+            user_input (str): The user's input message to send to the assistant.
+            tracker (_RunTracker): Receives the run's events.
+
+        Yields:
+            str: The reply of a pending run it waited for, if any, then text deltas of the assistant's response.
+        """
+        tracker.resumed = self.resume()  # A thread accepts no new messages while a run on it is active
+        if tracker.resumed:
+            yield ASSISTANT_RESUMED_REPLY.format(reply=tracker.resumed)
+        self.client.beta.threads.messages.create(thread_id=self.thread.id, role="user", content=user_input)
+
+        with observe_model_call(self.model) as call:
+            try:
+                with call.upstream():
+                    with self.client.beta.threads.runs.stream(**self._run_request(), event_handler=tracker) as stream:
+                        for delta in stream.text_deltas:
+                            call.delta()
+                            yield delta
+            finally:
+                self._track_run(tracker.run, call)
+
+    async def _astream_run(self, user_input: str, tracker: _AsyncRunTracker) -> AsyncIterator[str]:
+        """
+        Asynchronously adds a user message to the thread and streams a run on it.
+
+        Args:
+            user_input (str): The user's input message to send to the assistant.
+            tracker (_AsyncRunTracker): Receives the run's events.
+
+        Yields:
+            str: The reply of a pending run it waited for, if any, then text deltas of the assistant's response.
+        """
+        tracker.resumed = await self.async_resume()
+        if tracker.resumed:
+            yield ASSISTANT_RESUMED_REPLY.format(reply=tracker.resumed)
+        await self.async_client.beta.threads.messages.create(thread_id=self.thread.id, role="user", content=user_input)
+
+        with observe_model_call(self.model) as call:
+            try:
+                with call.upstream():
+                    async with self.async_client.beta.threads.runs.stream(
+                        **self._run_request(), event_handler=tracker
+                    ) as stream:
+                        async for delta in stream.text_deltas:
+                            call.delta()
+                            yield delta
+            finally:
+                self._track_run(tracker.run, call)
 
     def send_message(self, user_input: str) -> str:
         """
         Sends a user input message to the assistant and retrieves the assistant's response.
 
+        The run is streamed rather than polled, so the reply is available as soon as the run completes.
+        If the stream is interrupted while the run is still going, the run is kept as `pending_run_id`
+        and its reply can be collected later with `resume` or `async_resume`; otherwise it is waited for
+        and returned ahead of the next message's reply.
+
         Args:
             user_input (str): The user's input message to send to the assistant.
 
         Returns:
             str: The assistant's response or a message indicating the assistant is still processing.
         """
-        message = self.client.beta.threads.messages.create(
-            thread_id=self.thread.id,
-            role="user",
-            content=user_input
-        )
+        tracker = _RunTracker()
+        try:
+            for _ in self._stream_run(user_input, tracker):
+                pass
+        except APIConnectionError:  # Includes timeouts
+            if self.pending_run_id is None:
+                raise
+        reply = self._run_reply(tracker.run, tracker.reply)
+        if reply is None:
+            reply = ASSISTANT_PENDING_REPLY
+        elif not reply:
+            reply = self._latest_reply(tracker.run.id)
+        return self._with_resumed(tracker.resumed, reply)
 
-        run = self.client.beta.threads.runs.create_and_poll(
-            thread_id=self.thread.id,
-            assistant_id=self.assistant.id,
-            instructions="Help the user with general questions"
-        )
+    async def async_send_message(self, user_input: str) -> str:
+        """
+        Asynchronously sends a user input message to the assistant without blocking the event loop.
 
-        self.save_state()
+        Args:
+            user_input (str): The user's input message to send to the assistant.
 
-        if run.status == 'completed':
-            messages = self.client.beta.threads.messages.list(thread_id=self.thread.id)
-            return messages.data[0].content[0].text.value
-        else:
-            return "Assistant is still processing..."
+        Returns:
+            str: The assistant's response or a message indicating the assistant is still processing.
+        """
+        tracker = _AsyncRunTracker()
+        try:
+            async for _ in self._astream_run(user_input, tracker):
+                pass
+        except APIConnectionError:
+            if self.pending_run_id is None:
+                raise
+        reply = self._run_reply(tracker.run, tracker.reply)
+        if reply is None:
+            reply = ASSISTANT_PENDING_REPLY
+        elif not reply:
+            reply = await self._async_latest_reply(tracker.run.id)
+        return self._with_resumed(tracker.resumed, reply)
+
+    @staticmethod
+    def _with_resumed(resumed: Optional[str], reply: Optional[str]) -> Optional[str]:
+        return ASSISTANT_RESUMED_REPLY.format(reply=resumed) + (reply or "") if resumed else reply
+
+    def stream_message(self, user_input: str) -> Iterator[str]:
+        """
+        Sends a user input message and yields the assistant's response as it is generated.
+
+        Args:
+            user_input (str): The user's input message to send to the assistant.
+
+        Yields:
+            str: Text deltas of the assistant's response, across every message of the run.
+        """
+        yield from self._stream_run(user_input, _RunTracker())
+
+    async def async_stream_message(self, user_input: str) -> AsyncIterator[str]:
+        """
+        Asynchronously streams the response to a user input message.
+
+        Args:
+            user_input (str): The user's input message to send to the assistant.
+
+        Yields:
+            str: Text deltas of the assistant's response, across every message of the run.
+        """
+        async for delta in self._astream_run(user_input, _AsyncRunTracker()):
+            yield delta
+
+    def _latest_reply(self, run_id: str) -> Optional[str]:
+        """
+        Fetches the last message a run added to the thread.
+
+        Args:
+            run_id (str): The run ID.
+
+        Returns:
+            Optional[str]: The message text, or None if the run added no message.
+        """
+        messages = self.client.beta.threads.messages.list(thread_id=self.thread.id, run_id=run_id, limit=1)
+        return _message_text(messages.data[0]) if messages.data else None
+
+    async def _async_latest_reply(self, run_id: str) -> Optional[str]:
+        messages = await self.async_client.beta.threads.messages.list(thread_id=self.thread.id, run_id=run_id, limit=1)
+        return _message_text(messages.data[0]) if messages.data else None
+
+    def resume(self) -> Optional[str]:
+        """
+        Waits for the pending run, if any, and returns its reply.
+
+        Returns:
+            Optional[str]: The reply of the pending run, or None if there was none.
+
+        Raises:
+            RuntimeError: If the pending run failed, expired or was cancelled.
+        """
+        if self.pending_run_id is None:
+            return None
+        run = self.client.beta.threads.runs.poll(run_id=self.pending_run_id, thread_id=self.thread.id)
+        self._track_run(run)
+        self._run_reply(run, None)
+        return self._latest_reply(run.id)
+
+    async def async_resume(self) -> Optional[str]:
+        """
+        Asynchronously waits for the pending run, if any, and returns its reply.
+
+        Returns:
+            Optional[str]: The reply of the pending run, or None if there was none.
+
+        Raises:
+            RuntimeError: If the pending run failed, expired or was cancelled.
+        """
+        if self.pending_run_id is None:
+            return None
+        run = await self.async_client.beta.threads.runs.poll(run_id=self.pending_run_id, thread_id=self.thread.id)
+        self._track_run(run)
+        self._run_reply(run, None)
+        return await self._async_latest_reply(run.id)
+
+    def iter_message_history(
+        self,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        order: str = "asc",
+        roles: Optional[Sequence[str]] = None
+    ) -> Iterator[HistoryEntry]:
+        """
+        Lazily iterates over the thread's messages, fetching further pages only as they are consumed.
+
+        Args:
+            after (Optional[str]): Cursor (message ID) of the entry to continue after. Starts at the beginning if omitted.
+            limit (Optional[int]): Maximum number of entries. Unlimited if omitted.
+            order (str): "asc" for oldest first, "desc" for newest first. Defaults to "asc".
+            roles (Optional[Sequence[str]]): Roles to keep, e.g. ("user",). All roles if omitted.
+
+        Returns:
+            Iterator[HistoryEntry]: The messages, each with the cursor to continue after it.
+        """
+        check_order(order)
+        if not self.thread:
+            return iter(())
+        # Without a role filter, a small limit needs no more than one page of exactly that size
+        page_size = min(limit, ASSISTANT_PAGE_SIZE) if limit and not roles else ASSISTANT_PAGE_SIZE
+        params = {"thread_id": self.thread.id, "order": order, "limit": page_size}
+        if after:
+            params["after"] = after
+        entries = (
+            {
+                "cursor": message.id,
+                "role": message.role,
+                "content": [block.to_dict() for block in message.content],
+                "timestamp": message.created_at
+            }
+            for message in self.client.beta.threads.messages.list(**params)
+        )
+        return filter_history(entries, roles, limit)
 
     def get_message_history(self) -> List[Dict[str, Optional[str]]]:
         """
         Get the message history of the assistant's current thread.
 
+        This loads the whole thread; use `iter_message_history` for long threads.
+
         Returns:
             List[Dict[str, Optional[str]]]: A list of message dictionaries containing role, content, and timestamp.
         """
@@ -119,7 +442,15 @@ class GPTCompletions:
         instructions: str, 
         model: str = "gpt-4o-mini", 
         state_file: str = "gpt_completions_state.json",
-        temperature: float = 2
+        temperature: float = 2,
+        client: Optional[OpenAI] = None,
+        async_client: Optional[AsyncOpenAI] = None,
+        store: Optional[ConversationStore] = None,
+        conversation_key: Optional[ConversationKey] = None,
+        context_budget: Optional[int] = None,
+        cache: Optional[ResponseCache] = None,
+        compactor: Optional[Compactor] = None,
+        prompt_cache: bool = False
     ) -> None:
         """
         Initializes the GPTCompletions with instructions, model, and state file.
@@ -128,32 +459,359 @@ class GPTCompletions:
             instructions (str): Instructions for the assistant.
             model (str): The model ID for the assistant. Default is "gpt-4o-mini".
             state_file (str): The filename to store the message history. Default is "gpt_completions_state.json".
+            client (Optional[OpenAI]): A preconfigured OpenAI client. Defaults to one on the shared connection pool.
+            async_client (Optional[AsyncOpenAI]): A preconfigured AsyncOpenAI client. Defaults to one on the shared
+                connection pool.
+            store (Optional[ConversationStore]): Where the history is persisted. Defaults to the shared store.
+            conversation_key (Optional[ConversationKey]): The conversation to use. Defaults to the model's
+                shared history migrated from `state_file`.
+            context_budget (Optional[int]): Maximum prompt tokens sent per request. The full history is sent if omitted.
+            cache (Optional[ResponseCache]): Reuses replies to identical requests. Caching is off if omitted.
+            compactor (Optional[Compactor]): Summarizes older turns of long conversations in the background.
+                Older turns are only trimmed by `context_budget` if omitted.
+            prompt_cache (bool): Keeps the prompt prefix byte-identical across turns, so OpenAI's automatic
+                prefix caching can reuse it, by only moving the trimmed window when it overflows. Defaults to False.
         """
-        self.client = OpenAI()
+        self.client = client or OpenAI(**openai_client_options())
+        self.async_client = async_client or AsyncOpenAI(**async_openai_client_options())
         self.state_file: Path = GPT_STATE_DIR / state_file
-        self.message_history: List[Dict[str, str]] = []
-        self.load_state()
+        self.instructions = instructions
         self.model = model
         self.temperature = temperature
+        self.store: ConversationStore = store or get_default_store()
+        self.conversation_key: ConversationKey = conversation_key or legacy_key(self.state_file)
+        self._message_history: Optional[List[Dict[str, str]]] = None
+        self._persisted_count: int = 0
+        self.context_window: Optional[ContextWindow] = (
+            ContextWindow(context_budget, get_token_counter(model)) if context_budget else None
+        )
+        # Token counts of this session's history, updated as messages are added or rolled back
+        self._tokens: TokenLedger = self._new_ledger()
+        self.cache: Optional[ResponseCache] = cache
+        self.compactor: Optional[Compactor] = compactor
+        # Rolling summary of the leading messages, {"text": str, "upto": int}; loaded with the history
+        self.summary: Optional[Dict[str, Any]] = None
+        self.generation: int = 0  # Bumped when the context is cleared, so late compactions are discarded
+        self.prompt_cache: bool = prompt_cache
+        # Where the trimmed context window started last turn; kept in place so the prompt prefix is stable
+        self._window_start: int = 0
+        # Shared with every session copy, so identical concurrent requests reach OpenAI once
+        self.single_flight: SingleFlight = SingleFlight()
+        # Serializes the async turns of this session, from appending the prompt to recording the reply
+        self._history_lock: asyncio.Lock = asyncio.Lock()
+        # Held by the bots around a whole turn, posting the reply included; see SessionManager
+        self.turn_lock: asyncio.Lock = asyncio.Lock()
+
+    @property
+    def message_history(self) -> List[Dict[str, str]]:
+        """
+        The conversation's messages, loaded from the store on first access.
+        """
+        if self._message_history is None:
+            self.load_state()
+        return self._message_history
+
+    @message_history.setter
+    def message_history(self, messages: List[Dict[str, str]]) -> None:
+        self._message_history = messages
+
+    def for_conversation(self, conversation_key: ConversationKey) -> "GPTCompletions":
+        """
+        Returns a copy of this model bound to another conversation.
+
+        The copy shares the client, store, cache and context window, so it is cheap to create.
+        Its history is loaded lazily from the store.
+
+        Args:
+            conversation_key (ConversationKey): The conversation the copy should use.
+
+        Returns:
+            GPTCompletions: The model bound to `conversation_key`.
+        """
+        session = copy.copy(self)
+        session.conversation_key = conversation_key
+        session._message_history = None
+        session._persisted_count = 0
+        session.summary = None
+        session._window_start = 0
+        session._history_lock = asyncio.Lock()
+        session._tokens = session._new_ledger()
+        session.turn_lock = asyncio.Lock()
+        return session
+
+    def save_state(self, completed_only: bool = False) -> None:
+        """
+        Persist the messages added since the last save.
+
+        Args:
+            completed_only (bool): Leaves out a trailing user message still waiting for its reply, e.g. when
+                a session is saved while a request is in flight. Defaults to False.
+        """
+        end = len(self.message_history)
+        if completed_only:
+            while end > self._persisted_count and self.message_history[end - 1].get("role") == "user":
+                end -= 1
+        with STATE_SAVE_LATENCY.time(store=type(self.store).__name__):
+            self.store.append(self.conversation_key, self.message_history[self._persisted_count:end])
+        self._persisted_count = end
+
+    def load_state(self) -> None:
+        """
+        Load the message history from the store, importing the legacy JSON state file on first use.
+        """
+        if self.conversation_key == legacy_key(self.state_file):
+            import_legacy_state(self.store, self.state_file)
+        self.message_history = self.store.load(self.conversation_key)
+        self._persisted_count = len(self.message_history)
+        summary = self.store.load_summary(self.conversation_key)
+        self.summary = summary if summary and summary["upto"] <= len(self.message_history) else None
 
         if not self.message_history:
-            system_message = {"role": "system", "content": instructions}
+            system_message = {"role": "system", "content": self.instructions}
             self.message_history.append(system_message)
 
-    def save_state(self) -> None:
+    def sync(self) -> bool:
         """
-        Save the message history to a file.
+        Drops the in-memory history if the stored conversation changed since this session last read or
+        wrote it, e.g. because another process answered in it. It is reloaded on next access.
+
+        Returns:
+            bool: Whether the history was dropped.
         """
-        with open(self.state_file, 'w') as f:
-            json.dump(self.message_history, f)
+        if self._message_history is None or self.store.count(self.conversation_key) == self._persisted_count:
+            return False
+        self._message_history = None
+        self.summary = None
+        self.generation += 1
+        self._window_start = 0
+        return True
 
-    def load_state(self) -> None:
+    def summary_start(self) -> int:
         """
-        Load the message history from a file if it exists.
+        Returns the position of the first message not covered by the rolling summary, after the system message.
         """
-        if self.state_file.exists():
-            with open(self.state_file, 'r') as f:
-                self.message_history = json.load(f)
+        leading_system = 1 if self.message_history and self.message_history[0]["role"] == "system" else 0
+        return max(self.summary["upto"] if self.summary else 0, leading_system)
+
+    def apply_summary(self, summary: Dict[str, Any], generation: int) -> bool:
+        """
+        Installs and persists a new rolling summary produced by the compactor.
+
+        Args:
+            summary (Dict[str, Any]): {"text": str, "upto": int}.
+            generation (int): The `generation` the summary was computed for.
+
+        Returns:
+            bool: False if the conversation was cleared since, in which case the summary is discarded.
+        """
+        if generation != self.generation or summary["upto"] > len(self.message_history):
+            return False
+        self.store.save_summary(self.conversation_key, summary)
+        self.summary = summary
+        return True
+
+    def clear_context(self) -> None:
+        """
+        Clears the context by resetting the message history to the system message.
+        """
+        self.store.clear(self.conversation_key)
+        self._persisted_count = 0
+        self.message_history = [{"role": "system", "content": self.instructions}]
+        self.summary = None
+        self.generation += 1
+        self._window_start = 0
+
+    def _window(self, history: List[Dict[str, str]]) -> Tuple[List[Dict[str, str]], int]:
+        """
+        Lays out the messages of a chat completion: the leading system message, followed by the rolling
+        summary if the conversation has been compacted, and where the part of `history` that is sent
+        starts, trimmed to the context budget if one is configured.
+
+        Args:
+            history (List[Dict[str, str]]): The message history to send, ending with the new user message.
+
+        Returns:
+            Tuple[List[Dict[str, str]], int]: The system messages and the position of the first history message sent.
+        """
+        start = self.summary_start()
+        system = [message for message in history[:1] if message["role"] == "system"]
+        if self.summary:
+            system = system + [{"role": "system", "content": SUMMARY_PREFIX + self.summary["text"]}]
+        if self.context_window is None:
+            return system, start
+        reserved = sum(self.context_window.message_tokens(message) for message in system)
+        if self.prompt_cache:
+            self._window_start = self.context_window.stable_start(
+                history, max(start, self._window_start), reserved=reserved, ledger=self._tokens
+            )
+            return system, self._window_start
+        fitted = self.context_window.fit(history, reserved=reserved, start=start, ledger=self._tokens)
+        return system, len(history) - len(fitted)
+
+    def prompt_tokens(self, user_input: str) -> int:
+        """
+        Estimates the prompt tokens of the request a turn with this input would send: the instructions,
+        the summary and the history left after trimming, not just the new message.
+
+        Args:
+            user_input (str): The user's input message.
+
+        Returns:
+            int: The estimated prompt tokens.
+        """
+        history = self.message_history + [{"role": "user", "content": user_input}]
+        window_start = self._window_start
+        system, start = self._window(history)
+        self._window_start = window_start  # Only a request that is sent moves the window
+        self._tokens.sync(history)
+        return sum(self._tokens.message_tokens(message) for message in system) + self._tokens.total(start)
+
+    def _chat_messages(self) -> List[Dict[str, str]]:
+        """
+        Builds the message list for a chat completion, trimmed to the context budget if one is configured.
+
+        Returns:
+            List[Dict[str, str]]: The messages to send.
+        """
+        system, start = self._window(self.message_history)
+        return system + self.message_history[start:]
+
+    def _chat_request(self) -> Dict[str, Any]:
+        """
+        Builds the parameters of a chat completion request for the current history.
+
+        Returns:
+            Dict[str, Any]: The keyword arguments for `chat.completions.create`.
+        """
+        return {
+            "model": self.model,
+            "messages": self._chat_messages(),
+            "temperature": self.temperature,
+        }
+
+    def single_turn_request(self, prompt: str) -> Dict[str, Any]:
+        """
+        Builds the parameters of a chat completion answering one prompt with the instructions and chat
+        settings, without the conversation history.
+
+        Args:
+            prompt (str): The prompt.
+
+        Returns:
+            Dict[str, Any]: The keyword arguments for `chat.completions.create`.
+        """
+        return {
+            "model": self.model,
+            "messages": [{"role": "system", "content": self.instructions}, {"role": "user", "content": prompt}],
+            "temperature": self.temperature,
+        }
+
+    def _new_ledger(self) -> TokenLedger:
+        return self.context_window.ledger() if self.context_window is not None else TokenLedger()
+
+    def _discard_message(self, message: Dict[str, Any]) -> None:
+        # Removes this very message after a failed call; an earlier, equal prompt of the user stays
+        history = self.message_history
+        for i in range(len(history) - 1, -1, -1):
+            if history[i] is message:
+                del history[i]
+                return
+
+    def _cached_reply(self, request: Dict[str, Any], approximate: bool = True) -> Optional[str]:
+        return self.cache.get(request, approximate) if self.cache is not None else None
+
+    def _cache_reply(self, request: Dict[str, Any], reply: str) -> None:
+        if self.cache is not None and reply:
+            self.cache.put(request, reply)
+
+    def _record_reply(self, assistant_message: str) -> str:
+        """
+        Appends an assistant reply to the history and persists it.
+
+        Args:
+            assistant_message (str): The assistant's response text.
+
+        Returns:
+            str: The assistant's response text.
+        """
+        self.message_history.append({"role": "assistant", "content": assistant_message})
+
+        self.save_state()
+        if self.compactor is not None:
+            self.compactor.maybe_compact(self)
+
+        return assistant_message
+
+    @staticmethod
+    def _record_usage(response: Any, call: ModelCall) -> None:
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            # Prompt tokens served by OpenAI's automatic prefix cache; not modelled by older SDK versions
+            details = getattr(usage, "prompt_tokens_details", None)
+            cached = details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", None)
+            call.usage(usage.prompt_tokens, usage.completion_tokens, cached)
+
+    def _create(self, request: Dict[str, Any], call: ModelCall) -> Any:
+        response = self.client.chat.completions.create(**request)
+        self._record_usage(response, call)
+        return response
+
+    async def _acreate(self, request: Dict[str, Any], call: ModelCall) -> Any:
+        response = await self.async_client.chat.completions.create(**request)
+        self._record_usage(response, call)
+        return response
+
+    def complete(self, prompt: str, max_tokens: int = 1000) -> str:
+        """
+        Answers a single prompt outside the conversation, e.g. to summarize it. Nothing is added to the history.
+
+        Args:
+            prompt (str): The prompt.
+            max_tokens (int): Maximum tokens to generate. Defaults to 1000.
+
+        Returns:
+            str: The model's reply.
+        """
+        request = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.2,  # Summaries should be faithful, whatever the chat temperature is
+            "max_tokens": max_tokens,
+        }
+        with observe_model_call(self.model) as call, call.upstream():
+            response = self._create(request, call)
+        return response.choices[0].message.content
+
+    async def async_ask(self, prompt: str) -> Dict[str, Any]:
+        """
+        Asynchronously answers one prompt as the first turn of a fresh conversation, e.g. for batch runs.
+        Nothing is added to the history, and only exact repeats are answered from the response cache.
+
+        Args:
+            prompt (str): The prompt.
+
+        Returns:
+            Dict[str, Any]: {"reply": str, "input_tokens": int, "output_tokens": int, "cached": bool}
+        """
+        request = self.single_turn_request(prompt)
+        with observe_model_call(self.model) as call:
+            # Exact matches only: a batch of similar prompts should get an answer each
+            reply = self._cached_reply(request, approximate=False)
+            if reply is not None:
+                call.cached()
+            else:
+                with call.upstream():
+                    response = await self.single_flight.ado(
+                        ResponseCache.make_key(request), lambda: self._acreate(request, call)
+                    )
+                reply = response.choices[0].message.content
+                self._cache_reply(request, reply)
+        return {
+            "reply": reply,
+            "input_tokens": call.input_tokens,
+            "output_tokens": call.output_tokens,
+            "cached": call.outcome == "cached",
+        }
 
     def send_message(self, user_input: str) -> str:
         """
@@ -167,18 +825,172 @@ class GPTCompletions:
         """
         self.message_history.append({"role": "user", "content": user_input})
 
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=self.message_history,
-            temperature=self.temperature
-        )
+        with observe_model_call(self.model) as call:
+            request = self._chat_request()
+            cached = self._cached_reply(request)
+            if cached is not None:
+                call.cached()
+                return self._record_reply(cached)
 
-        assistant_message = response.choices[0].message.content
-        self.message_history.append({"role": "system", "content": assistant_message})
+            with call.upstream():
+                response = self.single_flight.do(ResponseCache.make_key(request), lambda: self._create(request, call))
 
-        self.save_state()
+            reply = self._record_reply(response.choices[0].message.content)
+            self._cache_reply(request, reply)
+            return reply
 
-        return assistant_message
+    async def async_send_message(self, user_input: str) -> str:
+        """
+        Asynchronously sends a user input message to the assistant without blocking the event loop.
+
+        Args:
+            user_input (str): The user's input message to send to the assistant.
+
+        Returns:
+            str: The assistant's latest response.
+        """
+        # One turn at a time: overlapping turns would break role alternation and the rollback
+        async with self._history_lock:
+            user_message = {"role": "user", "content": user_input}
+            self.message_history.append(user_message)
+
+            with observe_model_call(self.model) as call:
+                request = self._chat_request()
+                cached = self._cached_reply(request)
+                if cached is not None:
+                    call.cached()
+                    return self._record_reply(cached)
+
+                try:
+                    with call.upstream():
+                        response = await self.single_flight.ado(
+                            ResponseCache.make_key(request), lambda: self._acreate(request, call)
+                        )
+                except BaseException:  # Also when the caller cancels the request or stops reading the stream
+                    self._discard_message(user_message)
+                    raise
+
+                reply = self._record_reply(response.choices[0].message.content)
+                self._cache_reply(request, reply)
+                return reply
+
+    def _iter_stream_text(self, stream: Any, call: ModelCall) -> Iterator[str]:
+        """
+        Yields the text deltas from a streamed chat completion, recording the usage sent in its last chunk.
+
+        Args:
+            stream (Any): The chunk iterator returned with `stream=True`.
+            call (ModelCall): The metrics of the call.
+
+        Yields:
+            str: Each non-empty text delta in arrival order.
+        """
+        for chunk in stream:
+            self._record_usage(chunk, call)
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+
+    async def _upstream_stream(self, request: Dict[str, Any], call: ModelCall) -> AsyncIterator[str]:
+        """
+        Starts a streamed chat completion on the async client.
+
+        Args:
+            request (Dict[str, Any]): The chat completion request parameters.
+            call (ModelCall): The metrics of the call.
+
+        Yields:
+            str: Text deltas in arrival order.
+        """
+        async for chunk in await self.async_client.chat.completions.create(**request, **STREAM_OPTIONS):
+            self._record_usage(chunk, call)
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+
+    def stream_message(self, user_input: str) -> Iterator[str]:
+        """
+        Sends a user input message with `stream=True` and yields the response as it is generated.
+
+        The full reply is appended to the history once the stream completes.
+
+        Args:
+            user_input (str): The user's input message to send to the assistant.
+
+        Yields:
+            str: Text deltas of the assistant's response.
+        """
+        user_message = {"role": "user", "content": user_input}
+        self.message_history.append(user_message)
+
+        with observe_model_call(self.model) as call:
+            request = self._chat_request()
+            cached = self._cached_reply(request)
+            if cached is not None:
+                call.cached()
+                yield cached
+                self._record_reply(cached)
+                return
+
+            parts: List[str] = []
+            try:
+                with call.upstream():
+                    upstream = self.single_flight.stream(
+                        ResponseCache.make_key(request),
+                        lambda: self._iter_stream_text(
+                            self.client.chat.completions.create(**request, **STREAM_OPTIONS), call
+                        ),
+                    )
+                    for delta in upstream:
+                        call.delta()
+                        parts.append(delta)
+                        yield delta
+            except BaseException:
+                self._discard_message(user_message)
+                raise
+
+            self._cache_reply(request, self._record_reply("".join(parts)))
+
+    async def async_stream_message(self, user_input: str) -> AsyncIterator[str]:
+        """
+        Asynchronously streams the response to a user input message.
+
+        Args:
+            user_input (str): The user's input message to send to the assistant.
+
+        Yields:
+            str: Text deltas of the assistant's response.
+        """
+        # One turn at a time: overlapping turns would break role alternation and the rollback
+        async with self._history_lock:
+            user_message = {"role": "user", "content": user_input}
+            self.message_history.append(user_message)
+
+            with observe_model_call(self.model) as call:
+                request = self._chat_request()
+                cached = self._cached_reply(request)
+                if cached is not None:
+                    call.cached()
+                    yield cached
+                    self._record_reply(cached)
+                    return
+
+                parts: List[str] = []
+                try:
+                    with call.upstream():
+                        upstream = self.single_flight.astream(
+                            ResponseCache.make_key(request), lambda: self._upstream_stream(request, call)
+                        )
+                        async with aclosing(upstream):
+                            async for delta in upstream:
+                                call.delta()
+                                parts.append(delta)
+                                yield delta
+                except BaseException:
+                    self._discard_message(user_message)
+                    raise
+
+                self._cache_reply(request, self._record_reply("".join(parts)))
 
     def get_message_history(self) -> List[Dict[str, str]]:
         """
@@ -188,3 +1000,26 @@ class GPTCompletions:
             List[Dict[str, str]]: The list of messages in the conversation history.
         """
         return self.message_history
+
+    def iter_message_history(
+        self,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        order: str = "asc",
+        roles: Optional[Sequence[str]] = None
+    ) -> Iterator[HistoryEntry]:
+        """
+        Lazily iterates over the persisted history, reading it from the store page by page.
+
+        Args:
+            after (Optional[str]): Cursor of the entry to continue after. Starts at the beginning if omitted.
+            limit (Optional[int]): Maximum number of entries. Unlimited if omitted.
+            order (str): "asc" for oldest first, "desc" for newest first. Defaults to "asc".
+            roles (Optional[Sequence[str]]): Roles to keep, e.g. ("user", "assistant"). All roles if omitted.
+
+        Returns:
+            Iterator[HistoryEntry]: The messages, each with the cursor to continue after it.
+        """
+        if self.conversation_key == legacy_key(self.state_file):
+            import_legacy_state(self.store, self.state_file)
+        return store_history(self.store, self.conversation_key, after, limit, order, roles)
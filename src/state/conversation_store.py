@@ -0,0 +1,603 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from src.state.shared_backend import SharedBackend, get_shared_backend
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+GPT_STATE_DIR = ROOT_DIR / 'gpt_state'
+
+# (platform, channel, user or thread) identifying one conversation
+ConversationKey = Tuple[str, str, str]
+
+# Messages read per query when iterating over a stored conversation
+PAGE_SIZE = 200
+
+
+class ConversationStore:
+    """
+    Interface for persisting conversation histories keyed by (platform, channel, user/thread).
+
+    Backends only need to support incremental appends and atomic whole-conversation replacement;
+    a turn therefore costs O(new messages) instead of O(history).
+    """
+
+    # Whether other processes may write the same conversations, so sessions must check for their writes
+    shared: bool = False
+
+    def load(self, key: ConversationKey) -> List[Dict[str, Any]]:
+        """
+        Loads the full message history of a conversation.
+
+        Args:
+            key (ConversationKey): The conversation to load.
+
+        Returns:
+            List[Dict[str, Any]]: The stored messages, oldest first. Empty if the conversation is unknown.
+        """
+        raise NotImplementedError
+
+    def iter_messages(
+        self, key: ConversationKey, after: Optional[int] = None, order: str = "asc"
+    ) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Iterates over a conversation without loading all of it at once.
+
+        This default implementation loads the whole history; backends override it to read in pages.
+
+        Args:
+            key (ConversationKey): The conversation to read.
+            after (Optional[int]): Only yield messages after this position, in iteration order.
+            order (str): "asc" for oldest first, "desc" for newest first. Defaults to "asc".
+
+        Yields:
+            Tuple[int, Dict[str, Any]]: The position of each message in the conversation, and the message.
+        """
+        messages = self.load(key)
+        positions = range(len(messages)) if order == "asc" else range(len(messages) - 1, -1, -1)
+        for seq in positions:
+            if after is None or (seq > after if order == "asc" else seq < after):
+                yield seq, messages[seq]
+
+    def count(self, key: ConversationKey) -> int:
+        """
+        Counts the stored messages of a conversation.
+
+        This default implementation loads the whole history; backends override it with a cheaper query.
+
+        Args:
+            key (ConversationKey): The conversation.
+
+        Returns:
+            int: The number of messages. 0 if the conversation is unknown.
+        """
+        return len(self.load(key))
+
+    def append(self, key: ConversationKey, messages: List[Dict[str, Any]]) -> None:
+        """
+        Appends messages to the end of a conversation.
+
+        Args:
+            key (ConversationKey): The conversation to append to.
+            messages (List[Dict[str, Any]]): The new messages.
+        """
+        raise NotImplementedError
+
+    def replace(self, key: ConversationKey, messages: List[Dict[str, Any]]) -> None:
+        """
+        Atomically replaces the whole history of a conversation, e.g. after truncation.
+
+        Args:
+            key (ConversationKey): The conversation to replace.
+            messages (List[Dict[str, Any]]): The new full history.
+        """
+        raise NotImplementedError
+
+    def load_summary(self, key: ConversationKey) -> Optional[Dict[str, Any]]:
+        """
+        Loads the rolling summary of a conversation's older messages.
+
+        Args:
+            key (ConversationKey): The conversation.
+
+        Returns:
+            Optional[Dict[str, Any]]: {"text": str, "upto": int}, where `upto` is the number of leading
+                messages the summary covers, or None if the conversation has not been compacted.
+        """
+        raise NotImplementedError
+
+    def save_summary(self, key: ConversationKey, summary: Dict[str, Any]) -> None:
+        """
+        Stores the rolling summary of a conversation, replacing the previous one.
+
+        Summaries are dropped whenever the conversation is replaced or cleared.
+
+        Args:
+            key (ConversationKey): The conversation.
+            summary (Dict[str, Any]): {"text": str, "upto": int}.
+        """
+        raise NotImplementedError
+
+    def exists(self, key: ConversationKey) -> bool:
+        """
+        Checks whether a conversation has ever been stored.
+
+        Args:
+            key (ConversationKey): The conversation to check.
+
+        Returns:
+            bool: True if the conversation exists, even if it has been cleared.
+        """
+        raise NotImplementedError
+
+    def keys(self) -> Iterator[ConversationKey]:
+        """
+        Iterates over the keys of all stored conversations.
+
+        Yields:
+            ConversationKey: Each stored conversation key.
+        """
+        raise NotImplementedError
+
+    def clear(self, key: ConversationKey) -> None:
+        """
+        Empties a conversation while keeping it registered.
+
+        Args:
+            key (ConversationKey): The conversation to clear.
+        """
+        self.replace(key, [])
+
+
+class SQLiteConversationStore(ConversationStore):
+    def __init__(self, path: Path) -> None:
+        """
+        Stores every conversation as rows of a single SQLite database in WAL mode.
+
+        Args:
+            path (Path): The database file.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            "platform TEXT, channel TEXT, user TEXT, "
+            "PRIMARY KEY (platform, channel, user))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "platform TEXT, channel TEXT, user TEXT, seq INTEGER, body TEXT, "
+            "PRIMARY KEY (platform, channel, user, seq))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "platform TEXT, channel TEXT, user TEXT, body TEXT, "
+            "PRIMARY KEY (platform, channel, user))"
+        )
+
+    def load(self, key: ConversationKey) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT body FROM messages WHERE platform=? AND channel=? AND user=? ORDER BY seq",
+                key,
+            ).fetchall()
+        return [json.loads(body) for (body,) in rows]
+
+    def iter_messages(
+        self, key: ConversationKey, after: Optional[int] = None, order: str = "asc"
+    ) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        # Keyset pagination on the primary key; the lock is only held while a page is fetched
+        comparison, direction = (">", "ASC") if order == "asc" else ("<", "DESC")
+        cursor = after
+        while True:
+            query = "SELECT seq, body FROM messages WHERE platform=? AND channel=? AND user=?"
+            params: List[Any] = list(key)
+            if cursor is not None:
+                query += f" AND seq {comparison} ?"
+                params.append(cursor)
+            with self._lock:
+                rows = self._conn.execute(f"{query} ORDER BY seq {direction} LIMIT ?", (*params, PAGE_SIZE)).fetchall()
+            for seq, body in rows:
+                yield seq, json.loads(body)
+            if len(rows) < PAGE_SIZE:
+                return
+            cursor = rows[-1][0]
+
+    def count(self, key: ConversationKey) -> int:
+        with self._lock:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE platform=? AND channel=? AND user=?", key
+            ).fetchone()
+        return count
+
+    def _insert(self, key: ConversationKey, messages: List[Dict[str, Any]], start: int) -> None:
+        self._conn.execute("INSERT OR IGNORE INTO conversations VALUES (?, ?, ?)", key)
+        self._conn.executemany(
+            "INSERT INTO messages VALUES (?, ?, ?, ?, ?)",
+            [(*key, start + i, json.dumps(message)) for i, message in enumerate(messages)],
+        )
+
+    def append(self, key: ConversationKey, messages: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                (last,) = self._conn.execute(
+                    "SELECT COALESCE(MAX(seq), -1) FROM messages WHERE platform=? AND channel=? AND user=?",
+                    key,
+                ).fetchone()
+                self._insert(key, messages, last + 1)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def replace(self, key: ConversationKey, messages: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM messages WHERE platform=? AND channel=? AND user=?", key)
+                self._conn.execute("DELETE FROM summaries WHERE platform=? AND channel=? AND user=?", key)
+                self._insert(key, messages, 0)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def load_summary(self, key: ConversationKey) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body FROM summaries WHERE platform=? AND channel=? AND user=?", key
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def save_summary(self, key: ConversationKey, summary: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?)", (*key, json.dumps(summary)))
+
+    def exists(self, key: ConversationKey) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM conversations WHERE platform=? AND channel=? AND user=?", key
+            ).fetchone()
+        return row is not None
+
+    def keys(self) -> Iterator[ConversationKey]:
+        with self._lock:
+            rows = self._conn.execute("SELECT platform, channel, user FROM conversations").fetchall()
+        for row in rows:
+            yield tuple(row)
+
+
+class AppendOnlyLogStore(ConversationStore):
+    def __init__(self, directory: Path, fsync: bool = False) -> None:
+        """
+        Stores each conversation as a newline-delimited JSON log file.
+
+        Appends only write the new lines. Replacements write a temporary file and rename it over the
+        old log, so a crash leaves either the old or the new history. A torn last line is ignored on load and
+        cut off before the next append.
+
+        Args:
+            directory (Path): The directory holding the log files.
+            fsync (bool): Whether to fsync after every write. Defaults to False.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+        self._lock = threading.Lock()
+
+    def _path(self, key: ConversationKey) -> Path:
+        name = "__".join(part.replace("/", "_") for part in key)
+        return self.directory / f"{name}.jsonl"
+
+    def _write(self, f: Any, messages: List[Dict[str, Any]]) -> None:
+        f.write("".join(json.dumps(message) + "\n" for message in messages))
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def load(self, key: ConversationKey) -> List[Dict[str, Any]]:
+        path = self._path(key)
+        if not path.exists():
+            return []
+        messages: List[Dict[str, Any]] = []
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    messages.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning("truncated_record_ignored", extra={"fields": {"path": str(path)}})
+                    break
+        return messages
+
+    def iter_messages(
+        self, key: ConversationKey, after: Optional[int] = None, order: str = "asc"
+    ) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        path = self._path(key)
+        if not path.exists():
+            return
+        with open(path, 'rb') as f:
+            if order == "asc":
+                lines = enumerate(f)
+            else:
+                # Newest first: index the line offsets, then read the lines back to front
+                offsets = array('q')
+                position = 0
+                for line in f:
+                    offsets.append(position)
+                    position += len(line)
+                lines = ((seq, self._read_line(f, offsets[seq])) for seq in range(len(offsets) - 1, -1, -1))
+            for seq, line in lines:
+                if after is not None and (seq <= after if order == "asc" else seq >= after):
+                    continue
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    if order == "asc":
+                        logger.warning("truncated_record_ignored", extra={"fields": {"path": str(path)}})
+                        return
+                    continue  # Only the last line can be torn
+                yield seq, message
+
+    @staticmethod
+    def _read_line(f: Any, offset: int) -> bytes:
+        f.seek(offset)
+        return f.readline()
+
+    def append(self, key: ConversationKey, messages: List[Dict[str, Any]]) -> None:
+        path = self._path(key)
+        with self._lock:
+            self._truncate_torn_tail(path)
+            with open(path, 'a') as f:
+                self._write(f, messages)
+
+    @staticmethod
+    def _truncate_torn_tail(path: Path) -> None:
+        # A crash mid-append leaves a last line without its newline; `load` stops there, so anything
+        # appended after it would be unreadable too
+        try:
+            f = open(path, 'r+b')
+        except FileNotFoundError:
+            return
+        with f:
+            end = f.seek(0, os.SEEK_END)
+            if not end:
+                return
+            f.seek(end - 1)
+            if f.read(1) == b"\n":
+                return
+            position = end
+            while position > 0:
+                start = max(0, position - 4096)
+                f.seek(start)
+                newline = f.read(position - start).rfind(b"\n")
+                if newline != -1:
+                    break
+                position = start
+            good = start + newline + 1 if position > 0 else 0
+            f.truncate(good)
+        logger.warning("torn_record_truncated", extra={"fields": {"path": str(path), "bytes": end - good}})
+
+    def replace(self, key: ConversationKey, messages: List[Dict[str, Any]]) -> None:
+        path = self._path(key)
+        tmp_path = path.with_suffix(".jsonl.tmp")
+        with self._lock:
+            with open(tmp_path, 'w') as f:
+                self._write(f, messages)
+            os.replace(tmp_path, path)
+            self._summary_path(key).unlink(missing_ok=True)
+
+    def _summary_path(self, key: ConversationKey) -> Path:
+        return self._path(key).with_suffix(".summary.json")
+
+    def load_summary(self, key: ConversationKey) -> Optional[Dict[str, Any]]:
+        path = self._summary_path(key)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            logger.warning("unreadable_summary_ignored", extra={"fields": {"path": str(path)}})
+            return None
+
+    def save_summary(self, key: ConversationKey, summary: Dict[str, Any]) -> None:
+        path = self._summary_path(key)
+        tmp_path = path.with_suffix(".json.tmp")
+        with self._lock:
+            with open(tmp_path, 'w') as f:
+                json.dump(summary, f)
+            os.replace(tmp_path, path)
+
+    def exists(self, key: ConversationKey) -> bool:
+        return self._path(key).exists()
+
+    def keys(self) -> Iterator[ConversationKey]:
+        for path in self.directory.glob("*.jsonl"):
+            yield tuple(path.stem.split("__"))
+
+
+class SharedConversationStore(ConversationStore):
+    shared = True
+
+    def __init__(self, backend: SharedBackend, prefix: str = "conversation") -> None:
+        """
+        Stores every conversation as a list in a SharedBackend (Redis, or a SQLite file standing in for it),
+        so several bot processes or machines can serve the same conversations.
+
+        Appends are atomic list pushes, so concurrent writers never lose messages, and sessions notice
+        other processes' writes through `count` (see SessionManager).
+
+        Args:
+            backend (SharedBackend): The shared storage.
+            prefix (str): Prefix of the backend keys. Defaults to "conversation".
+        """
+        self.backend = backend
+        self.prefix = prefix
+
+    def _key(self, key: ConversationKey, part: str) -> str:
+        # JSON keeps keys unambiguous whatever characters the IDs contain
+        return f"{self.prefix}:{json.dumps(list(key), separators=(',', ':'))}:{part}"
+
+    def load(self, key: ConversationKey) -> List[Dict[str, Any]]:
+        return [json.loads(body) for body in self.backend.list_range(self._key(key, "messages"), 0)]
+
+    def iter_messages(
+        self, key: ConversationKey, after: Optional[int] = None, order: str = "asc"
+    ) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        name = self._key(key, "messages")
+        if order == "asc":
+            start = after + 1 if after is not None else 0
+            while True:
+                page = self.backend.list_range(name, start, start + PAGE_SIZE)
+                for i, body in enumerate(page):
+                    yield start + i, json.loads(body)
+                if len(page) < PAGE_SIZE:
+                    return
+                start += PAGE_SIZE
+        else:
+            stop = after if after is not None else self.backend.list_length(name)
+            while stop > 0:
+                start = max(0, stop - PAGE_SIZE)
+                page = self.backend.list_range(name, start, stop)
+                for i in range(len(page) - 1, -1, -1):
+                    yield start + i, json.loads(page[i])
+                stop = start
+
+    def count(self, key: ConversationKey) -> int:
+        return self.backend.list_length(self._key(key, "messages"))
+
+    def append(self, key: ConversationKey, messages: List[Dict[str, Any]]) -> None:
+        self.backend.set(self._key(key, "exists"), "1")
+        self.backend.list_append(self._key(key, "messages"), [json.dumps(message) for message in messages])
+
+    def replace(self, key: ConversationKey, messages: List[Dict[str, Any]]) -> None:
+        self.backend.set(self._key(key, "exists"), "1")
+        self.backend.list_replace(
+            self._key(key, "messages"), [json.dumps(message) for message in messages], delete=[self._key(key, "summary")]
+        )
+
+    def load_summary(self, key: ConversationKey) -> Optional[Dict[str, Any]]:
+        body = self.backend.get(self._key(key, "summary"))
+        return json.loads(body) if body is not None else None
+
+    def save_summary(self, key: ConversationKey, summary: Dict[str, Any]) -> None:
+        self.backend.set(self._key(key, "summary"), json.dumps(summary))
+
+    def exists(self, key: ConversationKey) -> bool:
+        return self.backend.get(self._key(key, "exists")) is not None
+
+    def keys(self) -> Iterator[ConversationKey]:
+        suffix = ":exists"
+        for name in self.backend.scan(f"{self.prefix}:"):
+            if name.endswith(suffix):
+                yield tuple(json.loads(name[len(self.prefix) + 1:-len(suffix)]))
+
+
+_default_store: Optional[ConversationStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_store() -> ConversationStore:
+    """
+    Returns the process-wide conversation store, creating it on first use.
+
+    The backend is chosen with the CONVERSATION_STORE environment variable: "sqlite" (default)
+    stores everything in gpt_state/conversations.db, "log" uses one append-only file per conversation
+    under gpt_state/conversations/, and "shared" uses the backend in SHARED_STATE_URL, so several
+    processes or machines can serve the same conversations.
+
+    Returns:
+        ConversationStore: The shared store.
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            backend = os.getenv("CONVERSATION_STORE", "sqlite")
+            if backend == "log":
+                _default_store = AppendOnlyLogStore(GPT_STATE_DIR / "conversations")
+            elif backend == "shared":
+                shared_backend = get_shared_backend()
+                if shared_backend is None:
+                    raise RuntimeError("CONVERSATION_STORE=shared needs SHARED_STATE_URL")
+                _default_store = SharedConversationStore(shared_backend)
+            else:
+                _default_store = SQLiteConversationStore(GPT_STATE_DIR / "conversations.db")
+        return _default_store
+
+
+def legacy_key(state_file: Path) -> ConversationKey:
+    """
+    Returns the conversation key used for a model's shared history formerly kept in a gpt_state JSON file.
+
+    Args:
+        state_file (Path): The legacy state file.
+
+    Returns:
+        ConversationKey: The key of the migrated conversation.
+    """
+    return ("default", Path(state_file).stem, "")
+
+
+def import_legacy_state(store: ConversationStore, state_file: Path) -> bool:
+    """
+    Copies a legacy whole-file JSON history into the store unless that conversation already exists.
+
+    Args:
+        store (ConversationStore): The destination store.
+        state_file (Path): The legacy JSON state file.
+
+    Returns:
+        bool: True if a history was imported.
+    """
+    key = legacy_key(state_file)
+    if store.exists(key) or not Path(state_file).exists():
+        return False
+    try:
+        with open(state_file, 'r') as f:
+            file_content = f.read().strip()
+        messages = json.loads(file_content) if file_content else []
+    except json.JSONDecodeError:
+        logger.warning("legacy_state_invalid", extra={"fields": {"path": str(state_file)}})
+        return False
+    if not isinstance(messages, list):
+        return False  # Not a message history, e.g. the GPTAssistant ids file
+    store.replace(key, messages)
+    return True
+
+
+def migrate_json_state(store: ConversationStore, state_dir: Path = GPT_STATE_DIR) -> List[Path]:
+    """
+    Imports every legacy `*.json` history in a directory into the store.
+
+    Args:
+        store (ConversationStore): The destination store.
+        state_dir (Path): The directory holding legacy state files. Defaults to gpt_state/.
+
+    Returns:
+        List[Path]: The files that were imported.
+    """
+    return [path for path in sorted(Path(state_dir).glob("*.json")) if import_legacy_state(store, path)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate gpt_state/*.json histories into the conversation store.")
+    parser.add_argument("--state-dir", type=Path, default=GPT_STATE_DIR)
+    args = parser.parse_args()
+    for path in migrate_json_state(get_default_store(), args.state_dir):
+        print(f"Migrated {path.name} -> {legacy_key(path)}")
@@ -0,0 +1,163 @@
+import argparse
+import json
+import sys
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence, TextIO, Union
+
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from src.state.conversation_store import ConversationKey, ConversationStore, get_default_store
+
+# {"cursor": str, "role": str, "content": Any, "timestamp": Optional[int]}; pass an entry's cursor as
+# `after` to continue right behind it
+HistoryEntry = Dict[str, Any]
+
+ORDERS = ("asc", "desc")
+
+
+def check_order(order: str) -> None:
+    if order not in ORDERS:
+        raise ValueError(f"order must be one of {ORDERS}, got {order!r}")
+
+
+def message_text(content: Any) -> str:
+    """
+    Flattens message content to plain text, for searching.
+
+    Handles plain strings (OpenAI chat), `{"text": str}` blocks (Bedrock Converse)
+    and `{"type": "text", "text": {"value": str}}` blocks (Assistants threads).
+
+    Args:
+        content (Any): The content of one message.
+
+    Returns:
+        str: The text of all text blocks, joined by newlines.
+    """
+    if isinstance(content, str):
+        return content
+    if not isinstance(content, list):
+        return ""
+    parts = []
+    for block in content:
+        text = block.get("text") if isinstance(block, dict) else None
+        if isinstance(text, dict):
+            text = text.get("value")
+        if isinstance(text, str):
+            parts.append(text)
+    return "\n".join(parts)
+
+
+def filter_history(
+    entries: Iterable[HistoryEntry], roles: Optional[Sequence[str]] = None, limit: Optional[int] = None
+) -> Iterator[HistoryEntry]:
+    """
+    Keeps the entries with one of `roles`, up to `limit` of them.
+
+    Args:
+        entries (Iterable[HistoryEntry]): The entries to filter.
+        roles (Optional[Sequence[str]]): Roles to keep, e.g. ("user",). All roles are kept if omitted.
+        limit (Optional[int]): Maximum number of entries. Unlimited if omitted.
+
+    Yields:
+        HistoryEntry: The matching entries.
+    """
+    if roles:
+        entries = (entry for entry in entries if entry["role"] in roles)
+    return islice(entries, limit)
+
+
+def store_history(
+    store: ConversationStore,
+    key: ConversationKey,
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    order: str = "asc",
+    roles: Optional[Sequence[str]] = None
+) -> Iterator[HistoryEntry]:
+    """
+    Lazily iterates over a stored conversation, reading it from the store page by page.
+
+    Args:
+        store (ConversationStore): The store holding the conversation.
+        key (ConversationKey): The conversation.
+        after (Optional[str]): Cursor of the entry to continue after. Starts at the beginning if omitted.
+        limit (Optional[int]): Maximum number of entries. Unlimited if omitted.
+        order (str): "asc" for oldest first, "desc" for newest first. Defaults to "asc".
+        roles (Optional[Sequence[str]]): Roles to keep. All roles are kept if omitted.
+
+    Yields:
+        HistoryEntry: The conversation's messages.
+    """
+    check_order(order)
+    entries = (
+        {"cursor": str(seq), "role": message.get("role"), "content": message.get("content"),
+         "timestamp": message.get("timestamp")}
+        for seq, message in store.iter_messages(key, int(after) if after is not None else None, order)
+    )
+    return filter_history(entries, roles, limit)
+
+
+def search_history(entries: Iterable[HistoryEntry], query: str) -> Iterator[HistoryEntry]:
+    """
+    Keeps the entries whose text contains `query`, ignoring case.
+
+    Args:
+        entries (Iterable[HistoryEntry]): The entries to search.
+        query (str): The text to look for.
+
+    Yields:
+        HistoryEntry: The matching entries.
+    """
+    needle = query.casefold()
+    return (entry for entry in entries if needle in message_text(entry["content"]).casefold())
+
+
+def export_ndjson(entries: Iterable[HistoryEntry], output: Union[str, Path, TextIO]) -> int:
+    """
+    Writes entries as newline-delimited JSON, one at a time, so any history size exports in constant memory.
+
+    Args:
+        entries (Iterable[HistoryEntry]): The entries to export.
+        output (Union[str, Path, TextIO]): A file path, or an open text file such as sys.stdout.
+
+    Returns:
+        int: The number of entries written.
+    """
+    if isinstance(output, (str, Path)):
+        with open(output, 'w') as f:
+            return export_ndjson(entries, f)
+    count = 0
+    for entry in entries:
+        output.write(json.dumps(entry, default=str, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or search stored conversations as NDJSON.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--key", nargs=3, metavar=("PLATFORM", "CHANNEL", "USER"), help="One conversation")
+    target.add_argument("--all", action="store_true", help="Every stored conversation")
+    parser.add_argument("--roles", nargs="+", help="Only these roles, e.g. user assistant")
+    parser.add_argument("--search", help="Only messages containing this text (case-insensitive)")
+    parser.add_argument("--order", choices=ORDERS, default="asc")
+    parser.add_argument("--after", help="Cursor to continue after (with --key)")
+    parser.add_argument("--limit", type=int, help="Maximum messages per conversation")
+    parser.add_argument("--output", type=Path, help="NDJSON file to write. Defaults to stdout.")
+    args = parser.parse_args()
+
+    store = get_default_store()
+
+    def entries() -> Iterator[HistoryEntry]:
+        keys = [tuple(args.key)] if args.key else store.keys()
+        for key in keys:
+            history = store_history(store, key, args.after if args.key else None, None, args.order, args.roles)
+            if args.search:
+                history = search_history(history, args.search)
+            for entry in islice(history, args.limit):
+                yield {"conversation": list(key), **entry}
+
+    count = export_ndjson(entries(), args.output or sys.stdout)
+    print(f"Exported {count} messages.", file=sys.stderr)
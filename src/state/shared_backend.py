@@ -0,0 +1,315 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence
+
+# Seconds a backend lock is held at most, so a crashed holder can't block others for long
+LOCK_TIMEOUT = 10.0
+
+
+class SharedBackend:
+    """
+    Key/value and list storage shared by every bot process, for state that must not diverge between them:
+    conversations, partial chunked messages and cached replies.
+
+    Values are strings; callers encode JSON themselves. Lists are append-only except for `list_replace`.
+    """
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Reads a value.
+
+        Args:
+            key (str): The key.
+
+        Returns:
+            Optional[str]: The value, or None if it is missing or expired.
+        """
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        """
+        Writes a value.
+
+        Args:
+            key (str): The key.
+            value (str): The value.
+            ttl (Optional[float]): Seconds until the value expires. Kept until deleted if omitted.
+        """
+        raise NotImplementedError
+
+    def set_if_absent(self, key: str, value: str, ttl: float) -> bool:
+        """
+        Writes a value only if the key is missing or expired.
+
+        Returns:
+            bool: Whether the value was written.
+        """
+        raise NotImplementedError
+
+    def delete(self, *keys: str) -> None:
+        """Deletes values and lists."""
+        raise NotImplementedError
+
+    def delete_if_equal(self, key: str, value: str) -> bool:
+        """
+        Deletes a value only if it still is `value`, e.g. to release a lock this process holds.
+
+        Returns:
+            bool: Whether the value was deleted.
+        """
+        raise NotImplementedError
+
+    def list_append(self, key: str, values: Sequence[str]) -> int:
+        """
+        Appends values to a list, atomically.
+
+        Returns:
+            int: The length of the list afterwards.
+        """
+        raise NotImplementedError
+
+    def list_range(self, key: str, start: int, stop: Optional[int] = None) -> List[str]:
+        """
+        Reads list items `start` to `stop` (exclusive), or to the end if `stop` is omitted.
+        Negative positions count from the end.
+        """
+        raise NotImplementedError
+
+    def list_length(self, key: str) -> int:
+        """Returns the length of a list; 0 if it doesn't exist."""
+        raise NotImplementedError
+
+    def list_replace(self, key: str, values: Sequence[str], delete: Sequence[str] = ()) -> None:
+        """
+        Atomically replaces a list and deletes the `delete` keys in the same transaction.
+        """
+        raise NotImplementedError
+
+    def scan(self, prefix: str) -> Iterator[str]:
+        """
+        Iterates over the keys starting with `prefix`.
+
+        Yields:
+            str: Each matching key.
+        """
+        raise NotImplementedError
+
+    @contextmanager
+    def lock(self, name: str, timeout: float = LOCK_TIMEOUT) -> Iterator[None]:
+        """
+        Holds a lock shared by every process using the backend, for read-modify-write sequences.
+
+        The lock expires after `timeout` so a crashed holder can't block others indefinitely.
+
+        Args:
+            name (str): The lock's key.
+            timeout (float): Seconds the lock is held at most, and waited for at most.
+
+        Raises:
+            TimeoutError: If the lock couldn't be acquired within `timeout`.
+        """
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        delay = 0.005
+        while not self.set_if_absent(name, token, timeout):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Couldn't acquire the shared lock {name!r} within {timeout}s")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        try:
+            yield
+        finally:
+            self.delete_if_equal(name, token)
+
+
+class RedisBackend(SharedBackend):
+    def __init__(self, url: str) -> None:
+        """
+        Shares state through a Redis server, for processes on several machines.
+
+        Args:
+            url (str): The server URL, e.g. "redis://localhost:6379/0" or "rediss://..." for TLS.
+        """
+        try:
+            import redis
+        except ImportError:  # Only needed when state is shared through Redis
+            raise RuntimeError("The Redis backend needs the redis package (pip install redis)")
+        self.url: str = url
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key: str) -> Optional[str]:
+        return self._redis.get(key)
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self._redis.set(key, value, px=int(ttl * 1000) if ttl is not None else None)
+
+    def set_if_absent(self, key: str, value: str, ttl: float) -> bool:
+        return bool(self._redis.set(key, value, px=int(ttl * 1000), nx=True))
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self._redis.delete(*keys)
+
+    def delete_if_equal(self, key: str, value: str) -> bool:
+        script = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+        return bool(self._redis.eval(script, 1, key, value))
+
+    def list_append(self, key: str, values: Sequence[str]) -> int:
+        if not values:
+            return self.list_length(key)
+        return self._redis.rpush(key, *values)
+
+    def list_range(self, key: str, start: int, stop: Optional[int] = None) -> List[str]:
+        if stop is None:
+            return self._redis.lrange(key, start, -1)
+        if stop == 0 or (start >= 0 and stop >= 0 and stop <= start):
+            return []
+        return self._redis.lrange(key, start, stop - 1)  # LRANGE includes its end
+
+    def list_length(self, key: str) -> int:
+        return self._redis.llen(key)
+
+    def list_replace(self, key: str, values: Sequence[str], delete: Sequence[str] = ()) -> None:
+        pipeline = self._redis.pipeline(transaction=True)
+        pipeline.delete(key, *delete)
+        if values:
+            pipeline.rpush(key, *values)
+        pipeline.execute()
+
+    def scan(self, prefix: str) -> Iterator[str]:
+        # Glob-escape the prefix so keys containing *, ? or [ only match literally
+        pattern = "".join(f"\\{c}" if c in "*?[]\\" else c for c in prefix) + "*"
+        yield from self._redis.scan_iter(match=pattern, count=500)
+
+
+class FileBackend(SharedBackend):
+    def __init__(self, path: Path) -> None:
+        """
+        Shares state through a SQLite file, for several processes on one machine or volume, and for tests.
+
+        Args:
+            path (Path): The database file.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # Writers from other processes are waited for instead of failing with "database is locked"
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS lists (key TEXT, seq INTEGER, value TEXT, PRIMARY KEY (key, seq))")
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM kv WHERE key=?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return row[0]
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?)", (key, value, expires_at))
+
+    def set_if_absent(self, key: str, value: str, ttl: float) -> bool:
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT expires_at FROM kv WHERE key=?", (key,)).fetchone()
+            if row is not None and (row[0] is None or row[0] > now):
+                return False
+            conn.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?)", (key, value, now + ttl))
+            return True
+
+    def delete(self, *keys: str) -> None:
+        with self._transaction() as conn:
+            for key in keys:
+                conn.execute("DELETE FROM kv WHERE key=?", (key,))
+                conn.execute("DELETE FROM lists WHERE key=?", (key,))
+
+    def delete_if_equal(self, key: str, value: str) -> bool:
+        with self._lock:
+            return self._conn.execute("DELETE FROM kv WHERE key=? AND value=?", (key, value)).rowcount > 0
+
+    def list_append(self, key: str, values: Sequence[str]) -> int:
+        with self._transaction() as conn:
+            (length,) = conn.execute("SELECT COUNT(*) FROM lists WHERE key=?", (key,)).fetchone()
+            conn.executemany("INSERT INTO lists VALUES (?, ?, ?)", [(key, length + i, v) for i, v in enumerate(values)])
+            return length + len(values)
+
+    def list_range(self, key: str, start: int, stop: Optional[int] = None) -> List[str]:
+        with self._lock:
+            if start < 0 or (stop is not None and stop < 0):
+                (length,) = self._conn.execute("SELECT COUNT(*) FROM lists WHERE key=?", (key,)).fetchone()
+                start = max(0, length + start) if start < 0 else start
+                stop = length + stop if stop is not None and stop < 0 else stop
+            rows = self._conn.execute(
+                "SELECT value FROM lists WHERE key=? AND seq>=? AND seq<? ORDER BY seq",
+                (key, start, stop if stop is not None else 2 ** 62),
+            ).fetchall()
+        return [value for (value,) in rows]
+
+    def list_length(self, key: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM lists WHERE key=?", (key,)).fetchone()[0]
+
+    def list_replace(self, key: str, values: Sequence[str], delete: Sequence[str] = ()) -> None:
+        with self._transaction() as conn:
+            for doomed in (key, *delete):
+                conn.execute("DELETE FROM kv WHERE key=?", (doomed,))
+                conn.execute("DELETE FROM lists WHERE key=?", (doomed,))
+            conn.executemany("INSERT INTO lists VALUES (?, ?, ?)", [(key, i, v) for i, v in enumerate(values)])
+
+    def scan(self, prefix: str) -> Iterator[str]:
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM kv WHERE substr(key, 1, ?)=? AND (expires_at IS NULL OR expires_at>?) "
+                "UNION SELECT DISTINCT key FROM lists WHERE substr(key, 1, ?)=?",
+                (len(prefix), prefix, now, len(prefix), prefix),
+            ).fetchall()
+        for (key,) in rows:
+            yield key
+
+
+_shared_backend: Optional[SharedBackend] = None
+_shared_backend_lock = threading.Lock()
+
+
+def get_shared_backend() -> Optional[SharedBackend]:
+    """
+    Returns the process-wide shared backend configured by SHARED_STATE_URL, creating it on first use.
+
+    "redis://..." and "rediss://..." URLs use Redis; "file:" followed by a path, or a bare path, uses a
+    SQLite file. Without SHARED_STATE_URL, state stays local to the process and this returns None.
+
+    Returns:
+        Optional[SharedBackend]: The shared backend, or None if none is configured.
+    """
+    global _shared_backend
+    url = os.getenv("SHARED_STATE_URL")
+    if not url:
+        return None
+    with _shared_backend_lock:
+        if _shared_backend is None:
+            if url.startswith(("redis://", "rediss://", "unix://")):
+                _shared_backend = RedisBackend(url)
+            else:
+                _shared_backend = FileBackend(Path(url[len("file:"):] if url.startswith("file:") else url))
+        return _shared_backend
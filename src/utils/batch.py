@@ -0,0 +1,342 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Collection, Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from src.utils.batch_jobs import BatchJob, ProviderBatch, provider_batch
+from src.utils.context_window import approximate_token_count
+from src.utils.log import get_logger
+from src.utils.scheduler import Scheduler
+
+logger = get_logger(__name__)
+
+# {"id": str, "prompt": str}: one line of a prompts file; rows without an "id" are numbered by line
+PromptRow = Dict[str, Any]
+
+# {"id", "model", "reply", "error", "latency", "input_tokens", "output_tokens", "cached"}: one line of a
+# results file. "latency" is None for rows answered by a provider batch job, which also adds "job".
+ResultRow = Dict[str, Any]
+
+
+def read_prompts(path: Path) -> Iterator[PromptRow]:
+    """
+    Reads a prompts file lazily, so files of any size can be batched.
+
+    Each line holds {"id": ..., "prompt": str} or just a JSON string; IDs must be unique within the file.
+
+    Args:
+        path (Path): The JSONL prompts file.
+
+    Yields:
+        PromptRow: Each prompt, with its ID as a string.
+
+    Raises:
+        ValueError: If a line has no prompt.
+    """
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if isinstance(row, str):
+                row = {"prompt": row}
+            if not isinstance(row, dict) or not isinstance(row.get("prompt"), str):
+                raise ValueError(f"{path}:{number}: expected a prompt string or an object with a \"prompt\"")
+            yield {"id": str(row.get("id", number)), "prompt": row["prompt"]}
+
+
+def completed_rows(path: Path) -> Set[Tuple[str, str]]:
+    """
+    Reads the checkpoint a results file makes: the (row ID, model key) pairs already answered, which a
+    resumed run skips. Failed rows are retried, and a line cut short by a crash is ignored.
+
+    Args:
+        path (Path): The JSONL results file.
+
+    Returns:
+        Set[Tuple[str, str]]: The answered pairs; empty if the file doesn't exist.
+    """
+    done: Set[Tuple[str, str]] = set()
+    if not path.exists():
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if row.get("error") is None:
+                done.add((row["id"], row["model"]))
+    return done
+
+
+def open_results(path: Path) -> TextIO:
+    """
+    Opens a results file for appending, ending a line cut short by a crash so new rows start on their own line.
+
+    Args:
+        path (Path): The JSONL results file.
+
+    Returns:
+        TextIO: The file, open for appending.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists() and path.stat().st_size:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            truncated = f.read(1) != b"\n"
+    else:
+        truncated = False
+    output = open(path, "a", encoding="utf-8")
+    if truncated:
+        output.write("\n")
+    return output
+
+
+def write_result(output: TextIO, row: ResultRow) -> None:
+    # Flushed per row: the results file is the checkpoint, so a row must be on disk before the next starts
+    output.write(json.dumps(row, ensure_ascii=False) + "\n")
+    output.flush()
+
+
+def batch_model_config(model_config: Dict[str, dict], concurrency: int) -> Dict[str, dict]:
+    """
+    Adapts MODEL_CONFIG limits for a batch run: every worker may wait on the same model, so each model's
+    queue must hold `concurrency` requests instead of rejecting the overflow as a busy bot would.
+
+    Args:
+        model_config (Dict[str, dict]): The model configurations.
+        concurrency (int): The number of workers.
+
+    Returns:
+        Dict[str, dict]: The model configurations with raised "max_queue" limits.
+    """
+    adapted = {}
+    for key, config in model_config.items():
+        limits = dict(config.get("limits", {}))
+        limits["max_queue"] = max(concurrency, limits.get("max_queue", 0))
+        adapted[key] = {**config, "limits": limits}
+    return adapted
+
+
+def _summarize(results: Dict[str, List[ResultRow]], skipped: Dict[str, int]) -> Dict[str, Dict[str, Any]]:
+    stats = {}
+    for key, rows in results.items():
+        latencies = sorted(row["latency"] for row in rows if row["error"] is None and row["latency"] is not None)
+        stats[key] = {
+            "ok": sum(row["error"] is None for row in rows),
+            "errors": sum(row["error"] is not None for row in rows),
+            "skipped": skipped.get(key, 0),
+            "cached": sum(bool(row.get("cached")) for row in rows),
+            "input_tokens": sum(row["input_tokens"] for row in rows),
+            "output_tokens": sum(row["output_tokens"] for row in rows),
+            "mean_latency": round(statistics.fmean(latencies), 4) if latencies else None,
+            "p95_latency": round(latencies[int(0.95 * (len(latencies) - 1))], 4) if latencies else None,
+        }
+    return stats
+
+
+async def run_batch(
+    rows: Iterable[PromptRow],
+    models: Dict[str, Any],
+    output: TextIO,
+    concurrency: int = 8,
+    scheduler: Optional[Scheduler] = None,
+    skip: Collection[Tuple[str, str]] = ()
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Answers every row with every model through a pool of `concurrency` workers. Each row is sent alone
+    with the model's system prompt, as the first turn of a fresh conversation, and no history is stored.
+
+    Rows are read as workers free up, so the prompts file is never loaded whole, and each answer is
+    written to `output` as soon as it arrives, in completion order. A failed row is written with its
+    error instead of stopping the run.
+
+    Args:
+        rows (Iterable[PromptRow]): The prompts, e.g. from `read_prompts`.
+        models (Dict[str, Any]): The models to ask by MODEL_CONFIG key, e.g. from `initialize_models`.
+        output (TextIO): Where results are written, e.g. from `open_results`.
+        concurrency (int): Maximum rows in progress at once, across all models. Defaults to 8.
+        scheduler (Optional[Scheduler]): Applies each model's rate limits and retries throttling errors,
+            e.g. built from `batch_model_config`. Requests are sent unscheduled if omitted.
+        skip (Collection[Tuple[str, str]]): (row ID, model key) pairs already answered, e.g. from `completed_rows`.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Counts, tokens and latencies of this run by model key.
+    """
+    jobs: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    results: Dict[str, List[ResultRow]] = {key: [] for key in models}
+    skipped: Dict[str, int] = {}
+
+    async def produce() -> None:
+        try:
+            for row in rows:
+                for key in models:
+                    if (row["id"], key) in skip:
+                        skipped[key] = skipped.get(key, 0) + 1
+                    else:
+                        await jobs.put((row, key))
+        finally:
+            for _ in range(concurrency):
+                await jobs.put(None)
+
+    async def answer(row: PromptRow, key: str) -> ResultRow:
+        model = models[key]
+        result = {"id": row["id"], "model": key, "reply": None, "error": None, "input_tokens": 0, "output_tokens": 0, "cached": False}
+        started = time.perf_counter()
+        try:
+            if scheduler is not None:
+                call = lambda: model.async_ask(row["prompt"])
+                result.update(await scheduler.for_model(key).run(call, tokens=approximate_token_count(row["prompt"])))
+            else:
+                result.update(await model.async_ask(row["prompt"]))
+        except Exception as e:  # Logged with its reason by observe_model_call
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["latency"] = round(time.perf_counter() - started, 4)
+        return result
+
+    async def work() -> None:
+        while (job := await jobs.get()) is not None:
+            result = await answer(*job)
+            results[result["model"]].append({**result, "reply": None})  # Only the stats are kept in memory
+            write_result(output, result)
+
+    await asyncio.gather(produce(), *(work() for _ in range(concurrency)))
+    stats = _summarize(results, skipped)
+    logger.info("batch_done", extra={"fields": {"models": stats}})
+    return stats
+
+
+def _load_jobs(path: Path) -> Dict[str, BatchJob]:
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_jobs(path: Path, jobs: Dict[str, BatchJob]) -> None:
+    temp = path.with_suffix(path.suffix + ".tmp")
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump(jobs, f)
+    os.replace(temp, path)  # Atomic, so a crash never leaves a half-written checkpoint
+
+
+def run_provider_batch(
+    rows: Iterable[PromptRow],
+    batches: Dict[str, ProviderBatch],
+    output: TextIO,
+    jobs_path: Path,
+    poll_interval: float = 60.0,
+    skip: Collection[Tuple[str, str]] = ()
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Answers every row with every model through the providers' batch APIs: one job per model, polled until
+    they all end. Replies arrive hours later but cost less and don't count against the bot's rate limits.
+
+    Submitted jobs are checkpointed in `jobs_path`, so an interrupted run polls them again when restarted
+    instead of resubmitting; rows a job didn't answer are submitted again by the next run.
+
+    Args:
+        rows (Iterable[PromptRow]): The prompts, e.g. from `read_prompts`.
+        batches (Dict[str, ProviderBatch]): The batch API clients by model key, e.g. from `provider_batch`.
+        output (TextIO): Where results are written, e.g. from `open_results`.
+        jobs_path (Path): The job checkpoint file.
+        poll_interval (float): Seconds between job status checks. Defaults to 60.
+        skip (Collection[Tuple[str, str]]): (row ID, model key) pairs already answered, e.g. from `completed_rows`.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Counts and tokens of this run by model key.
+    """
+    jobs = _load_jobs(jobs_path)
+    results: Dict[str, List[ResultRow]] = {key: [] for key in batches}
+    skipped: Dict[str, int] = {}
+    pending: Dict[str, List[PromptRow]] = {key: [] for key in batches if key not in jobs}
+    for row in rows:
+        for key in batches:
+            if (row["id"], key) in skip:
+                skipped[key] = skipped.get(key, 0) + 1
+            elif key in pending:
+                pending[key].append(row)
+
+    for key, key_rows in pending.items():
+        if key_rows:
+            jobs[key] = batches[key].submit(key_rows)
+            _save_jobs(jobs_path, jobs)
+            logger.info("batch_job_submitted", extra={"fields": {"model": key, "job": jobs[key]["id"], "rows": len(key_rows)}})
+
+    while any(key in batches for key in jobs):
+        for key in [key for key in jobs if key in batches]:
+            answered = batches[key].poll(jobs[key])
+            if answered is None:
+                continue
+            for result in answered:
+                if (result["id"], key) not in skip:
+                    row = {"id": result["id"], "model": key, **result, "latency": None, "cached": False, "job": jobs[key]["id"]}
+                    results[key].append({**row, "reply": None})
+                    write_result(output, row)
+            logger.info("batch_job_collected", extra={"fields": {"model": key, "job": jobs[key]["id"], "rows": len(answered)}})
+            del jobs[key]
+            _save_jobs(jobs_path, jobs)
+        if any(key in batches for key in jobs):
+            time.sleep(poll_interval)
+
+    if not jobs:
+        jobs_path.unlink(missing_ok=True)
+    stats = _summarize(results, skipped)
+    logger.info("batch_done", extra={"fields": {"models": stats}})
+    return stats
+
+
+if __name__ == "__main__":
+    from src.utils.config_registry import ConfigError, load_config_file, validate_config
+    from model_config import MODEL_CONFIG
+    from src.utils.utils import initialize_models
+
+    parser = argparse.ArgumentParser(
+        description="Answer every prompt of a JSONL file with MODEL_CONFIG models, one stateless turn per prompt."
+    )
+    parser.add_argument("prompts", type=Path, help='JSONL file of {"id": ..., "prompt": ...} rows')
+    parser.add_argument("output", type=Path, help="JSONL results file; rerun with the same file to resume")
+    parser.add_argument("--models", nargs="+", required=True, help="MODEL_CONFIG keys to ask")
+    parser.add_argument("--config", type=Path, help="A .toml/.yaml bot configuration to use instead of MODEL_CONFIG")
+    parser.add_argument("--concurrency", type=int, default=8, help="Rows in progress at once (default: 8)")
+    parser.add_argument(
+        "--provider-batch", action="store_true",
+        help="Submit OpenAI Batch / Bedrock batch inference jobs instead of calling the models directly",
+    )
+    parser.add_argument("--s3-uri", default=os.getenv("BEDROCK_BATCH_S3_URI"), help="S3 prefix for Bedrock batch files")
+    parser.add_argument("--role-arn", default=os.getenv("BEDROCK_BATCH_ROLE_ARN"), help="Service role for Bedrock batch jobs")
+    parser.add_argument("--poll-interval", type=float, default=60.0, help="Seconds between job status checks")
+    args = parser.parse_args()
+
+    model_config = MODEL_CONFIG
+    if args.config:
+        try:
+            model_config, _ = validate_config(load_config_file(args.config), str(args.config))
+        except ConfigError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+    unknown = [key for key in args.models if key not in model_config]
+    if unknown:
+        parser.error(f"unknown models {unknown}; choose from {list(model_config)}")
+
+    models = initialize_models(model_config=model_config)
+    models = {key: models[key] for key in args.models}
+    done = completed_rows(args.output)
+    with open_results(args.output) as output:
+        if args.provider_batch:
+            batches = {key: provider_batch(model, args.s3_uri, args.role_arn) for key, model in models.items()}
+            jobs_path = args.output.with_suffix(args.output.suffix + ".jobs.json")
+            stats = run_provider_batch(read_prompts(args.prompts), batches, output, jobs_path, args.poll_interval, done)
+        else:
+            scheduler = Scheduler(batch_model_config(model_config, args.concurrency))
+            stats = asyncio.run(run_batch(read_prompts(args.prompts), models, output, args.concurrency, scheduler, done))
+    print(json.dumps(stats, indent=2))
@@ -0,0 +1,313 @@
+import io
+import json
+import sys
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from src.bedrock.aws_bedrock_models import INFERENCE_CONFIG, get_aws_session
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# {"provider": str, "id": str, ...}: a submitted job, as saved in the checkpoint so a restarted run polls it
+# again instead of submitting the same prompts twice
+BatchJob = Dict[str, Any]
+
+# {"id": str, "reply": Optional[str], "error": Optional[str], "input_tokens": int, "output_tokens": int}
+JobResult = Dict[str, Any]
+
+OPENAI_DONE_STATES = {"completed", "failed", "expired", "cancelled"}
+BEDROCK_DONE_STATES = {"Completed", "PartiallyCompleted", "Failed", "Stopped", "Expired"}
+
+
+def _result(row_id: str, reply: Optional[str] = None, error: Optional[str] = None, input_tokens: Optional[int] = 0,
+            output_tokens: Optional[int] = 0) -> JobResult:
+    return {
+        "id": row_id, "reply": reply, "error": error,
+        "input_tokens": input_tokens or 0, "output_tokens": output_tokens or 0,
+    }
+
+
+class ProviderBatch:
+    """
+    Submits prompts to a provider's batch API, which answers them asynchronously (typically within 24 hours)
+    at a discount, instead of calling the model once per prompt.
+    """
+
+    def submit(self, rows: Sequence[Dict[str, Any]]) -> BatchJob:
+        """
+        Submits one job answering every row.
+
+        Args:
+            rows (Sequence[Dict[str, Any]]): The prompt rows, {"id": str, "prompt": str}.
+
+        Returns:
+            BatchJob: The job, JSON-serializable.
+        """
+        raise NotImplementedError
+
+    def poll(self, job: BatchJob) -> Optional[List[JobResult]]:
+        """
+        Checks on a job.
+
+        Args:
+            job (BatchJob): A job returned by `submit`.
+
+        Returns:
+            Optional[List[JobResult]]: The results once the job has ended, or None while it runs. Rows the
+                provider didn't answer, e.g. because the job failed or expired, are left out.
+        """
+        raise NotImplementedError
+
+
+class OpenAIBatch(ProviderBatch):
+    def __init__(self, model: Any) -> None:
+        """
+        Answers prompts through the OpenAI Batch API with a GPTCompletions model's instructions and settings.
+
+        Args:
+            model (Any): The GPTCompletions model.
+        """
+        self.model = model
+        self.client = model.client
+
+    def submit(self, rows: Sequence[Dict[str, Any]]) -> BatchJob:
+        lines = [
+            {"custom_id": row["id"], "method": "POST", "url": "/v1/chat/completions",
+             "body": self.model.single_turn_request(row["prompt"])}
+            for row in rows
+        ]
+        data = "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines).encode("utf-8")
+        upload = self.client.files.create(file=("batch_input.jsonl", data), purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=upload.id, endpoint="/v1/chat/completions", completion_window="24h"
+        )
+        return {"provider": "openai", "id": batch.id, "rows": len(rows)}
+
+    def _read(self, file_id: Optional[str]) -> Iterator[Dict[str, Any]]:
+        if not file_id:
+            return
+        for line in self.client.files.content(file_id).text.splitlines():
+            if line.strip():
+                yield json.loads(line)
+
+    def poll(self, job: BatchJob) -> Optional[List[JobResult]]:
+        batch = self.client.batches.retrieve(job["id"])
+        if batch.status not in OPENAI_DONE_STATES:
+            return None
+        if batch.status != "completed":
+            logger.warning("batch_job_ended", extra={"fields": {"job": job["id"], "status": batch.status}})
+
+        results = []
+        # Expired and cancelled batches still return the requests answered before they ended
+        for line in [*self._read(batch.output_file_id), *self._read(batch.error_file_id)]:
+            response = line.get("response") or {}
+            body = response.get("body") or {}
+            if line.get("error") or response.get("status_code") != 200:
+                error = line.get("error") or body.get("error") or {"status_code": response.get("status_code")}
+                results.append(_result(line["custom_id"], error=json.dumps(error)))
+                continue
+            usage = body.get("usage") or {}
+            results.append(_result(
+                line["custom_id"], body["choices"][0]["message"]["content"],
+                input_tokens=usage.get("prompt_tokens"), output_tokens=usage.get("completion_tokens"),
+            ))
+        return results
+
+
+def _llama3_prompt(system: str, prompt: str) -> str:
+    header = "<|start_header_id|>{}<|end_header_id|>\n\n"
+    text = "<|begin_of_text|>"
+    if system:
+        text += header.format("system") + system + "<|eot_id|>"
+    return text + header.format("user") + prompt + "<|eot_id|>" + header.format("assistant")
+
+
+# Builds a native request body from the system prompt and the prompt
+NativeRequest = Callable[[str, str], Dict[str, Any]]
+# Reads (reply, input tokens, output tokens) from a native response body
+NativeReply = Callable[[Dict[str, Any]], Tuple[str, Optional[int], Optional[int]]]
+
+# Bedrock batch jobs take each model family's native InvokeModel body rather than Converse requests
+NATIVE_FORMATS: Dict[str, Tuple[NativeRequest, NativeReply]] = {
+    "meta": (
+        lambda system, prompt: {
+            "prompt": _llama3_prompt(system, prompt), "max_gen_len": INFERENCE_CONFIG["maxTokens"],
+            "temperature": INFERENCE_CONFIG["temperature"], "top_p": INFERENCE_CONFIG["topP"],
+        },
+        lambda output: (output["generation"], output.get("prompt_token_count"), output.get("generation_token_count")),
+    ),
+    "mistral": (
+        lambda system, prompt: {
+            "prompt": f"<s>[INST] {system}\n\n{prompt} [/INST]" if system else f"<s>[INST] {prompt} [/INST]",
+            "max_tokens": INFERENCE_CONFIG["maxTokens"],
+            "temperature": INFERENCE_CONFIG["temperature"], "top_p": INFERENCE_CONFIG["topP"],
+        },
+        lambda output: (output["outputs"][0]["text"], None, None),
+    ),
+    "anthropic": (
+        lambda system, prompt: {
+            "anthropic_version": "bedrock-2023-05-31", "system": system,
+            "messages": [{"role": "user", "content": [{"type": "text", "text": prompt}]}],
+            "max_tokens": INFERENCE_CONFIG["maxTokens"],
+            "temperature": INFERENCE_CONFIG["temperature"], "top_p": INFERENCE_CONFIG["topP"],
+        },
+        lambda output: (
+            output["content"][0]["text"], output.get("usage", {}).get("input_tokens"),
+            output.get("usage", {}).get("output_tokens"),
+        ),
+    ),
+    "amazon": (
+        lambda system, prompt: {
+            "inputText": f"{system}\n\nUser: {prompt}\nBot:" if system else prompt,
+            "textGenerationConfig": {
+                "maxTokenCount": INFERENCE_CONFIG["maxTokens"],
+                "temperature": INFERENCE_CONFIG["temperature"], "topP": INFERENCE_CONFIG["topP"],
+            },
+        },
+        lambda output: (
+            output["results"][0]["outputText"], output.get("inputTextTokenCount"),
+            output["results"][0].get("tokenCount"),
+        ),
+    ),
+    "cohere": (
+        lambda system, prompt: {
+            "message": prompt, "preamble": system, "max_tokens": INFERENCE_CONFIG["maxTokens"],
+            "temperature": INFERENCE_CONFIG["temperature"], "p": INFERENCE_CONFIG["topP"],
+        },
+        lambda output: (output["text"], None, None),
+    ),
+    "ai21": (
+        lambda system, prompt: {
+            "messages": ([{"role": "system", "content": system}] if system else []) + [{"role": "user", "content": prompt}],
+            "max_tokens": INFERENCE_CONFIG["maxTokens"],
+            "temperature": INFERENCE_CONFIG["temperature"], "top_p": INFERENCE_CONFIG["topP"],
+        },
+        lambda output: (
+            output["choices"][0]["message"]["content"], output.get("usage", {}).get("prompt_tokens"),
+            output.get("usage", {}).get("completion_tokens"),
+        ),
+    ),
+}
+
+
+def bedrock_provider(model_id: str) -> str:
+    """
+    Returns the provider of a Bedrock model ID, e.g. "meta" for "meta.llama3-70b-instruct-v1:0"
+    or "us.meta.llama3-2-90b-instruct-v1:0".
+    """
+    parts = model_id.split(".")
+    return parts[1] if parts[0] in ("us", "eu", "apac") and len(parts) > 2 else parts[0]
+
+
+def _split_s3_uri(uri: str) -> Tuple[str, str]:
+    if not uri.startswith("s3://"):
+        raise ValueError(f"Expected an s3:// URI, got {uri!r}")
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    return bucket, key
+
+
+class BedrockBatch(ProviderBatch):
+    def __init__(self, model: Any, s3_uri: str, role_arn: str) -> None:
+        """
+        Answers prompts through a Bedrock batch inference job with a BedrockCompletions model's system prompt
+        and settings. Bedrock reads the prompts from, and writes the replies to, S3.
+
+        Args:
+            model (Any): The BedrockCompletions model.
+            s3_uri (str): Where jobs keep their files, e.g. "s3://bucket/batches/".
+            role_arn (str): The service role Bedrock assumes to read and write `s3_uri`.
+
+        Raises:
+            ValueError: If the model's family has no known batch format.
+        """
+        self.model = model
+        self.provider = bedrock_provider(model.model)
+        if self.provider not in NATIVE_FORMATS:
+            raise ValueError(f"Bedrock batch jobs aren't supported for {model.model}")
+        self.s3_uri = s3_uri.rstrip("/") + "/"
+        self.role_arn = role_arn
+        session = get_aws_session()
+        self.bedrock = session.client("bedrock")
+        self.s3 = session.client("s3")
+
+    def submit(self, rows: Sequence[Dict[str, Any]]) -> BatchJob:
+        build = NATIVE_FORMATS[self.provider][0]
+        system = "\n".join(block["text"] for block in self.model.system_prompt)
+        name = f"batch-{uuid.uuid4().hex[:12]}"
+        # Record IDs must be 11 alphanumeric characters, so row IDs are mapped back through the checkpoint
+        records = {f"R{index:010d}": row["id"] for index, row in enumerate(rows)}
+        data = "".join(
+            json.dumps({"recordId": record_id, "modelInput": build(system, row["prompt"])}, ensure_ascii=False) + "\n"
+            for record_id, row in zip(records, rows)
+        ).encode("utf-8")
+
+        bucket, prefix = _split_s3_uri(self.s3_uri + name + "/")
+        self.s3.put_object(Bucket=bucket, Key=prefix + "input.jsonl", Body=data)
+        response = self.bedrock.create_model_invocation_job(
+            jobName=name,
+            roleArn=self.role_arn,
+            modelId=self.model.model,
+            inputDataConfig={"s3InputDataConfig": {"s3Uri": f"s3://{bucket}/{prefix}input.jsonl", "s3InputFormat": "JSONL"}},
+            outputDataConfig={"s3OutputDataConfig": {"s3Uri": f"s3://{bucket}/{prefix}output/"}},
+        )
+        return {"provider": "bedrock", "id": response["jobArn"], "output": f"s3://{bucket}/{prefix}output/", "records": records}
+
+    def poll(self, job: BatchJob) -> Optional[List[JobResult]]:
+        status = self.bedrock.get_model_invocation_job(jobIdentifier=job["id"])
+        if status["status"] not in BEDROCK_DONE_STATES:
+            return None
+        if status["status"] != "Completed":
+            logger.warning("batch_job_ended", extra={"fields": {
+                "job": job["id"], "status": status["status"], "reason": status.get("message"),
+            }})
+
+        # Bedrock writes the replies to <output>/<job ID>/<input file name>.out
+        bucket, prefix = _split_s3_uri(job["output"] + job["id"].rsplit("/", 1)[-1] + "/input.jsonl.out")
+        try:
+            body = self.s3.get_object(Bucket=bucket, Key=prefix)["Body"].read()
+        except self.s3.exceptions.NoSuchKey:
+            return []  # Failed before answering anything
+        parse = NATIVE_FORMATS[self.provider][1]
+        results = []
+        for line in io.TextIOWrapper(io.BytesIO(body), encoding="utf-8"):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            row_id = job["records"].get(record.get("recordId"))
+            if row_id is None:
+                continue
+            if record.get("error") or "modelOutput" not in record:
+                results.append(_result(row_id, error=json.dumps(record.get("error") or "No output")))
+                continue
+            reply, input_tokens, output_tokens = parse(record["modelOutput"])
+            results.append(_result(row_id, reply, input_tokens=input_tokens, output_tokens=output_tokens))
+        return results
+
+
+def provider_batch(model: Any, s3_uri: Optional[str] = None, role_arn: Optional[str] = None) -> ProviderBatch:
+    """
+    Returns the batch API client matching a model's class.
+
+    Args:
+        model (Any): A GPTCompletions or BedrockCompletions model, or a LazyModel handle of one.
+        s3_uri (Optional[str]): Where Bedrock jobs keep their files. Required for Bedrock models.
+        role_arn (Optional[str]): The service role of Bedrock jobs. Required for Bedrock models.
+
+    Returns:
+        ProviderBatch: The batch API client.
+
+    Raises:
+        ValueError: If the model has no batch API, or the Bedrock settings are missing.
+    """
+    if hasattr(model, "single_turn_request"):
+        return OpenAIBatch(model)
+    if hasattr(model, "single_turn_kwargs"):
+        if not s3_uri or not role_arn:
+            raise ValueError("Bedrock batch jobs need an S3 URI and a service role ARN")
+        return BedrockBatch(model, s3_uri, role_arn)
+    raise ValueError(f"{type(model).__name__} has no batch API")
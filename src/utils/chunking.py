@@ -0,0 +1,165 @@
+import re
+from typing import Iterable, Iterator, List, Optional, Union
+
+# Opening or closing code fence at the start of a line, with the opening fence's language
+FENCE_PATTERN = re.compile(r"^ {0,3}```([^\s`]*)", re.MULTILINE)
+FENCE_CLOSE = "\n```"
+
+# Split points in order of preference, each kept with the text before it
+BOUNDARIES = ("\n\n", "\n", ". ", "! ", "? ", " ")
+
+# Platforms count their limits differently: Discord in characters, Slack in bytes of UTF-8
+MEASURES = ("chars", "bytes")
+
+
+class MessageChunker:
+    def __init__(self, limit: int = 1990, measure: str = "chars") -> None:
+        """
+        Splits text into platform-sized messages in a single pass, as it is fed.
+
+        Messages end on the best natural boundary (paragraph, line, sentence, word) found in the
+        second half of the space left, and are hard-split only when there is none. Code fences are
+        tracked across messages: a message ending inside a block closes it, and the next one reopens
+        it with the same language.
+
+        Args:
+            limit (int): The maximum size of a single message. Defaults to 1990.
+            measure (str): "chars" to count characters, or "bytes" to count UTF-8 bytes. Defaults to "chars".
+        """
+        if measure not in MEASURES:
+            raise ValueError(f"Unknown measure: {measure}")
+        self.limit: int = limit
+        self.measure: str = measure
+        self.language: Optional[str] = None  # Language of the open code block, "" if unnamed
+        self._buffer: str = ""
+        self._position: int = 0
+        self._parts: List[str] = []  # Deltas not yet joined into the buffer
+        self._pending_size: int = 0
+        self._line_start: bool = True
+
+    def _size(self, text: str) -> int:
+        return len(text) if self.measure == "chars" else len(text.encode("utf-8"))
+
+    def _prefix(self) -> str:
+        return "" if self.language is None else f"```{self.language}\n"
+
+    def _fit(self, text: str, budget: int) -> str:
+        """
+        Returns the longest prefix of `text` within `budget`, never splitting a character.
+        """
+        text = text[:budget]
+        if self.measure == "bytes":
+            text = text.encode("utf-8")[:budget].decode("utf-8", "ignore")
+        return text
+
+    @staticmethod
+    def _split_point(window: str) -> int:
+        earliest = len(window) // 2
+        for boundary in BOUNDARIES:
+            index = window.rfind(boundary, earliest)
+            if index != -1:
+                return index + len(boundary)
+        cut = len(window)
+        while 0 < cut < len(window) and window[cut - 1] == "`" and window[cut] == "`":
+            cut -= 1  # Don't split a fence marker
+        return cut or len(window)
+
+    def _track(self, body: str) -> None:
+        for match in FENCE_PATTERN.finditer(body):
+            if match.start() == 0 and not self._line_start:
+                continue
+            self.language = match.group(1) if self.language is None else None
+        if body:
+            self._line_start = body.endswith("\n")
+
+    def _emit(self, body: str) -> Optional[str]:
+        prefix = self._prefix()
+        self._track(body)
+        if not body.strip():
+            return None  # Platforms reject blank messages
+        return prefix + body + (FENCE_CLOSE if self.language is not None else "")
+
+    def _budget(self) -> int:
+        return self.limit - self._size(self._prefix()) - len(FENCE_CLOSE)
+
+    def _join(self) -> None:
+        self._buffer = self._buffer[self._position:] + "".join(self._parts)
+        self._position = 0
+        self._parts = []
+
+    def _drain(self, final: bool) -> Iterator[str]:
+        self._join()
+        while self._position < len(self._buffer):
+            rest_length = len(self._buffer) - self._position
+            budget = self._budget()
+            window = self._fit(self._buffer[self._position:self._position + budget], budget)
+            if not window:
+                window = self._buffer[self._position]  # Limit too small for one character; overflow rather than stall
+            if len(window) == rest_length and (final or self._size(window) < budget):
+                if not final:
+                    return  # May still grow; wait for more text
+                self._position = len(self._buffer)
+                chunk = self._emit(window)
+            else:
+                cut = self._split_point(window)
+                self._position += cut
+                chunk = self._emit(window[:cut])
+            if chunk is not None:
+                yield chunk
+        self._pending_size = self._size(self._buffer[self._position:])
+
+    def feed(self, text: str) -> List[str]:
+        """
+        Adds text and returns the messages it completed.
+
+        Args:
+            text (str): The text to append.
+
+        Returns:
+            List[str]: Messages that are full and will not change any more.
+        """
+        self._parts.append(text)
+        self._pending_size += self._size(text)
+        if self._pending_size < self._budget():
+            return []  # Can't fill a message yet; defer joining so small deltas stay cheap
+        return list(self._drain(final=False))
+
+    def close(self) -> List[str]:
+        """
+        Returns the remaining messages once all the text has been fed.
+
+        Returns:
+            List[str]: The last messages, with any open code block closed.
+        """
+        chunks = list(self._drain(final=True))
+        self._buffer, self._position, self._pending_size = "", 0, 0
+        return chunks
+
+    @property
+    def pending(self) -> str:
+        """
+        The message still being filled, as it would be shown right now.
+        """
+        self._join()
+        rest = self._buffer
+        return self._prefix() + rest if rest.strip() else ""
+
+
+def iter_chunks(text: Union[str, Iterable[str]], limit: int = 1990, measure: str = "chars") -> Iterator[str]:
+    """
+    Splits a message, or a stream of text deltas, into platform-sized messages.
+
+    Runs in linear time over the input, and yields each message as soon as it is complete.
+
+    Args:
+        text (Union[str, Iterable[str]]): The full text, or an iterable of deltas.
+        limit (int): The maximum size of a single message. Defaults to 1990.
+        measure (str): "chars" for Discord-style limits, "bytes" for Slack-style limits. Defaults to "chars".
+
+    Yields:
+        str: Each message, in order.
+    """
+    chunker = MessageChunker(limit, measure)
+    for delta in [text] if isinstance(text, str) else text:
+        yield from chunker.feed(delta)
+    yield from chunker.close()
@@ -0,0 +1,195 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from src.state.conversation_store import ConversationKey
+from src.state.history import message_text
+from src.utils.context_window import MESSAGE_OVERHEAD, approximate_token_count
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# Prepended to the summary wherever it is put in front of a prompt
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain the running summary of a chat between a user and an assistant. Update the summary "
+    "with the new messages below. Keep every fact, decision, name, number, code identifier and open "
+    "question that later messages may refer to; drop pleasantries and repetition. Answer with the "
+    "updated summary only, in at most {max_words} words."
+)
+
+
+class Compactor:
+    def __init__(
+        self,
+        summarizer: Any,
+        trigger_tokens: int,
+        keep_recent: int = 8,
+        batch_tokens: int = 8000,
+        max_words: int = 400,
+        max_workers: int = 2
+    ) -> None:
+        """
+        Folds the older turns of long conversations into a rolling summary, in the background.
+
+        After each reply, `maybe_compact` checks how many tokens a session's unsummarized messages take.
+        Past `trigger_tokens`, everything but the last `keep_recent` messages is summarized by a cheap
+        model, at most `batch_tokens` of transcript per call, on a small thread pool. The reply that
+        triggered it is not delayed. The summary is saved with the conversation in its store; the
+        stored messages themselves are kept, so exports and audits still see the full history.
+
+        Args:
+            summarizer (Any): A model with a `complete(prompt)` method, such as a LazyModel.
+            trigger_tokens (int): Unsummarized prompt tokens that start a compaction.
+            keep_recent (int): Most recent messages always sent verbatim. Defaults to 8.
+            batch_tokens (int): Maximum transcript tokens per summarization call. Defaults to 8000.
+            max_words (int): Length the summary is asked to stay under. Defaults to 400.
+            max_workers (int): Concurrent summarization calls. Defaults to 2.
+        """
+        self.summarizer = summarizer
+        self.trigger_tokens: int = trigger_tokens
+        self.keep_recent: int = keep_recent
+        self.batch_tokens: int = batch_tokens
+        self.max_words: int = max_words
+        self.compactions: int = 0
+        self.failures: int = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="compaction")
+        self._running: Set[ConversationKey] = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _tokens(session: Any) -> Callable[[Dict[str, Any]], int]:
+        if session.context_window is not None:
+            return session.context_window.message_tokens
+        return lambda message: approximate_token_count(message_text(message["content"])) + MESSAGE_OVERHEAD
+
+    def _cut(self, messages: List[Dict[str, Any]], start: int) -> int:
+        """
+        Returns where the verbatim tail starts: `keep_recent` messages from the end, moved forward
+        to a user message so the remaining prompt still opens with a user turn.
+        """
+        cut = max(start, len(messages) - self.keep_recent)
+        while cut < len(messages) and messages[cut]["role"] != "user":
+            cut += 1
+        return cut if cut < len(messages) else start
+
+    def maybe_compact(self, session: Any) -> Optional[Future]:
+        """
+        Schedules a compaction of a session's conversation if its unsummarized messages are over the trigger.
+
+        Only one compaction per conversation runs at a time.
+
+        Args:
+            session (Any): A GPTCompletions or BedrockCompletions bound to a conversation.
+
+        Returns:
+            Optional[Future]: The scheduled compaction, or None if none was needed.
+        """
+        messages = session.message_history
+        start = session.summary_start()
+        count = self._tokens(session)
+        if sum(count(message) for message in messages[start:]) <= self.trigger_tokens:
+            return None
+        cut = self._cut(messages, start)
+        if cut <= start:
+            return None
+
+        key = session.conversation_key
+        with self._lock:
+            if key in self._running:
+                return None
+            self._running.add(key)
+        summary = session.summary
+        pending = list(messages[start:cut])  # Snapshot; the session keeps appending on the request path
+        future = self._executor.submit(self._compact, session, session.generation, summary, pending, start, count)
+        future.add_done_callback(lambda done: self._finished(session, key, done))
+        return future
+
+    def _finished(self, session: Any, key: ConversationKey, future: Future) -> None:
+        with self._lock:
+            self._running.discard(key)
+        if not future.exception() and future.result():
+            self.maybe_compact(session)  # Catch up with the turns added while this compaction ran
+
+    def _compact(
+        self,
+        session: Any,
+        generation: int,
+        summary: Optional[Dict[str, Any]],
+        messages: List[Dict[str, Any]],
+        start: int,
+        count: Callable[[Dict[str, Any]], int]
+    ) -> bool:
+        """
+        Summarizes `messages` (which begin at position `start`) into `summary`, one batch at a time,
+        and saves the summary after every batch so an interrupted compaction keeps its progress.
+
+        Batches hold whole turns, so each saved summary ends just before a user message and the
+        unsummarized rest never opens mid-turn. A single turn over `batch_tokens` is a batch of its own.
+
+        Returns:
+            bool: Whether every batch was summarized and applied.
+        """
+        text = summary["text"] if summary else ""
+        sizes = [count(message) for message in messages]
+        turn_ends = [i for i in range(1, len(messages)) if messages[i]["role"] == "user"] + [len(messages)]
+        position, turn = 0, 0
+        while position < len(messages):
+            end, size = position, 0
+            while turn < len(turn_ends):
+                turn_size = sum(sizes[end:turn_ends[turn]])
+                if end > position and size + turn_size > self.batch_tokens:
+                    break
+                size += turn_size
+                end = turn_ends[turn]
+                turn += 1
+            batch, position = messages[position:end], end
+            try:
+                text = self.summarize(text, batch)
+            except Exception as e:
+                self.failures += 1
+                logger.warning("compaction_failed", extra={"fields": {
+                    "conversation": list(session.conversation_key), "reason": str(e)
+                }})
+                return False
+            if not session.apply_summary({"text": text, "upto": start + position}, generation):
+                return False  # The conversation was cleared meanwhile
+        self.compactions += 1
+        logger.info("conversation_compacted", extra={"fields": {
+            "conversation": list(session.conversation_key), "upto": start + position, "summary_chars": len(text)
+        }})
+        return True
+
+    def summarize(self, previous: str, messages: List[Dict[str, Any]]) -> str:
+        """
+        Asks the summarizer to fold new messages into the previous summary.
+
+        Args:
+            previous (str): The summary so far; empty for the first compaction.
+            messages (List[Dict[str, Any]]): The messages to add, oldest first.
+
+        Returns:
+            str: The updated summary.
+        """
+        transcript = "\n\n".join(
+            f"{message['role'].capitalize()}: {message_text(message['content'])}"
+            for message in messages if message["role"] != "system"
+        )
+        prompt = (
+            f"{SUMMARY_INSTRUCTIONS.format(max_words=self.max_words)}\n\n"
+            f"Current summary:\n{previous or '(none yet)'}\n\n"
+            f"New messages:\n{transcript}"
+        )
+        return self.summarizer.complete(prompt).strip()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the compactions completed, failed and in progress.
+
+        Returns:
+            Dict[str, int]: Compaction counters.
+        """
+        with self._lock:
+            running = len(self._running)
+        return {"compactions": self.compactions, "failures": self.failures, "running": running}
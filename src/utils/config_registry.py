@@ -0,0 +1,391 @@
+import argparse
+import asyncio
+import copy
+import os
+import sys
+import threading
+import tomllib
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from model_config import CHANNEL_CONFIG, MODEL_CONFIG
+from src.bedrock.aws_bedrock_models import converse_supports_prompt_cache
+from src.utils.fanout import parse_route
+from src.utils.log import get_logger
+from src.utils.semantic_cache import SCOPES
+
+logger = get_logger(__name__)
+
+# {"version": int, "added": [...], "changed": [...], "removed": [...], "channels": bool}: the model keys whose
+# clients must be built, rebuilt or dropped after a reload, and whether any channel route changed
+ConfigChange = Dict[str, Any]
+
+MODEL_CLASSES = ("GPTCompletions", "BedrockCompletions")
+
+# Accepted types of each model setting; anything else is rejected, so typos fail the load instead of being ignored
+MODEL_SETTINGS = {
+    "class": (str,),
+    "model": (str,),
+    "system_prompt": (str, type(None)),
+    "state_file": (str, type(None)),
+    "stream": (bool,),
+    "context_budget": (int,),
+    "cache": (dict, type(None)),
+    "compaction": (dict, type(None)),
+    "prompt_cache": (bool,),
+    "limits": (dict,),
+}
+CACHE_SETTINGS = {
+    "max_entries": (int,), "ttl": (int, float, type(None)), "disk": (bool,), "shared": (bool,),
+    "semantic": (dict, type(None)),
+}
+SEMANTIC_SETTINGS = {
+    "max_entries": (int,), "threshold": (int, float), "ttl": (int, float, type(None)), "scope": (str,), "embedding": (str,),
+}
+COMPACTION_SETTINGS = {"model": (str,), "trigger_tokens": (int,), "keep_recent": (int,), "batch_tokens": (int,)}
+LIMIT_SETTINGS = {
+    "rpm": (int, float), "tpm": (int, float), "max_in_flight": (int,), "max_queue": (int,),
+    "max_retries": (int,), "base_delay": (int, float), "max_delay": (int, float),
+}
+
+
+class ConfigError(ValueError):
+    def __init__(self, source: str, errors: List[str]) -> None:
+        """
+        Raised when a configuration can't be read or is invalid.
+
+        Args:
+            source (str): Where the configuration came from, e.g. its file path.
+            errors (List[str]): Every problem found, not just the first.
+        """
+        self.errors: List[str] = errors
+        super().__init__(f"Invalid configuration in {source}:\n  " + "\n  ".join(errors))
+
+
+def load_config_file(path: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Reads a TOML (.toml) or YAML (.yaml, .yml) configuration file.
+
+    Args:
+        path (Union[str, Path]): The file to read.
+
+    Returns:
+        Dict[str, Any]: The parsed file, not yet validated.
+
+    Raises:
+        ConfigError: If the file can't be read or parsed.
+    """
+    path = Path(path)
+    try:
+        if path.suffix == ".toml":
+            with open(path, 'rb') as f:
+                return tomllib.load(f)
+        if path.suffix in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:  # PyYAML is optional; TOML needs nothing beyond the standard library
+                raise ConfigError(str(path), ["reading YAML needs PyYAML (pip install pyyaml)"])
+            with open(path) as f:
+                return yaml.safe_load(f) or {}
+    except ConfigError:
+        raise
+    except Exception as e:
+        raise ConfigError(str(path), [f"can't parse the file: {e}"])
+    raise ConfigError(str(path), [f"unknown file type {path.suffix!r}; use .toml, .yaml or .yml"])
+
+
+def _check_settings(where: str, values: Dict[str, Any], settings: Dict[str, tuple], errors: List[str]) -> None:
+    for name, value in values.items():
+        if name not in settings:
+            errors.append(f"{where}: unknown setting {name!r}")
+        elif not isinstance(value, settings[name]) or (isinstance(value, bool) and bool not in settings[name]):
+            expected = " or ".join("null" if kind is type(None) else kind.__name__ for kind in settings[name])
+            errors.append(f"{where}.{name}: expected {expected}, got {value!r}")
+
+
+def validate_config(raw: Dict[str, Any], source: str = "config") -> Tuple[Dict[str, dict], Dict[str, dict]]:
+    """
+    Checks a configuration and normalizes it to what `build_model` and the bots expect.
+
+    Args:
+        raw (Dict[str, Any]): A mapping with "models" (as in MODEL_CONFIG) and "channels" (as in CHANNEL_CONFIG).
+        source (str): Where the configuration came from, for error messages.
+
+    Returns:
+        Tuple[Dict[str, dict], Dict[str, dict]]: The model configurations by key, and the routes by channel.
+
+    Raises:
+        ConfigError: Listing every problem found.
+    """
+    errors: List[str] = []
+    models: Dict[str, dict] = {}
+    raw_models = raw.get("models") or {}
+    if not isinstance(raw_models, dict) or not raw_models:
+        raise ConfigError(source, ["'models' must be a non-empty table of model configurations"])
+
+    for key, config in raw_models.items():
+        where = f"models.{key}"
+        if not isinstance(config, dict):
+            errors.append(f"{where}: expected a table, got {config!r}")
+            continue
+        _check_settings(where, config, MODEL_SETTINGS, errors)
+        if config.get("class") not in MODEL_CLASSES:
+            errors.append(f"{where}.class: must be one of {MODEL_CLASSES}, got {config.get('class')!r}")
+        if config.get("class") == "BedrockCompletions" and not config.get("model"):
+            errors.append(f"{where}.model: required for BedrockCompletions")
+        if config.get("class") == "BedrockCompletions" and config.get("prompt_cache") and not converse_supports_prompt_cache():
+            errors.append(f"{where}.prompt_cache: the installed boto3/botocore doesn't support Bedrock cachePoint blocks")
+        if isinstance(config.get("context_budget"), int) and config["context_budget"] <= 0:
+            errors.append(f"{where}.context_budget: must be positive")
+        if isinstance(config.get("cache"), dict):
+            _check_settings(f"{where}.cache", config["cache"], CACHE_SETTINGS, errors)
+            semantic = config["cache"].get("semantic")
+            if isinstance(semantic, dict):
+                _check_settings(f"{where}.cache.semantic", semantic, SEMANTIC_SETTINGS, errors)
+                if semantic.get("scope", "conversation") not in SCOPES:
+                    errors.append(f"{where}.cache.semantic.scope: must be one of {SCOPES}, got {semantic.get('scope')!r}")
+                if isinstance(semantic.get("threshold"), (int, float)) and not 0 < semantic["threshold"] <= 1:
+                    errors.append(f"{where}.cache.semantic.threshold: must be in (0, 1]")
+        if isinstance(config.get("limits"), dict):
+            _check_settings(f"{where}.limits", config["limits"], LIMIT_SETTINGS, errors)
+        compaction = config.get("compaction")
+        if isinstance(compaction, dict):
+            _check_settings(f"{where}.compaction", compaction, COMPACTION_SETTINGS, errors)
+            if compaction.get("model") not in raw_models:
+                errors.append(f"{where}.compaction.model: unknown model {compaction.get('model')!r}")
+            elif "trigger_tokens" not in compaction and not config.get("context_budget"):
+                errors.append(f"{where}.compaction: needs trigger_tokens or the model's context_budget")
+        # TOML has no null, so optional settings may be left out
+        models[key] = {"system_prompt": None, "state_file": None, **copy.deepcopy(config)}
+
+    routes: Dict[str, dict] = {}
+    raw_channels = raw.get("channels") or {}
+    if not isinstance(raw_channels, dict):
+        errors.append("'channels' must be a table of channel routes")
+        raw_channels = {}
+    for channel, entry in raw_channels.items():
+        try:
+            routes[str(channel)] = parse_route(entry, raw_models)
+        except (ValueError, TypeError, AttributeError) as e:
+            errors.append(f"channels.{channel}: {e}")
+
+    if errors:
+        raise ConfigError(source, errors)
+    return models, routes
+
+
+class ConfigRegistry:
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        model_config: Optional[Dict[str, dict]] = None,
+        channel_config: Optional[Dict[str, Any]] = None,
+        poll_interval: float = 5.0
+    ) -> None:
+        """
+        The model and channel configuration: validated, indexed for routing, and reloadable at runtime.
+
+        With `path`, it is read from a TOML or YAML file with "models" and "channels" tables, laid out
+        like MODEL_CONFIG and CHANNEL_CONFIG. `watch` then reloads it when the file changes or when
+        `request_reload` is called, e.g. on SIGHUP. An invalid file is rejected as a whole and the
+        current configuration stays in use. Without `path`, the dicts from model_config.py are used.
+
+        Channels are keyed by Discord channel ID or, for older configurations, by channel name;
+        both are looked up in precomputed dicts.
+
+        Args:
+            path (Optional[Union[str, Path]]): The configuration file.
+            model_config (Optional[Dict[str, dict]]): Models to use without a file. Defaults to MODEL_CONFIG.
+            channel_config (Optional[Dict[str, Any]]): Channels to use without a file. Defaults to CHANNEL_CONFIG.
+            poll_interval (float): Seconds between checks of the file's modification time. Defaults to 5.
+
+        Raises:
+            ConfigError: If the initial configuration is invalid.
+        """
+        self.path: Optional[Path] = Path(path) if path else None
+        self.poll_interval: float = poll_interval
+        self.version: int = 0
+        self.reloads: int = 0
+        self.failures: int = 0
+        self._listeners: List[Callable[[ConfigChange], None]] = []
+        self._wake = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self._stamp: Optional[Tuple[int, int]] = None
+
+        if self.path:
+            self._stamp = self._file_stamp()
+            models, routes = validate_config(load_config_file(self.path), str(self.path))
+        else:
+            raw = {
+                "models": model_config if model_config is not None else MODEL_CONFIG,
+                "channels": channel_config if channel_config is not None else CHANNEL_CONFIG,
+            }
+            models, routes = validate_config(raw, "model_config.py")
+        self._snapshot = self._index(models, routes)
+
+    @staticmethod
+    def _index(models: Dict[str, dict], routes: Dict[str, dict]) -> Tuple[Dict[str, dict], Dict[str, dict], Dict[str, dict]]:
+        by_id = {channel: route for channel, route in routes.items() if channel.isdigit()}
+        by_name = {channel: route for channel, route in routes.items() if not channel.isdigit()}
+        return models, by_id, by_name
+
+    @property
+    def models(self) -> Dict[str, dict]:
+        """The current model configurations by key. Replaced, never modified, by a reload."""
+        return self._snapshot[0]
+
+    def route(self, channel_id: Optional[Union[int, str]], channel_name: Optional[str] = None) -> Optional[dict]:
+        """
+        Looks up the route of a channel, by ID first and then by name.
+
+        Args:
+            channel_id (Optional[Union[int, str]]): The channel's ID.
+            channel_name (Optional[str]): The channel's name, for channels configured by name.
+
+        Returns:
+            Optional[dict]: The route (see `parse_route`), or None if the channel isn't configured.
+        """
+        _, by_id, by_name = self._snapshot
+        route = by_id.get(str(channel_id)) if channel_id is not None else None
+        if route is None and channel_name is not None:
+            route = by_name.get(channel_name)
+        return route
+
+    def channels(self) -> List[str]:
+        """
+        Returns the configured channel IDs and names.
+
+        Returns:
+            List[str]: Every channel key, IDs first.
+        """
+        _, by_id, by_name = self._snapshot
+        return [*by_id, *by_name]
+
+    def subscribe(self, listener: Callable[[ConfigChange], None]) -> None:
+        """
+        Registers a function called with the ConfigChange after every successful reload.
+
+        Args:
+            listener (Callable[[ConfigChange], None]): Called where the reload is committed.
+        """
+        self._listeners.append(listener)
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self) -> Optional[Tuple[Dict[str, dict], Dict[str, dict]]]:
+        self._stamp = self._file_stamp()
+        try:
+            return validate_config(load_config_file(self.path), str(self.path))
+        except ConfigError as e:
+            self.failures += 1
+            logger.error("config_reload_failed", extra={"fields": {"path": str(self.path), "errors": e.errors}})
+            return None
+
+    def _commit(self, models: Dict[str, dict], routes: Dict[str, dict]) -> ConfigChange:
+        old_models, old_by_id, old_by_name = self._snapshot
+        changed = {key for key in models.keys() & old_models.keys() if models[key] != old_models[key]}
+        # A compactor holds its summarizer, so models summarized by a changed model are rebuilt too
+        changed |= {
+            key for key in models.keys() & old_models.keys()
+            if (models[key].get("compaction") or {}).get("model") in changed
+        }
+        snapshot = self._index(models, routes)
+        self._snapshot = snapshot
+        self.version += 1
+        self.reloads += 1
+        change = {
+            "version": self.version,
+            "added": sorted(models.keys() - old_models.keys()),
+            "changed": sorted(changed),
+            "removed": sorted(old_models.keys() - models.keys()),
+            "channels": (snapshot[1], snapshot[2]) != (old_by_id, old_by_name),
+        }
+        logger.info("config_reloaded", extra={"fields": change})
+        for listener in self._listeners:
+            try:
+                listener(change)
+            except Exception:
+                logger.exception("config_listener_failed")
+        return change
+
+    def reload(self) -> Optional[ConfigChange]:
+        """
+        Reads the configuration file again and switches to it if it is valid.
+
+        Returns:
+            Optional[ConfigChange]: What changed, or None if there is no file or it was invalid.
+        """
+        if not self.path:
+            return None
+        candidate = self._read()
+        return self._commit(*candidate) if candidate else None
+
+    def request_reload(self) -> None:
+        """Makes the watcher reload the file now, whether or not it changed. Safe to call from signal handlers."""
+        self._wake.set()
+
+    def watch(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        Starts a daemon thread that reloads the file when it changes or a reload is requested.
+
+        The file is read and validated on the thread. With `loop`, the new configuration is then
+        switched to, and listeners are called, on that event loop, so code running there never
+        sees a half-applied reload. Does nothing without a file or if already watching.
+
+        Args:
+            loop (Optional[asyncio.AbstractEventLoop]): The event loop the registry is used from.
+        """
+        if not self.path or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, args=(loop,), name="config-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch(self, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        while True:
+            requested = self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if not requested and self._file_stamp() == self._stamp:
+                continue
+            candidate = self._read()
+            if candidate is None:
+                continue
+            if loop is None:
+                self._commit(*candidate)
+            else:
+                loop.call_soon_threadsafe(self._commit, *candidate)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the configuration version, reload counts and the number of models and channels.
+
+        Returns:
+            Dict[str, int]: Registry counters.
+        """
+        models, by_id, by_name = self._snapshot
+        return {
+            "version": self.version,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "models": len(models),
+            "channels": len(by_id) + len(by_name),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate a bot configuration file.")
+    parser.add_argument("path", type=Path, help="A .toml, .yaml or .yml configuration")
+    args = parser.parse_args()
+    try:
+        registry = ConfigRegistry(args.path)
+    except ConfigError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    print(f"OK: {len(registry.models)} models, {len(registry.channels())} channels.")
@@ -0,0 +1,253 @@
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; Bedrock models always use the approximation
+    tiktoken = None
+
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# Per-message framing tokens (role, separators) added by chat formats on top of the content
+MESSAGE_OVERHEAD = 4
+
+
+def approximate_token_count(text: str) -> int:
+    """
+    Estimates the token count of a text at roughly four characters per token.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    return (len(text) + 3) // 4
+
+
+def get_token_counter(model: str) -> Callable[[str], int]:
+    """
+    Returns a token counting function for a model.
+
+    OpenAI models use their tiktoken encoding when tiktoken is installed. Everything else, including
+    all Bedrock models whose tokenizers are not available locally, uses `approximate_token_count`.
+
+    Args:
+        model (str): The model ID.
+
+    Returns:
+        Callable[[str], int]: A function returning the token count of a text.
+    """
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = None  # Not an OpenAI model
+        except Exception as e:
+            logger.warning("tiktoken_encoding_unavailable", extra={"fields": {"model": model, "reason": str(e)}})
+            encoding = None
+        if encoding is not None:
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+    return approximate_token_count
+
+
+def count_message_tokens(message: Dict[str, Any], count_tokens: Callable[[str], int] = approximate_token_count) -> int:
+    """
+    Returns the token count of a message in OpenAI (string content) or converse (content blocks) format.
+
+    Args:
+        message (Dict[str, Any]): The message to measure.
+        count_tokens (Callable[[str], int]): Returns the token count of a text.
+
+    Returns:
+        int: The number of tokens, including per-message overhead.
+    """
+    content = message["content"]
+    if isinstance(content, str):
+        return count_tokens(content) + MESSAGE_OVERHEAD
+    return sum(count_tokens(block["text"]) for block in content if "text" in block) + MESSAGE_OVERHEAD
+
+
+class TokenLedger:
+    def __init__(self, message_tokens: Callable[[Dict[str, Any]], int] = count_message_tokens) -> None:
+        """
+        Running token totals of one conversation's history, so each turn only counts the messages added
+        since the last one. Kept per session; histories change by appending, by rolling back their last
+        messages, or by being replaced as a whole, which `sync` tells apart cheaply.
+
+        Args:
+            message_tokens (Callable[[Dict[str, Any]], int]): Returns the token count of a message.
+        """
+        self._message_tokens = message_tokens
+        self._messages: List[Dict[str, Any]] = []
+        # _totals[i] is the token count of the first i messages
+        self._totals: List[int] = [0]
+
+    def sync(self, messages: List[Dict[str, Any]]) -> None:
+        """
+        Catches up with the current history.
+
+        Args:
+            messages (List[Dict[str, Any]]): The full history, oldest first.
+        """
+        if len(self._messages) > len(messages):
+            del self._messages[len(messages):]
+            del self._totals[len(messages) + 1:]
+        if self._messages and messages[len(self._messages) - 1] is not self._messages[-1]:
+            self._messages, self._totals = [], [0]  # Replaced, e.g. reloaded or cleared
+        for message in messages[len(self._messages):]:
+            self._messages.append(message)
+            self._totals.append(self._totals[-1] + self._message_tokens(message))
+
+    def message_tokens(self, message: Dict[str, Any]) -> int:
+        """
+        Returns the token count of a message, counted the same way as the history.
+        """
+        return self._message_tokens(message)
+
+    def total(self, start: int = 0, end: Optional[int] = None) -> int:
+        """
+        Returns the token count of the synced messages from `start` to `end`.
+        """
+        return self._totals[len(self._messages) if end is None else end] - self._totals[start]
+
+    def fit_start(self, start: int, remaining: int) -> int:
+        """
+        Returns where the longest suffix of the synced messages, beginning at `start` or later, that fits in
+        `remaining` tokens starts. The last message is always included.
+        """
+        end = len(self._messages)
+        if end <= start:
+            return end
+        return bisect_left(self._totals, self._totals[end] - remaining, start, end - 1)
+
+
+class ContextWindow:
+    def __init__(
+        self,
+        budget: int,
+        count_tokens: Callable[[str], int] = approximate_token_count,
+        cache_size: int = 8192
+    ) -> None:
+        """
+        Fits a conversation history into a token budget, keeping the most recent turns.
+
+        Token counts are memoized per text, and kept per message in each session's TokenLedger, so each
+        turn only pays to count the new messages and finds its window with a binary search.
+
+        Args:
+            budget (int): The maximum number of prompt tokens, including the system prompt.
+            count_tokens (Callable[[str], int]): Returns the token count of a text.
+            cache_size (int): How many distinct message texts to keep counts for.
+        """
+        self.budget: int = budget
+        self._count: Callable[[str], int] = lru_cache(maxsize=cache_size)(count_tokens)
+
+    def text_tokens(self, text: str) -> int:
+        """
+        Returns the cached token count of a text.
+
+        Args:
+            text (str): The text to measure.
+
+        Returns:
+            int: The number of tokens.
+        """
+        return self._count(text)
+
+    def message_tokens(self, message: Dict[str, Any]) -> int:
+        """
+        Returns the token count of a message in OpenAI (string content) or converse (content blocks) format.
+
+        Args:
+            message (Dict[str, Any]): The message to measure.
+
+        Returns:
+            int: The number of tokens, including per-message overhead.
+        """
+        return count_message_tokens(message, self._count)
+
+    def ledger(self) -> TokenLedger:
+        """
+        Returns a new TokenLedger counting messages like this window, for one session's history.
+        """
+        return TokenLedger(self.message_tokens)
+
+    def fit(
+        self,
+        messages: List[Dict[str, Any]],
+        reserved: int = 0,
+        first_role: Optional[str] = None,
+        start: int = 0,
+        ledger: Optional[TokenLedger] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns the longest suffix of `messages[start:]` that fits in the budget.
+
+        The most recent message is always kept, even if it alone exceeds the budget.
+
+        Args:
+            messages (List[Dict[str, Any]]): The history to trim, oldest first, without the system prompt.
+            reserved (int): Tokens already used by the system prompt.
+            first_role (Optional[str]): If set, drop leading messages until the window starts with this role,
+                as required by Bedrock converse.
+            start (int): The first message that may be kept, e.g. the first one not summarized. Defaults to 0.
+            ledger (Optional[TokenLedger]): The session's token counts of `messages`. Counted afresh if omitted.
+
+        Returns:
+            List[Dict[str, Any]]: The trimmed history, oldest first.
+        """
+        ledger = self._synced(messages, ledger)
+        return messages[self._fit_start(messages, ledger, start, self.budget - reserved, first_role):]
+
+    def stable_start(
+        self,
+        messages: List[Dict[str, Any]],
+        start: int,
+        reserved: int = 0,
+        first_role: Optional[str] = None,
+        slack: float = 0.25,
+        ledger: Optional[TokenLedger] = None
+    ) -> int:
+        """
+        Like `fit`, but keeps the window starting at `start` for as long as it fits, so the prompt prefix
+        stays byte-identical across turns and provider prompt caches keep hitting.
+
+        Once the window overflows, it is trimmed to `1 - slack` of the budget, leaving room for the next
+        few turns before it has to move again.
+
+        Args:
+            messages (List[Dict[str, Any]]): The history, oldest first, without the system prompt.
+            start (int): Where the previous window started.
+            reserved (int): Tokens already used by the system prompt.
+            first_role (Optional[str]): If set, the window must start with this role.
+            slack (float): Fraction of the budget freed whenever the window moves. Defaults to 0.25.
+            ledger (Optional[TokenLedger]): The session's token counts of `messages`. Counted afresh if omitted.
+
+        Returns:
+            int: Where the window starts now.
+        """
+        ledger = self._synced(messages, ledger)
+        start = min(start, len(messages))
+        if ledger.total(start) <= self.budget - reserved:
+            return start
+        target = int(self.budget * (1 - slack)) - reserved
+        return self._fit_start(messages, ledger, start, target, first_role)
+
+    def _synced(self, messages: List[Dict[str, Any]], ledger: Optional[TokenLedger]) -> TokenLedger:
+        ledger = ledger or self.ledger()
+        ledger.sync(messages)
+        return ledger
+
+    @staticmethod
+    def _fit_start(
+        messages: List[Dict[str, Any]], ledger: TokenLedger, start: int, remaining: int, first_role: Optional[str]
+    ) -> int:
+        start = ledger.fit_start(start, remaining)
+        if first_role is not None:
+            while start < len(messages) - 1 and messages[start]["role"] != first_role:
+                start += 1
+        return start
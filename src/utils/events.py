@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional
+
+
+class EventDeduplicator:
+    def __init__(self, ttl: float = 10 * 60, max_entries: int = 10_000) -> None:
+        """
+        Remembers recently handled event IDs so re-delivered events are processed once.
+
+        Slack retries an event up to three times over about an hour when it doesn't get a fast ack,
+        always with the same `event_id`.
+
+        Args:
+            ttl (float): Seconds an event ID is remembered. Defaults to 10 minutes.
+            max_entries (int): Maximum number of IDs remembered. Defaults to 10,000.
+        """
+        self.ttl: float = ttl
+        self.max_entries: int = max_entries
+        self.duplicates: int = 0
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seen(self, event_id: Optional[str]) -> bool:
+        """
+        Records an event ID and reports whether it had already been recorded.
+
+        Args:
+            event_id (Optional[str]): The event's ID. Events without one are never treated as duplicates.
+
+        Returns:
+            bool: True if the event is a duplicate and should be ignored.
+        """
+        if not event_id:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._seen and (
+                len(self._seen) >= self.max_entries or now - next(iter(self._seen.values())) > self.ttl
+            ):
+                self._seen.popitem(last=False)
+            if event_id in self._seen:
+                self.duplicates += 1
+                return True
+            self._seen[event_id] = now
+            return False
+
+    def __contains__(self, event_id: Optional[str]) -> bool:
+        with self._lock:
+            return bool(event_id) and event_id in self._seen
+
+
+class BackgroundLoop:
+    def __init__(self, name: str = "background-loop") -> None:
+        """
+        An asyncio event loop running in a daemon thread, so synchronous request handlers can hand off
+        coroutines and return immediately.
+
+        Args:
+            name (str): The thread name.
+        """
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coroutine: Coroutine[Any, Any, Any]) -> Future:
+        """
+        Schedules a coroutine on the loop from any thread.
+
+        Args:
+            coroutine (Coroutine[Any, Any, Any]): The work to run.
+
+        Returns:
+            Future: A future completed with the coroutine's result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
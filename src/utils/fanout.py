@@ -0,0 +1,176 @@
+import asyncio
+from typing import Any, AsyncIterator, Callable, Collection, Dict, Optional, Sequence, Tuple, Union
+
+from src.utils.log import get_logger
+from src.utils.metrics import FANOUT_ANSWERS
+
+logger = get_logger(__name__)
+
+# How a channel uses its models: "single" asks one model; "race" asks all of them at once and keeps the
+# first to start answering; "compare" streams every answer side by side; "fallback" asks them one after
+# another until one starts answering
+STRATEGIES = ("single", "race", "compare", "fallback")
+
+# Starts one model's reply stream; called once per attempt
+StreamStarter = Callable[[], AsyncIterator[str]]
+
+
+class FanOutError(Exception):
+    def __init__(self, errors: Dict[str, BaseException]) -> None:
+        """
+        Raised when none of the models of a route started answering.
+
+        Args:
+            errors (Dict[str, BaseException]): What went wrong with each model, by model key.
+        """
+        self.errors: Dict[str, BaseException] = errors
+        super().__init__("; ".join(f"{key}: {error}" for key, error in errors.items()) or "No models to ask")
+
+
+def parse_route(entry: Union[str, Dict[str, Any]], model_keys: Collection[str]) -> Dict[str, Any]:
+    """
+    Normalizes a CHANNEL_CONFIG entry to `{"models": [...], "strategy": ..., "timeout": ...}`.
+
+    A plain model key is a "single" route. A dict names its "models" in order of preference, a
+    "strategy" from STRATEGIES and, for "fallback", an optional "timeout": seconds to wait for a
+    model's first delta before moving on to the next one.
+
+    Args:
+        entry (Union[str, Dict[str, Any]]): The CHANNEL_CONFIG value.
+        model_keys (Collection[str]): The MODEL_CONFIG keys the route may use.
+
+    Returns:
+        Dict[str, Any]: The normalized route.
+
+    Raises:
+        ValueError: If the route names an unknown model or strategy, or no model at all.
+    """
+    if isinstance(entry, str):
+        entry = {"models": [entry], "strategy": "single"}
+    models = list(entry.get("models") or [])
+    strategy = entry.get("strategy", "single" if len(models) == 1 else "race")
+    if strategy not in STRATEGIES:
+        raise ValueError(f"strategy must be one of {STRATEGIES}, got {strategy!r}")
+    if not models or (strategy == "single" and len(models) > 1):
+        raise ValueError(f"a {strategy!r} route needs {'one model' if strategy == 'single' else 'models'}, got {models}")
+    unknown = [key for key in models if key not in model_keys]
+    if unknown:
+        raise ValueError(f"unknown models {unknown}")
+    return {"models": models, "strategy": strategy, "timeout": entry.get("timeout")}
+
+
+async def _chain(first: str, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+    try:
+        yield first
+        async for delta in stream:
+            yield delta
+    finally:
+        await stream.aclose()
+
+
+async def race(starts: Dict[str, StreamStarter]) -> Tuple[str, AsyncIterator[str]]:
+    """
+    Starts every stream at once and keeps the first to deliver a delta; the others are cancelled.
+
+    A model that fails before its first delta drops out of the race. Ties go to the model listed first.
+
+    Args:
+        starts (Dict[str, StreamStarter]): Stream starters by model key, in order of preference.
+
+    Returns:
+        Tuple[str, AsyncIterator[str]]: The winning model key and its complete stream.
+
+    Raises:
+        FanOutError: If every stream failed before its first delta.
+    """
+    order = list(starts)
+    streams = {key: start() for key, start in starts.items()}
+    pending = {asyncio.ensure_future(stream.__anext__()): key for key, stream in streams.items()}
+    errors: Dict[str, BaseException] = {}
+    winner: Optional[str] = None
+    first = ""
+    try:
+        while pending and winner is None:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=lambda task: order.index(pending[task])):
+                key = pending.pop(task)
+                if winner is not None:
+                    pending[task] = key  # Finished in the same step as the winner; closed below
+                    continue
+                try:
+                    first, winner = task.result(), key
+                except StopAsyncIteration:
+                    errors[key] = RuntimeError("Empty reply")
+                except Exception as e:
+                    errors[key] = e
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for key, stream in streams.items():
+            if key != winner:
+                await stream.aclose()
+
+    if winner is None:
+        raise FanOutError(errors)
+    logger.info("race_won", extra={"fields": {
+        "model": winner, "cancelled": [key for key in order if key != winner and key not in errors],
+        "failed": {key: str(error) for key, error in errors.items()},
+    }})
+    FANOUT_ANSWERS.inc(strategy="race", model=winner)
+    return winner, _chain(first, streams[winner])
+
+
+async def fallback(starts: Sequence[Tuple[str, StreamStarter]], timeout: Optional[float] = None) -> Tuple[str, AsyncIterator[str]]:
+    """
+    Tries one stream after another until one delivers a delta.
+
+    Throttled requests are retried by the scheduler first; whatever still fails, or takes longer
+    than `timeout` to start answering, moves on to the next model. A model that fails after its
+    first delta is not replaced, since part of its reply has been shown already.
+
+    Args:
+        starts (Sequence[Tuple[str, StreamStarter]]): (model key, stream starter) pairs, in order of preference.
+        timeout (Optional[float]): Seconds to wait for each model's first delta. No limit if omitted.
+
+    Returns:
+        Tuple[str, AsyncIterator[str]]: The answering model key and its complete stream.
+
+    Raises:
+        FanOutError: If every stream failed before its first delta.
+    """
+    errors: Dict[str, BaseException] = {}
+    for key, start in starts:
+        stream = start()
+        try:
+            first = await asyncio.wait_for(stream.__anext__(), timeout)
+        except StopAsyncIteration:
+            errors[key] = RuntimeError("Empty reply")
+        except Exception as e:  # Including the timeout
+            errors[key] = e
+        except BaseException:
+            await stream.aclose()
+            raise
+        else:
+            if errors:
+                logger.warning("model_fallback", extra={"fields": {
+                    "model": key, "failed": {failed: repr(error) for failed, error in errors.items()}
+                }})
+            FANOUT_ANSWERS.inc(strategy="fallback", model=key)
+            return key, _chain(first, stream)
+        await stream.aclose()
+    raise FanOutError(errors)
+
+
+def labelled(key: str, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Prefixes a stream with a bold header naming its model, for side-by-side answers.
+
+    Args:
+        key (str): The model key.
+        stream (AsyncIterator[str]): The model's reply stream.
+
+    Returns:
+        AsyncIterator[str]: The labelled stream.
+    """
+    return _chain(f"**{key}**\n", stream)
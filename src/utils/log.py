@@ -0,0 +1,79 @@
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+# Correlation ID of the event being handled; copied into tasks and `asyncio.to_thread` calls it starts
+CORRELATION_ID: ContextVar[str] = ContextVar("correlation_id", default="-")
+
+_configured = False
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Renders a record as one JSON object per line.
+
+        Structured fields passed as `extra={"fields": {...}}` are merged into the object.
+
+        Args:
+            record (logging.LogRecord): The record to render.
+
+        Returns:
+            str: The JSON line.
+        """
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+            "correlation_id": CORRELATION_ID.get(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Returns a logger that writes structured JSON lines to stdout.
+
+    The level is read from LOG_LEVEL (default INFO) the first time a logger is requested.
+
+    Args:
+        name (str): The logger name, usually `__name__`.
+
+    Returns:
+        logging.Logger: The logger.
+    """
+    global _configured
+    if not _configured:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JSONFormatter())
+        root = logging.getLogger("llm_bots")
+        root.addHandler(handler)
+        root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        root.propagate = False
+        _configured = True
+    return logging.getLogger(f"llm_bots.{name}")
+
+
+def new_correlation_id(value: Optional[str] = None) -> str:
+    """
+    Sets the correlation ID for the current context, e.g. at the start of handling a message.
+
+    Args:
+        value (Optional[str]): An ID from the platform, such as a Slack event_id or Discord message ID.
+            A random one is generated if omitted.
+
+    Returns:
+        str: The correlation ID now in effect.
+    """
+    correlation_id = str(value) if value else uuid.uuid4().hex[:16]
+    CORRELATION_ID.set(correlation_id)
+    return correlation_id
@@ -0,0 +1,445 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from src.utils.log import get_logger
+
+# Prometheus text exposition format served by /metrics
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from cache hits up to long generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+logger = get_logger(__name__)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labels: Tuple[str, ...] = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        """
+        A monotonically increasing count, e.g. requests or tokens.
+
+        Args:
+            name (str): The metric name, ending in "_total" by convention.
+            documentation (str): The HELP text.
+            labels (Sequence[str]): Label names; every increment must provide each of them.
+        """
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        """
+        Adds to the count of a label combination.
+
+        Args:
+            amount (float): The non-negative amount to add. Defaults to 1.
+            **labels (Any): The label values.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [
+                f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+                for key, value in self._values.items()
+            ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        """
+        A distribution of observations in cumulative buckets, e.g. latencies.
+
+        Args:
+            name (str): The metric name, with its unit as a suffix (e.g. "_seconds").
+            documentation (str): The HELP text.
+            labels (Sequence[str]): Label names; every observation must provide each of them.
+            buckets (Sequence[float]): Upper bounds of the buckets. Defaults to `DEFAULT_BUCKETS`.
+        """
+        super().__init__(name, documentation, labels)
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[LabelValues, List[float]] = {}  # Bucket counts, then sum and count
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """
+        Records one observation.
+
+        Args:
+            value (float): The observed value.
+            **labels (Any): The label values.
+        """
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """
+        Observes the duration of the `with` block, in seconds.
+
+        Args:
+            **labels (Any): The label values.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, series in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(series[-2])}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {_format_value(series[-1])}")
+        return lines
+
+
+class StatsGauges:
+    def __init__(self, prefix: str, documentation: str, collect: Callable[[], Dict[str, Any]], label: Optional[str] = None) -> None:
+        """
+        Exposes the numeric values of a `stats()` method as gauges, read at scrape time.
+
+        Args:
+            prefix (str): Prefix of the gauge names; each stat becomes "<prefix>_<stat>".
+            documentation (str): The HELP text shared by the gauges.
+            collect (Callable[[], Dict[str, Any]]): Returns the stats, either flat or keyed by `label`.
+            label (Optional[str]): Label name for nested stats, e.g. "model" for `Scheduler.stats()`.
+        """
+        self.name: str = prefix
+        self.documentation: str = documentation
+        self.collect = collect
+        self.label: Optional[str] = label
+
+    def render(self) -> List[str]:
+        try:
+            stats = self.collect()
+        except Exception as e:
+            logger.warning("metrics_collect_failed", extra={"fields": {"collector": self.name, "error": repr(e)}})
+            return []
+        rows = stats.items() if self.label else [(None, stats)]
+        series: Dict[str, List[str]] = {}
+        for key, values in rows:
+            labels = _format_labels((self.label,), (key,)) if self.label else ""
+            for stat, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    series.setdefault(stat, []).append(f"{self.name}_{stat}{labels} {_format_value(value)}")
+        lines = []
+        for stat, samples in series.items():
+            lines += [f"# HELP {self.name}_{stat} {self.documentation}", f"# TYPE {self.name}_{stat} gauge", *samples]
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        """
+        The set of metrics exported by a process, rendered in the Prometheus text format.
+        """
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Any) -> Any:
+        """
+        Adds a metric, or replaces the one registered under the same name.
+
+        Args:
+            metric (Any): A Counter, Histogram or StatsGauges.
+
+        Returns:
+            Any: The metric, for use as `X = REGISTRY.register(Counter(...))`.
+        """
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """
+        Renders every metric for a scrape.
+
+        Returns:
+            str: The exposition text.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+MODEL_LATENCY = REGISTRY.register(Histogram(
+    "llm_model_latency_seconds",
+    "Model call latency by phase: queue (waiting for a scheduler slot), upstream, first_token and total.",
+    ("model", "phase"),
+))
+MODEL_TOKENS = REGISTRY.register(Counter(
+    "llm_model_tokens_total",
+    "Tokens reported by the provider, by direction: input, output, or the input tokens read from (cache_read) "
+    "or written to (cache_write) the provider's prompt cache.",
+    ("model", "direction")
+))
+MODEL_CALLS = REGISTRY.register(Counter(
+    "llm_model_calls_total", "Model calls by outcome: ok, cached, cancelled or error.", ("model", "outcome")
+))
+MODEL_ERRORS = REGISTRY.register(Counter(
+    "llm_model_errors_total", "Failed model calls by exception class.", ("model", "error")
+))
+SCHEDULER_RETRIES = REGISTRY.register(Counter(
+    "llm_scheduler_retries_total", "Model calls retried after a throttling error.", ("model",)
+))
+SCHEDULER_REJECTIONS = REGISTRY.register(Counter(
+    "llm_scheduler_rejections_total", "Model calls rejected because the model's queue was full.", ("model",)
+))
+FANOUT_ANSWERS = REGISTRY.register(Counter(
+    "llm_fanout_answers_total", "Replies of multi-model channels, by strategy and the model that answered.",
+    ("strategy", "model")
+))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "llm_cache_lookups_total", "Response cache lookups by result: hit, semantic_hit or miss.", ("result",)
+))
+CACHE_LOOKUP_LATENCY = REGISTRY.register(Histogram(
+    "llm_cache_lookup_seconds", "Latency of response cache lookups, by tier.", ("tier",),
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05),
+))
+STATE_SAVE_LATENCY = REGISTRY.register(Histogram(
+    "llm_state_save_seconds", "Latency of persisting conversation turns, by store.", ("store",)
+))
+CHUNK_SEND_LATENCY = REGISTRY.register(Histogram(
+    "llm_chunk_send_seconds", "Latency of posting or editing a reply message, by platform and operation.",
+    ("platform", "operation"),
+))
+
+
+class ModelCall:
+    def __init__(self, model: str) -> None:
+        """
+        Measures one model call: total latency, time to the first streamed delta, upstream latency,
+        token usage and outcome. Use through `observe_model_call`.
+
+        Args:
+            model (str): The model ID.
+        """
+        self.model: str = model
+        self.started: float = time.perf_counter()
+        self.first_token: Optional[float] = None
+        self.input_tokens: int = 0
+        self.output_tokens: int = 0
+        self.cache_read_tokens: int = 0
+        self.cache_write_tokens: int = 0
+        self.outcome: str = "ok"
+
+    def delta(self) -> None:
+        """
+        Marks the arrival of a streamed delta; only the first one is recorded.
+        """
+        if self.first_token is None:
+            self.first_token = time.perf_counter() - self.started
+            MODEL_LATENCY.observe(self.first_token, model=self.model, phase="first_token")
+
+    def cached(self) -> None:
+        """
+        Marks the call as answered from the response cache.
+        """
+        self.outcome = "cached"
+
+    @contextmanager
+    def upstream(self) -> Iterator[None]:
+        """
+        Observes the duration of the provider request made in the `with` block.
+        """
+        with MODEL_LATENCY.time(model=self.model, phase="upstream"):
+            yield
+
+    def usage(
+        self,
+        input_tokens: Optional[int],
+        output_tokens: Optional[int],
+        cache_read_tokens: Optional[int] = None,
+        cache_write_tokens: Optional[int] = None
+    ) -> None:
+        """
+        Records the token usage reported by the provider.
+
+        Args:
+            input_tokens (Optional[int]): Prompt tokens.
+            output_tokens (Optional[int]): Completion tokens.
+            cache_read_tokens (Optional[int]): Prompt tokens served from the provider's prompt cache.
+            cache_write_tokens (Optional[int]): Prompt tokens written to the provider's prompt cache.
+        """
+        self.input_tokens += input_tokens or 0
+        self.output_tokens += output_tokens or 0
+        self.cache_read_tokens += cache_read_tokens or 0
+        self.cache_write_tokens += cache_write_tokens or 0
+        record_usage(self.model, input_tokens, output_tokens, cache_read_tokens, cache_write_tokens)
+
+
+def record_usage(
+    model: str,
+    input_tokens: Optional[int],
+    output_tokens: Optional[int],
+    cache_read_tokens: Optional[int] = None,
+    cache_write_tokens: Optional[int] = None
+) -> None:
+    """
+    Adds provider-reported token usage to the token counters.
+
+    Args:
+        model (str): The model ID.
+        input_tokens (Optional[int]): Prompt tokens.
+        output_tokens (Optional[int]): Completion tokens.
+        cache_read_tokens (Optional[int]): Prompt tokens served from the provider's prompt cache.
+        cache_write_tokens (Optional[int]): Prompt tokens written to the provider's prompt cache.
+    """
+    if input_tokens:
+        MODEL_TOKENS.inc(input_tokens, model=model, direction="input")
+    if output_tokens:
+        MODEL_TOKENS.inc(output_tokens, model=model, direction="output")
+    if cache_read_tokens:
+        MODEL_TOKENS.inc(cache_read_tokens, model=model, direction="cache_read")
+    if cache_write_tokens:
+        MODEL_TOKENS.inc(cache_write_tokens, model=model, direction="cache_write")
+
+
+@contextmanager
+def observe_model_call(model: str) -> Iterator[ModelCall]:
+    """
+    Measures a model call made in the `with` block and logs it as one structured event.
+
+    Args:
+        model (str): The model ID.
+
+    Yields:
+        ModelCall: Collects first-token, upstream and usage measurements during the call.
+    """
+    call = ModelCall(model)
+    try:
+        yield call
+    except (asyncio.CancelledError, GeneratorExit):
+        call.outcome = "cancelled"  # E.g. the losers of a race between models
+        raise
+    except Exception as e:
+        call.outcome = "error"
+        MODEL_ERRORS.inc(model=model, error=type(e).__name__)
+        logger.error("model_call_failed", extra={"fields": {"model": model, "error": type(e).__name__, "reason": str(e)}})
+        raise
+    finally:
+        total = time.perf_counter() - call.started
+        MODEL_LATENCY.observe(total, model=model, phase="total")
+        MODEL_CALLS.inc(model=model, outcome=call.outcome)
+        logger.info("model_call", extra={"fields": {
+            "model": model,
+            "outcome": call.outcome,
+            "latency": round(total, 4),
+            "first_token": round(call.first_token, 4) if call.first_token is not None else None,
+            "input_tokens": call.input_tokens,
+            "output_tokens": call.output_tokens,
+            "cache_read_tokens": call.cache_read_tokens,
+            "cache_write_tokens": call.cache_write_tokens,
+        }})
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: Registry = REGISTRY
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass  # Scrapes every few seconds would drown the logs
+
+
+def serve_metrics(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """
+    Serves /metrics from a daemon thread, for processes without a web app such as the Discord bot.
+
+    Args:
+        port (int): The port to listen on.
+        host (str): The interface to bind. Defaults to all interfaces.
+
+    Returns:
+        ThreadingHTTPServer: The running server.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,319 @@
+import base64
+import json
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from src.state.shared_backend import SharedBackend
+
+# Markers of the chunking protocol, as produced by chunker_app
+START, CONTINUE, END = "$$START$$", "$$CONTINUE$$", "$$END$$"
+MARKERS = (START, CONTINUE, END)
+
+# Sequenced chunks carry "[index/total:crc32]" right after the marker, e.g. "$$CONTINUE$$[2/5:1c291ca3] ..."
+# The checksum is the CRC-32 of the whole message, so it also tells concurrent pastes apart. A ":gz"
+# suffix means the joined payloads are a gzip+base64 envelope of the message.
+HEADER_PATTERN = re.compile(r"\[(\d+)/(\d+):([0-9a-f]{8})(:gz)?\] ?")
+
+# Legacy chunks (no header) share one slot per user, appended in arrival order
+LEGACY_ID = "legacy"
+
+
+class ReassemblyError(Exception):
+    """Raised when a chunked message can't be reassembled: too large, inconsistent or corrupted."""
+
+
+def checksum(text: str) -> str:
+    """
+    Returns the checksum carried in sequenced chunk headers.
+
+    Args:
+        text (str): The whole message.
+
+    Returns:
+        str: The CRC-32 of the UTF-8 text, as 8 hex digits.
+    """
+    return f"{zlib.crc32(text.encode('utf-8')):08x}"
+
+
+class _Partial:
+    """Chunks received so far for one message."""
+
+    def __init__(self, total: Optional[int], expected: Optional[str]) -> None:
+        self.total = total
+        self.expected = expected
+        self.parts: Dict[int, str] = {}
+        self.size: int = 0
+        self.updated: float = time.monotonic()
+
+
+class ChunkReassembler:
+    def __init__(
+        self,
+        ttl: float = 10 * 60,
+        max_user_bytes: int = 512 * 1024,
+        max_total_bytes: int = 32 * 1024 * 1024,
+        max_chunks: int = 256,
+        max_message_bytes: int = 4 * 1024 * 1024
+    ) -> None:
+        """
+        Reassembles messages split with the $$START$$/$$CONTINUE$$/$$END$$ protocol, within bounded memory.
+
+        Sequenced chunks ("$$START$$[1/3:crc] ...") may arrive in any order and are joined exactly, then
+        verified against the checksum. Legacy chunks without a header are joined with spaces in arrival
+        order, as before. Compressed messages are decoded once complete, never past `max_message_bytes`.
+        Partial messages expire after `ttl`; the oldest are evicted when the global
+        cap is reached, and a message over the per-user cap is rejected.
+
+        Args:
+            ttl (float): Seconds a partial message is kept without receiving a chunk. Defaults to 10 minutes.
+            max_user_bytes (int): Maximum buffered bytes per user. Defaults to 512 KiB.
+            max_total_bytes (int): Maximum buffered bytes overall. Defaults to 32 MiB.
+            max_chunks (int): Maximum number of chunks in one message. Defaults to 256.
+            max_message_bytes (int): Maximum size of a decompressed message. Defaults to 4 MiB.
+        """
+        self.ttl: float = ttl
+        self.max_user_bytes: int = max_user_bytes
+        self.max_total_bytes: int = max_total_bytes
+        self.max_chunks: int = max_chunks
+        self.max_message_bytes: int = max_message_bytes
+        self.total_bytes: int = 0
+        self.completed: int = 0
+        self.expired: int = 0
+        self.evicted: int = 0
+        self.rejected: int = 0
+        self._partials: "OrderedDict[Tuple[Hashable, str], _Partial]" = OrderedDict()
+        self._user_bytes: Dict[Hashable, int] = {}
+        # Messages already rejected, so their remaining chunks are ignored instead of each raising again
+        self._rejected: "OrderedDict[Tuple[Hashable, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_chunk(content: str) -> bool:
+        """
+        Checks whether a message is part of a chunked message.
+
+        Args:
+            content (str): The message content.
+
+        Returns:
+            bool: True if the message starts with one of the protocol markers.
+        """
+        return content.startswith(MARKERS)
+
+    def add(self, user_id: Hashable, content: str) -> Optional[str]:
+        """
+        Adds a chunk and returns the whole message once its last chunk has arrived.
+
+        Args:
+            user_id (Hashable): The sender; each sender's messages are reassembled separately.
+            content (str): The chunk, including its marker.
+
+        Returns:
+            Optional[str]: The complete message, or None if chunks are still missing.
+
+        Raises:
+            ReassemblyError: If the message is too large, its headers disagree or its checksum doesn't match.
+        """
+        marker = next((marker for marker in MARKERS if content.startswith(marker)), None)
+        if marker is None:
+            return None
+        body = content[len(marker):]
+        header = HEADER_PATTERN.match(body)
+
+        with self._lock:
+            self._expire(time.monotonic())
+            if header is None:
+                return self._add_legacy(user_id, marker, body)
+            index, total, expected = int(header.group(1)), int(header.group(2)), header.group(3)
+            message = self._add_sequenced(user_id, index, total, expected, body[header.end():])
+            if message is None:
+                return None
+            key = (user_id, expected)
+            if header.group(4):
+                try:
+                    message = self._decompress(message)
+                except (ValueError, zlib.error, UnicodeDecodeError) as e:
+                    raise self._reject(key, f"Can't decode the compressed message: {e}", ignore_rest=False)
+            if checksum(message) != expected:
+                raise self._reject(
+                    key, "The reassembled message doesn't match its checksum; please resend it", ignore_rest=False
+                )
+            self.completed += 1
+            return message
+
+    def _add_legacy(self, user_id: Hashable, marker: str, body: str) -> Optional[str]:
+        key = (user_id, LEGACY_ID)
+        if marker == START:
+            self._drop(key)
+            if body.rstrip().endswith(END):  # The whole message in one chunk
+                self.completed += 1
+                return body.rstrip()[:-len(END)].strip()
+            partial = self._partials[key] = _Partial(None, None)
+        else:
+            partial = self._partials.get(key)
+            if partial is None:
+                return None  # The start of this message was never seen or has expired
+        self._store(key, partial, len(partial.parts), body.strip())
+        if marker != END:
+            return None
+        self._drop(key)
+        self.completed += 1
+        return " ".join(partial.parts[i] for i in range(len(partial.parts)))
+
+    def _add_sequenced(self, user_id: Hashable, index: int, total: int, expected: str, body: str) -> Optional[str]:
+        if not 1 <= index <= total or total > self.max_chunks:
+            self.rejected += 1
+            raise ReassemblyError(f"Invalid chunk header {index}/{total}")
+        key = (user_id, expected)
+        if key in self._rejected:
+            return None
+        partial = self._partials.get(key)
+        if partial is None:
+            partial = self._partials[key] = _Partial(total, expected)
+        elif partial.total != total:
+            raise self._reject(key, f"Chunk {index} says {total} chunks, earlier ones said {partial.total}")
+        self._store(key, partial, index, body)
+        if len(partial.parts) < total:
+            return None
+
+        self._drop(key)
+        return "".join(partial.parts[i] for i in range(1, total + 1))
+
+    def _decompress(self, envelope: str) -> str:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)  # gzip container
+        data = decompressor.decompress(base64.b64decode(envelope, validate=True), self.max_message_bytes)
+        if decompressor.unconsumed_tail:
+            raise ValueError(f"message over {self.max_message_bytes} bytes once decompressed")
+        return data.decode("utf-8")
+
+    def _store(self, key: Tuple[Hashable, str], partial: _Partial, index: int, text: str) -> None:
+        size = len(text.encode("utf-8")) - len(partial.parts.get(index, "").encode("utf-8"))
+        user_id = key[0]
+        if self._user_bytes.get(user_id, 0) + size > self.max_user_bytes:
+            raise self._reject(key, f"Chunked message over {self.max_user_bytes} bytes")
+        partial.parts[index] = text
+        partial.size += size
+        partial.updated = time.monotonic()
+        self._user_bytes[user_id] = self._user_bytes.get(user_id, 0) + size
+        self.total_bytes += size
+        self._partials.move_to_end(key)
+        while self.total_bytes > self.max_total_bytes and len(self._partials) > 1:
+            self._drop(next(iter(self._partials)))
+            self.evicted += 1
+
+    def _reject(self, key: Tuple[Hashable, str], reason: str, ignore_rest: bool = True) -> ReassemblyError:
+        self._drop(key)
+        self.rejected += 1
+        if ignore_rest and key[1] != LEGACY_ID:
+            self._rejected[key] = time.monotonic()
+            while len(self._rejected) > 1024:
+                self._rejected.popitem(last=False)
+        return ReassemblyError(reason)
+
+    def _drop(self, key: Tuple[Hashable, str]) -> None:
+        partial = self._partials.pop(key, None)
+        if partial is None:
+            return
+        self.total_bytes -= partial.size
+        remaining = self._user_bytes.pop(key[0], 0) - partial.size
+        if remaining > 0:
+            self._user_bytes[key[0]] = remaining
+
+    def _expire(self, now: float) -> None:
+        while self._partials:
+            key, partial = next(iter(self._partials.items()))
+            if now - partial.updated < self.ttl:
+                break
+            self._drop(key)
+            self.expired += 1
+        while self._rejected and now - next(iter(self._rejected.values())) >= self.ttl:
+            self._rejected.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the buffered partial messages and reassembly counters.
+
+        Returns:
+            Dict[str, int]: Partial messages, buffered bytes and completed/expired/evicted/rejected counts.
+        """
+        with self._lock:
+            return {
+                "partials": len(self._partials),
+                "bytes": self.total_bytes,
+                "completed": self.completed,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "rejected": self.rejected,
+            }
+
+
+class SharedChunkReassembler(ChunkReassembler):
+    def __init__(self, backend: SharedBackend, prefix: str = "chunks", **kwargs: Any) -> None:
+        """
+        A ChunkReassembler whose partial messages live in a SharedBackend, so the chunks of one message
+        can be handled by different processes, and survive restarts until they expire.
+
+        Each chunk is added under a backend lock for its sender: the sender's partial messages are read
+        from the backend, the chunk is added as usual, and the result is written back with `ttl` as its
+        expiry. Nothing stays in local memory between chunks, so `max_total_bytes` only bounds one call.
+
+        Args:
+            backend (SharedBackend): The shared storage.
+            prefix (str): Prefix of the backend keys. Defaults to "chunks".
+            **kwargs (Any): The ChunkReassembler limits.
+        """
+        super().__init__(**kwargs)
+        self.backend = backend
+        self.prefix = prefix
+
+    def add(self, user_id: Hashable, content: str) -> Optional[str]:
+        if not self.is_chunk(content):
+            return None
+        name = f"{self.prefix}:{user_id}"
+        with self.backend.lock(f"{name}:lock"):
+            self._restore(user_id, self.backend.get(name))
+            try:
+                return super().add(user_id, content)
+            finally:
+                self._persist(user_id, name)
+
+    def _restore(self, user_id: Hashable, saved: Optional[str]) -> None:
+        if saved is None:
+            return
+        state = json.loads(saved)
+        now = time.monotonic()
+        with self._lock:
+            for message_id, fields in state["partials"].items():
+                partial = _Partial(fields["total"], fields["expected"])
+                partial.parts = {int(index): text for index, text in fields["parts"].items()}
+                partial.size = fields["size"]
+                self._partials[(user_id, message_id)] = partial
+                self._user_bytes[user_id] = self._user_bytes.get(user_id, 0) + partial.size
+                self.total_bytes += partial.size
+            for message_id in state["rejected"]:
+                self._rejected[(user_id, message_id)] = now
+
+    def _persist(self, user_id: Hashable, name: str) -> None:
+        with self._lock:
+            partials = {key[1]: partial for key, partial in self._partials.items() if key[0] == user_id}
+            rejected = [key[1] for key in self._rejected if key[0] == user_id]
+            for message_id in partials:
+                self._drop((user_id, message_id))
+            for message_id in rejected:
+                del self._rejected[(user_id, message_id)]
+        if not partials and not rejected:
+            self.backend.delete(name)
+            return
+        state = {
+            "partials": {
+                message_id: {"total": partial.total, "expected": partial.expected, "parts": partial.parts,
+                             "size": partial.size}
+                for message_id, partial in partials.items()
+            },
+            "rejected": rejected,
+        }
+        self.backend.set(name, json.dumps(state), ttl=self.ttl)
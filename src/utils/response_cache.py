@@ -0,0 +1,189 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from src.state.shared_backend import SharedBackend
+from src.utils.metrics import CACHE_LOOKUP_LATENCY, CACHE_LOOKUPS
+from src.utils.semantic_cache import SemanticCache
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl: Optional[float] = 3600,
+        disk_path: Optional[Path] = None,
+        shared: Optional[SharedBackend] = None,
+        semantic: Optional[SemanticCache] = None
+    ) -> None:
+        """
+        Caches model replies keyed on a hash of the full request: model ID, system prompt,
+        inference configuration and the (already trimmed) conversation context.
+
+        Lookups hit an in-memory LRU first and fall back to an optional SQLite tier that survives restarts,
+        then to an optional shared tier that every bot process reads and writes, and finally to an optional
+        semantic tier that matches reworded questions.
+
+        Args:
+            max_entries (int): Maximum number of replies kept in memory. Defaults to 512.
+            ttl (Optional[float]): Seconds a reply stays valid. None keeps replies until evicted.
+            disk_path (Optional[Path]): SQLite file for the persistent tier. Disabled if omitted.
+            shared (Optional[SharedBackend]): Backend of the shared tier. Disabled if omitted.
+            semantic (Optional[SemanticCache]): The semantic tier. Disabled if omitted.
+        """
+        self.max_entries: int = max_entries
+        self.ttl: Optional[float] = ttl
+        self.hits: int = 0
+        self.misses: int = 0
+        self.semantic_hits: int = 0
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk: Optional[sqlite3.Connection] = None
+        self._shared: Optional[SharedBackend] = shared
+        self.semantic: Optional[SemanticCache] = semantic
+        if disk_path is not None:
+            Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+            self._disk = sqlite3.connect(str(disk_path), check_same_thread=False, isolation_level=None)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, reply TEXT, expires_at REAL)"
+            )
+
+    @staticmethod
+    def make_key(request: Dict[str, Any]) -> str:
+        """
+        Hashes a request into a cache key.
+
+        Args:
+            request (Dict[str, Any]): The JSON-serializable request parameters.
+
+        Returns:
+            str: The hex SHA-256 digest of the canonical JSON encoding.
+        """
+        encoded = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def _expiry(self) -> float:
+        return time.time() + self.ttl if self.ttl is not None else float("inf")
+
+    def get(self, request: Dict[str, Any], approximate: bool = True) -> Optional[str]:
+        """
+        Looks up the reply to a request.
+
+        Args:
+            request (Dict[str, Any]): The request parameters.
+            approximate (bool): Also accept the reply to a similar question from the semantic tier.
+                Defaults to True.
+
+        Returns:
+            Optional[str]: The cached reply, or None on a miss.
+        """
+        started = time.perf_counter()
+        reply = self._get_exact(self.make_key(request))
+        CACHE_LOOKUP_LATENCY.observe(time.perf_counter() - started, tier="exact")
+        if reply is not None:
+            return reply
+
+        # Embedding the question takes longer than the exact lookups, so it runs outside the lock
+        reply = self.semantic.get(request) if self.semantic is not None and approximate else None
+        with self._lock:
+            if reply is not None:
+                self.hits += 1
+                self.semantic_hits += 1
+                CACHE_LOOKUPS.inc(result="semantic_hit")
+                return reply
+            self.misses += 1
+            CACHE_LOOKUPS.inc(result="miss")
+            return None
+
+    def _get_exact(self, key: str) -> Optional[str]:
+        # The memory, disk and shared tiers, in that order; counts hits but leaves misses to `get`
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > now:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                CACHE_LOOKUPS.inc(result="hit")
+                return entry[1]
+            self._memory.pop(key, None)
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT reply, expires_at FROM responses WHERE key=?", (key,)
+                ).fetchone()
+                if row is not None and (row[1] is None or row[1] > now):
+                    self._remember(key, row[0], row[1] if row[1] is not None else float("inf"))
+                    self.hits += 1
+                    CACHE_LOOKUPS.inc(result="hit")
+                    return row[0]
+                if row is not None:
+                    self._disk.execute("DELETE FROM responses WHERE key=?", (key,))
+
+        if self._shared is None:
+            return None
+        # A network round trip, so it runs outside the lock
+        entry = self._shared.get(f"response_cache:{key}")
+        if entry is None:
+            return None
+        reply, expires_at = json.loads(entry)
+        with self._lock:
+            self._remember(key, reply, expires_at if expires_at is not None else float("inf"))
+            self.hits += 1
+            CACHE_LOOKUPS.inc(result="hit")
+        return reply
+
+    def put(self, request: Dict[str, Any], reply: str) -> None:
+        """
+        Stores the reply to a request in every tier.
+
+        Args:
+            request (Dict[str, Any]): The request parameters.
+            reply (str): The model's reply.
+        """
+        key = self.make_key(request)
+        expires_at = self._expiry()
+        with self._lock:
+            self._remember(key, reply, expires_at)
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                    (key, reply, None if expires_at == float("inf") else expires_at),
+                )
+        if self._shared is not None:
+            # The backend expires the entry; its expiry travels along for the other processes' memory tier
+            stored_expiry = None if expires_at == float("inf") else expires_at
+            self._shared.set(f"response_cache:{key}", json.dumps([reply, stored_expiry]), ttl=self.ttl)
+        if self.semantic is not None:
+            self.semantic.put(request, reply)
+
+    def _remember(self, key: str, reply: str, expires_at: float) -> None:
+        self._memory[key] = (expires_at, reply)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns hit/miss counters for the cache.
+
+        Returns:
+            Dict[str, float]: Hits (of which semantic), misses, hit rate and the number of in-memory entries.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            stats = {
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._memory),
+            }
+        if self.semantic is not None:
+            stats["semantic_entries"] = self.semantic.stats()["entries"]
+        return stats
@@ -0,0 +1,296 @@
+import asyncio
+import random
+import time
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional, TypeVar
+
+from src.utils.metrics import MODEL_LATENCY, SCHEDULER_REJECTIONS, SCHEDULER_RETRIES
+
+T = TypeVar("T")
+
+# Provider error codes that mean "slow down" rather than "this request is wrong"
+THROTTLING_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "rate_limit_exceeded",
+}
+THROTTLING_STATUS = {429, 503}
+
+
+class SchedulerBusyError(Exception):
+    """Raised when a model's queue is full and the request is rejected instead of waiting."""
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """
+    Checks whether an exception from boto3 or openai is a throttling/overload error worth retrying.
+
+    Args:
+        error (Exception): The exception raised by a model call.
+
+    Returns:
+        bool: True if the call should be retried after a backoff.
+    """
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):  # botocore ClientError
+        if response.get("Error", {}).get("Code") in THROTTLING_CODES:
+            return True
+    if getattr(error, "status_code", None) in THROTTLING_STATUS:  # openai APIStatusError
+        return True
+    return getattr(error, "code", None) in THROTTLING_CODES
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: Optional[float] = None) -> None:
+        """
+        An asyncio token bucket refilled continuously at a per-minute rate.
+
+        Args:
+            per_minute (float): Tokens added per minute.
+            capacity (Optional[float]): Maximum burst size. Defaults to one minute's worth.
+        """
+        self.rate: float = per_minute / 60
+        self.capacity: float = capacity or per_minute
+        self.tokens: float = self.capacity
+        self.updated: float = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1) -> None:
+        """
+        Waits until `amount` tokens are available and takes them.
+
+        Args:
+            amount (float): Tokens to take; capped at the bucket capacity.
+        """
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class ModelScheduler:
+    def __init__(
+        self,
+        model_id: str,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        max_in_flight: int = 8,
+        max_queue: int = 32,
+        max_retries: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 20.0
+    ) -> None:
+        """
+        Admission control for one model: a bounded queue, an in-flight cap, RPM/TPM token buckets and
+        retries of throttling errors with exponential backoff and full jitter.
+
+        Args:
+            model_id (str): The model this scheduler guards.
+            rpm (Optional[float]): Requests per minute. Unlimited if omitted.
+            tpm (Optional[float]): Estimated prompt tokens per minute. Unlimited if omitted.
+            max_in_flight (int): Maximum concurrent upstream requests. Defaults to 8.
+            max_queue (int): Maximum requests waiting for a slot before new ones are rejected. Defaults to 32.
+            max_retries (int): Retries of throttling errors per request. Defaults to 4.
+            base_delay (float): Backoff base in seconds. Defaults to 1.0.
+            max_delay (float): Backoff ceiling in seconds. Defaults to 20.0.
+        """
+        self.model_id: str = model_id
+        self.max_in_flight: int = max_in_flight
+        self.max_queue: int = max_queue
+        self.max_retries: int = max_retries
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+        self.queue_depth: int = 0
+        self.in_flight: int = 0
+        self.rejected: int = 0
+        self.retries: int = 0
+        self.completed: int = 0
+        self.total_wait: float = 0.0
+        self.max_wait: float = 0.0
+
+    def _admit(self) -> float:
+        if self.queue_depth >= self.max_queue:
+            self.rejected += 1
+            SCHEDULER_REJECTIONS.inc(model=self.model_id)
+            raise SchedulerBusyError(f"'{self.model_id}' has {self.queue_depth} requests queued")
+        self.queue_depth += 1
+        return time.monotonic()
+
+    def _started(self, enqueued_at: float) -> None:
+        self.queue_depth -= 1
+        self.in_flight += 1
+        wait = time.monotonic() - enqueued_at
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        MODEL_LATENCY.observe(wait, model=self.model_id, phase="queue")
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Returns the sleep before retry number `attempt` (0-based), using full jitter.
+
+        Args:
+            attempt (int): How many attempts have failed so far, minus one.
+
+        Returns:
+            float: Seconds to wait.
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def _throttle(self, tokens: int) -> None:
+        if self.requests is not None:
+            await self.requests.acquire()
+        if self.tokens is not None and tokens:
+            await self.tokens.acquire(tokens)
+
+    async def run(self, call: Callable[[], Awaitable[T]], tokens: int = 0) -> T:
+        """
+        Runs a model call once a slot and rate budget are available, retrying throttling errors.
+
+        Args:
+            call (Callable[[], Awaitable[T]]): Starts the upstream call; invoked again for each retry.
+            tokens (int): Estimated prompt tokens, charged against the TPM bucket.
+
+        Returns:
+            T: The call's result.
+        """
+        enqueued_at = self._admit()
+        started = False
+        try:
+            async with self._slots:
+                self._started(enqueued_at)
+                started = True
+                for attempt in range(self.max_retries + 1):
+                    await self._throttle(tokens)
+                    try:
+                        return await call()
+                    except Exception as e:
+                        if attempt == self.max_retries or not is_throttling_error(e):
+                            raise
+                        self.retries += 1
+                        SCHEDULER_RETRIES.inc(model=self.model_id)
+                        await asyncio.sleep(self.backoff(attempt))
+        finally:
+            if started:
+                self.in_flight -= 1
+                self.completed += 1
+            else:
+                self.queue_depth -= 1
+
+    async def stream(self, call: Callable[[], AsyncIterator[str]], tokens: int = 0) -> AsyncIterator[str]:
+        """
+        Streaming counterpart of `run`. The slot is held until the stream ends, and throttling errors
+        are only retried before the first delta has been delivered.
+
+        Args:
+            call (Callable[[], AsyncIterator[str]]): Starts the upstream stream; invoked again for each retry.
+            tokens (int): Estimated prompt tokens, charged against the TPM bucket.
+
+        Yields:
+            str: The stream's text deltas.
+        """
+        enqueued_at = self._admit()
+        started = False
+        try:
+            async with self._slots:
+                self._started(enqueued_at)
+                started = True
+                for attempt in range(self.max_retries + 1):
+                    await self._throttle(tokens)
+                    delivered = False
+                    try:
+                        async with aclosing(call()) as stream:
+                            async for delta in stream:
+                                delivered = True
+                                yield delta
+                        return
+                    except Exception as e:
+                        if delivered or attempt == self.max_retries or not is_throttling_error(e):
+                            raise
+                        self.retries += 1
+                        SCHEDULER_RETRIES.inc(model=self.model_id)
+                        await asyncio.sleep(self.backoff(attempt))
+        finally:
+            if started:
+                self.in_flight -= 1
+                self.completed += 1
+            else:
+                self.queue_depth -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns queueing metrics for this model.
+
+        Returns:
+            Dict[str, Any]: Queue depth, in-flight requests, wait times and rejection/retry counters.
+        """
+        return {
+            "model": self.model_id,
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "retries": self.retries,
+            "mean_wait": self.total_wait / self.completed if self.completed else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+
+class Scheduler:
+    def __init__(self, model_config: Dict[str, dict]) -> None:
+        """
+        Holds one ModelScheduler per model, built lazily from each entry's "limits" configuration.
+
+        Args:
+            model_config (Dict[str, dict]): The MODEL_CONFIG mapping.
+        """
+        self.model_config = model_config
+        self._schedulers: Dict[str, ModelScheduler] = {}
+
+    def for_model(self, model_key: str) -> ModelScheduler:
+        """
+        Returns the scheduler of a model.
+
+        Args:
+            model_key (str): The model's key in MODEL_CONFIG.
+
+        Returns:
+            ModelScheduler: The model's scheduler.
+        """
+        if model_key not in self._schedulers:
+            config = self.model_config[model_key]
+            self._schedulers[model_key] = ModelScheduler(config.get("model", model_key), **config.get("limits", {}))
+        return self._schedulers[model_key]
+
+    def reconfigure(self, model_config: Dict[str, dict], model_keys: Iterable[str]) -> None:
+        """
+        Switches to a new MODEL_CONFIG. The given models get new schedulers, with their new limits,
+        on their next request; requests already admitted finish under the old ones.
+
+        Args:
+            model_config (Dict[str, dict]): The new MODEL_CONFIG mapping.
+            model_keys (Iterable[str]): The models whose configuration changed or was removed.
+        """
+        self.model_config = model_config
+        for model_key in model_keys:
+            self._schedulers.pop(model_key, None)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the queueing metrics of every model that has received requests.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Metrics keyed by model key.
+        """
+        return {model_key: scheduler.stats() for model_key, scheduler in self._schedulers.items()}
@@ -0,0 +1,337 @@
+import hashlib
+import json
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.state.history import message_text
+from src.utils.metrics import CACHE_LOOKUP_LATENCY
+
+# Which earlier messages must match exactly for a near-duplicate question to reuse a reply: "conversation"
+# (all of them, so follow-ups like "explain that again" never match across conversations) or "prompt" (only
+# the model's system prompt, for channels of standalone questions)
+SCOPES = ("conversation", "prompt")
+
+# Turns a prompt into an L2-normalized float32 vector
+Embedder = Callable[[str], Any]
+
+_WORD = re.compile(r"[a-z0-9_]+")
+# Frequent in every question, so they would make unrelated questions look alike
+STOP_WORDS = frozenset(
+    "a an and are as at be can could do does for from how i in is it me my of on or please should so that the "
+    "this to what when where which who why will with would you your".split()
+)
+# Flip a question's meaning while barely moving its embedding, as do numbers; contractions like "isn't" count too
+NEGATIONS = frozenset("not no never none nobody nothing neither nor without cannot".split())
+_EXACT_TOKEN = re.compile(r"\d+(?:[.,]\d+)*|[a-z]+(?:['’]t)?")
+
+
+def exact_terms(text: str) -> Tuple[str, ...]:
+    """
+    Returns the parts of a question that must match exactly for another question to reuse its reply:
+    how many negations it has, then its numbers in order.
+
+    Args:
+        text (str): The question.
+
+    Returns:
+        Tuple[str, ...]: The negation count followed by the numbers, e.g. ("1", "15", "200").
+    """
+    negations = 0
+    numbers: List[str] = []
+    for token in _EXACT_TOKEN.findall(text.lower()):
+        if token[0].isdigit():
+            numbers.append(token)
+        elif token in NEGATIONS or token.endswith(("n't", "n’t")):
+            negations += 1
+    return (str(negations), *numbers)
+
+
+def _numpy() -> Any:
+    try:
+        import numpy
+    except ImportError:  # Only needed when a semantic cache is configured
+        raise RuntimeError("The semantic cache needs the numpy package (pip install numpy)")
+    return numpy
+
+
+class HashingVectorizer:
+    def __init__(self, dim: int = 512, char_ngrams: int = 3) -> None:
+        """
+        Embeds text without a model: words, word pairs and character n-grams are hashed into a fixed
+        number of signed buckets. Cheap enough to run on every message, and robust to rewording,
+        reordering and typos, though not to synonyms.
+
+        Args:
+            dim (int): Vector size; lookups scan every entry, so smaller is faster. Defaults to 512.
+            char_ngrams (int): Length of the character n-grams taken from each word; 0 disables them. Defaults to 3.
+        """
+        self.np = _numpy()
+        self.dim: int = dim
+        self.char_ngrams: int = char_ngrams
+
+    def features(self, text: str) -> Dict[str, float]:
+        """
+        Returns the weighted features of a text: words and word pairs weigh 1, character n-grams 0.5.
+        """
+        words = [word for word in _WORD.findall(text.lower()) if word not in STOP_WORDS]
+        features: Dict[str, float] = {}
+        for word in words:
+            features[word] = features.get(word, 0.0) + 1.0
+            if self.char_ngrams and len(word) > self.char_ngrams:
+                padded = f"<{word}>"
+                for i in range(len(padded) - self.char_ngrams + 1):
+                    gram = "#" + padded[i:i + self.char_ngrams]
+                    features[gram] = features.get(gram, 0.0) + 0.5
+        for pair in zip(words, words[1:]):
+            key = " ".join(pair)
+            features[key] = features.get(key, 0.0) + 1.0
+        return features
+
+    def __call__(self, text: str) -> Any:
+        features = self.features(text)
+        hashes = self.np.fromiter(
+            (zlib.crc32(feature.encode("utf-8")) for feature in features), dtype=self.np.uint32, count=len(features)
+        )
+        # Sublinear weights, so a repeated word doesn't dominate; the sign bit cancels collisions out on average
+        weights = 1.0 + self.np.log(self.np.fromiter(features.values(), dtype=self.np.float32, count=len(features)))
+        weights[hashes & 0x80000000 == 0] *= -1
+        vector = self.np.bincount(hashes % self.dim, weights, minlength=self.dim).astype(self.np.float32)
+        norm = self.np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+def build_embedder(name: str = "hashing") -> Embedder:
+    """
+    Returns the embedding function named in a semantic cache configuration.
+
+    Args:
+        name (str): "hashing" for HashingVectorizer, or a sentence-transformers model name
+            (e.g. "all-MiniLM-L6-v2") to run locally on the CPU. Defaults to "hashing".
+
+    Returns:
+        Embedder: The embedding function.
+
+    Raises:
+        RuntimeError: If a sentence-transformers model is named but the package isn't installed.
+    """
+    if name == "hashing":
+        return HashingVectorizer()
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:  # Only needed for model embeddings
+        raise RuntimeError(f"The {name!r} embedding needs the sentence-transformers package")
+    model = SentenceTransformer(name, device="cpu")
+    return lambda text: model.encode(text, normalize_embeddings=True).astype("float32")
+
+
+class VectorIndex:
+    def __init__(self) -> None:
+        """
+        Exact cosine search over normalized vectors, as one matrix-vector product. At the few thousand
+        entries a cache holds, this is as fast as an approximate index and never misses the best match.
+        """
+        self.np = _numpy()
+        self._vectors: Any = None
+        self._keys: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: str, vector: Any) -> None:
+        """
+        Adds or replaces the vector of a key.
+        """
+        row = self._rows.get(key)
+        if row is None:
+            row = len(self._keys)
+            if self._vectors is None:
+                self._vectors = self.np.zeros((16, len(vector)), dtype=self.np.float32)
+            elif row == len(self._vectors):
+                self._vectors = self.np.concatenate([self._vectors, self.np.zeros_like(self._vectors)])
+            self._keys.append(key)
+            self._rows[key] = row
+        self._vectors[row] = vector
+
+    def remove(self, key: str) -> None:
+        """
+        Removes a key by moving the last row into its place.
+        """
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        last = len(self._keys) - 1
+        if row != last:
+            moved = self._keys[last]
+            self._vectors[row] = self._vectors[last]
+            self._keys[row] = moved
+            self._rows[moved] = row
+        self._keys.pop()
+
+    def search(self, vector: Any) -> Optional[Tuple[str, float]]:
+        """
+        Finds the most similar vector.
+
+        Returns:
+            Optional[Tuple[str, float]]: Its key and cosine similarity, or None if the index is empty.
+        """
+        if not self._keys:
+            return None
+        scores = self._vectors[:len(self._keys)] @ vector
+        best = int(scores.argmax())
+        return self._keys[best], float(scores[best])
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        threshold: float = 0.9,
+        ttl: Optional[float] = 3600,
+        scope: str = "conversation",
+        embed: Optional[Embedder] = None
+    ) -> None:
+        """
+        Reuses the reply to an earlier question that is worded differently but close enough, which exact
+        request hashing misses. Only the last user message is compared; everything else in the request
+        (model, system prompt, inference settings and, depending on `scope`, earlier messages) must match,
+        and so must the question's negations and numbers (see `exact_terms`).
+
+        Entries are kept in memory only and evicted least recently used.
+
+        Args:
+            max_entries (int): Maximum number of replies kept. Defaults to 1024.
+            threshold (float): Minimum cosine similarity of a match, in (0, 1]. Defaults to 0.9.
+            ttl (Optional[float]): Seconds a reply stays valid. None keeps replies until evicted.
+            scope (str): One of SCOPES. Defaults to "conversation".
+            embed (Optional[Embedder]): The embedding function. Defaults to a HashingVectorizer.
+
+        Raises:
+            ValueError: If `scope` or `threshold` is invalid.
+        """
+        if scope not in SCOPES:
+            raise ValueError(f"scope must be one of {SCOPES}, got {scope!r}")
+        if not 0 < threshold <= 1:
+            raise ValueError(f"threshold must be in (0, 1], got {threshold}")
+        self.max_entries: int = max_entries
+        self.threshold: float = threshold
+        self.ttl: Optional[float] = ttl
+        self.scope: str = scope
+        self.embed: Embedder = embed or HashingVectorizer()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        # Entry key -> (scope key, reply, expires_at), in least recently used order
+        self._entries: "OrderedDict[str, Tuple[str, str, float]]" = OrderedDict()
+        self._indexes: Dict[str, VectorIndex] = {}
+        self._lock = threading.Lock()
+
+    def split(self, request: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        """
+        Splits a chat request into the part that must match exactly and the question compared by meaning.
+
+        Args:
+            request (Dict[str, Any]): Converse keyword arguments or chat completion parameters.
+
+        Returns:
+            Optional[Tuple[str, str]]: The scope key and the last user message's text, or None if the
+                request doesn't end with a user message.
+        """
+        messages = request.get("messages") or []
+        if not messages or messages[-1].get("role") != "user":
+            return None
+        earlier = messages[:-1]
+        if self.scope == "prompt":
+            # Keep OpenAI's leading system message, which holds the model's instructions
+            earlier = earlier[:1] if earlier and earlier[0].get("role") == "system" else []
+        question = message_text(messages[-1].get("content"))
+        scope = {
+            **{k: v for k, v in request.items() if k != "messages"},
+            "messages": earlier,
+            "exact_terms": exact_terms(question),
+        }
+        encoded = json.dumps(scope, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest(), question
+
+    def get(self, request: Dict[str, Any]) -> Optional[str]:
+        """
+        Looks up the reply to the closest earlier question.
+
+        Args:
+            request (Dict[str, Any]): The request parameters.
+
+        Returns:
+            Optional[str]: The cached reply, or None if no question is similar enough.
+        """
+        started = time.perf_counter()
+        split = self.split(request)
+        vector = self.embed(split[1]) if split is not None else None
+        reply = None
+        with self._lock:
+            index = self._indexes.get(split[0]) if split is not None else None
+            match = index.search(vector) if index is not None else None
+            if match is not None and match[1] >= self.threshold:
+                _, cached, expires_at = self._entries[match[0]]
+                if expires_at > time.time():
+                    self._entries.move_to_end(match[0])
+                    reply = cached
+                else:
+                    self._remove(match[0])
+            if reply is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        CACHE_LOOKUP_LATENCY.observe(time.perf_counter() - started, tier="semantic")
+        return reply
+
+    def put(self, request: Dict[str, Any], reply: str) -> None:
+        """
+        Stores the reply to a request, evicting the least recently used replies beyond `max_entries`.
+
+        Args:
+            request (Dict[str, Any]): The request parameters.
+            reply (str): The model's reply.
+        """
+        split = self.split(request)
+        if split is None or not split[1].strip():
+            return
+        scope_key, prompt = split
+        vector = self.embed(prompt)
+        key = hashlib.sha256(f"{scope_key}\n{prompt}".encode("utf-8")).hexdigest()
+        expires_at = time.time() + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            self._entries[key] = (scope_key, reply, expires_at)
+            self._entries.move_to_end(key)
+            self._indexes.setdefault(scope_key, VectorIndex()).add(key, vector)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        scope_key, _, _ = self._entries.pop(key)
+        index = self._indexes[scope_key]
+        index.remove(key)
+        if not len(index):
+            del self._indexes[scope_key]
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns hit/miss counters for the cache.
+
+        Returns:
+            Dict[str, float]: Hits, misses, hit rate, evictions, and the number of entries and scopes.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "scopes": len(self._indexes),
+            }
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Hashable, Iterable, Tuple
+
+from src.state.conversation_store import ConversationKey
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+
+def _in_turn(session: Any) -> bool:
+    lock = getattr(session, "turn_lock", None)
+    return lock is not None and lock.locked()
+
+
+@asynccontextmanager
+async def hold_turns(sessions: Iterable[Any]) -> AsyncIterator[None]:
+    """
+    Holds the `turn_lock` of sessions for one turn, e.g. of every model of a fan-out route.
+
+    The locks are taken in conversation key order, so handlers locking overlapping sessions can't deadlock.
+
+    Args:
+        sessions (Iterable[Any]): The sessions the turn uses.
+    """
+    async with AsyncExitStack() as stack:
+        for session in sorted(sessions, key=lambda session: session.conversation_key):
+            await stack.enter_async_context(session.turn_lock)
+        yield
+
+
+class SessionManager:
+    def __init__(self, max_sessions: int = 1000, idle_timeout: float = 30 * 60) -> None:
+        """
+        Holds one model session per conversation in a bounded LRU with an idle timeout.
+
+        A session is a model instance bound to a single conversation key (see `for_conversation`), so
+        each prompt only carries that conversation's context. Sessions persist every turn to the
+        conversation store; evicting one only drops it from memory, and it is reloaded from the store
+        the next time the conversation is active. With a shared store, a session is checked against
+        the store each time it is handed out, so processes serving the same conversation don't diverge.
+
+        The same session is handed to every handler of its conversation, e.g. all users of a thread or
+        one user's quick successive messages. Handlers hold its `turn_lock` around a turn (see
+        `hold_turns`), so turns run one after another and replies are posted in order. Sessions in the
+        middle of a turn are not evicted.
+
+        Args:
+            max_sessions (int): Maximum number of sessions kept in memory. Defaults to 1000.
+            idle_timeout (float): Seconds of inactivity after which a session is evicted. Defaults to 30 minutes.
+        """
+        self.max_sessions: int = max_sessions
+        self.idle_timeout: float = idle_timeout
+        self.evictions: int = 0
+        self._sessions: "OrderedDict[Tuple[Hashable, ...], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model_key: str, model: Any, conversation_key: ConversationKey) -> Any:
+        """
+        Returns the session of a conversation, creating or reloading it if needed.
+
+        Args:
+            model_key (str): The model's key in MODEL_CONFIG.
+            model (Any): The model that new sessions are derived from.
+            conversation_key (ConversationKey): The (platform, channel, user/thread) of the conversation.
+
+        Returns:
+            Any: The model instance bound to the conversation.
+        """
+        key = (model_key, *conversation_key)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._sessions.get(key)
+            session = entry[1] if entry is not None else model.for_conversation(conversation_key)
+            self._sessions[key] = (now, session)
+            self._sessions.move_to_end(key)
+            if len(self._sessions) > self.max_sessions:
+                idle = [k for k, (_, s) in self._sessions.items() if k != key and not _in_turn(s)]
+                for evicted in idle[:len(self._sessions) - self.max_sessions]:
+                    self._evict(evicted)
+        if entry is not None and session.store.shared:
+            session.sync()  # Another process may have answered in this conversation since
+        return session
+
+    def _evict_idle(self, now: float) -> None:
+        for key, (last_used, session) in list(self._sessions.items()):
+            if now - last_used < self.idle_timeout:
+                break
+            if not _in_turn(session):
+                self._evict(key)
+
+    def _evict(self, key: Tuple[Hashable, ...]) -> None:
+        _, session = self._sessions.pop(key)
+        self.evictions += 1
+        try:
+            # Flush anything not yet persisted before dropping it from memory, except the prompt of a request
+            # still in flight: the request saves it with its reply, or rolls it back if it fails
+            session.save_state(completed_only=True)
+        except Exception as e:
+            logger.warning("session_persist_failed", extra={"fields": {"session": list(key), "reason": str(e)}})
+
+    def drop_model(self, model_key: str) -> None:
+        """
+        Evicts every session of a model, e.g. after its configuration changed.
+
+        Args:
+            model_key (str): The model's key in MODEL_CONFIG.
+        """
+        with self._lock:
+            for key in [key for key in self._sessions if key[0] == model_key]:
+                self._evict(key)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the number of live sessions and evictions so far.
+
+        Returns:
+            Dict[str, int]: Session counters.
+        """
+        with self._lock:
+            return {"sessions": len(self._sessions), "evictions": self.evictions}
@@ -0,0 +1,225 @@
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class _Flight:
+    """Result slot of one in-flight call, shared by every caller with the same key."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _Broadcast:
+    """Deltas of one in-flight stream, replayed to callers that join late."""
+
+    def __init__(self, condition: Any) -> None:
+        self.condition = condition
+        self.parts: List[str] = []
+        self.finished: bool = False
+        self.error: Optional[BaseException] = None
+        self.listeners: int = 0
+        self.task: Optional[asyncio.Future] = None
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        """
+        Deduplicates concurrent upstream calls with the same key.
+
+        The first caller for a key runs the call; callers arriving while it is in flight wait for
+        and share its result (or exception) instead of issuing their own request. Nothing is kept once
+        the call completes. Blocking (`do`, `stream`) and asyncio (`ado`, `astream`) variants keep
+        separate in-flight tables.
+        """
+        self.shared: int = 0
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self._async_flights: Dict[str, asyncio.Future] = {}
+        self._async_streams: Dict[str, _Broadcast] = {}
+
+    def do(self, key: str, call: Callable[[], T]) -> T:
+        """
+        Runs a blocking call, or waits for the identical call already in flight in another thread.
+
+        Args:
+            key (str): Identifies identical calls.
+            call (Callable[[], T]): The upstream call.
+
+        Returns:
+            T: The call's result.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.shared += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = call()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stream(self, key: str, call: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """
+        Iterates a blocking stream, sharing it with identical streams started from other threads.
+
+        Args:
+            key (str): Identifies identical streams.
+            call (Callable[[], Iterator[str]]): Starts the upstream stream.
+
+        Yields:
+            str: The stream's deltas, from the beginning even when joining late.
+        """
+        with self._lock:
+            broadcast = self._streams.get(key)
+            leader = broadcast is None
+            if leader:
+                broadcast = self._streams[key] = _Broadcast(threading.Condition())
+            else:
+                self.shared += 1
+
+        if leader:
+            try:
+                for delta in call():
+                    with broadcast.condition:
+                        broadcast.parts.append(delta)
+                        broadcast.condition.notify_all()
+                    yield delta
+            except BaseException as e:
+                # Followers must not see a partial reply as complete if the leader stopped reading
+                broadcast.error = e if isinstance(e, Exception) else RuntimeError("The shared stream was abandoned")
+                raise
+            finally:
+                with self._lock:
+                    del self._streams[key]
+                with broadcast.condition:
+                    broadcast.finished = True
+                    broadcast.condition.notify_all()
+            return
+
+        index = 0
+        while True:
+            with broadcast.condition:
+                broadcast.condition.wait_for(lambda: len(broadcast.parts) > index or broadcast.finished)
+                new_parts = broadcast.parts[index:]
+                finished = broadcast.finished
+            yield from new_parts
+            index += len(new_parts)
+            if finished and index == len(broadcast.parts):
+                if broadcast.error is not None:
+                    raise broadcast.error
+                return
+
+    async def ado(self, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Awaits a call, or the identical call already in flight on the event loop.
+
+        Args:
+            key (str): Identifies identical calls.
+            call (Callable[[], Awaitable[T]]): Starts the upstream call.
+
+        Returns:
+            T: The call's result.
+        """
+        future = self._async_flights.get(key)
+        if future is not None:
+            self.shared += 1
+            return await asyncio.shield(future)
+
+        future = self._async_flights[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await call()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            # The leader's cancellation is its own; followers get an ordinary error to handle
+            future.set_exception(RuntimeError("The shared call was cancelled"))
+            future.exception()  # Mark as retrieved when nobody else was waiting
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Mark as retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._async_flights[key]
+
+    async def astream(self, key: str, call: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        Iterates an async stream, sharing it with identical streams started on the event loop.
+
+        The upstream stream is pumped by a separate task, so it completes for the remaining callers
+        even if the caller that started it stops reading. Once no caller is reading, it is cancelled.
+
+        Args:
+            key (str): Identifies identical streams.
+            call (Callable[[], AsyncIterator[str]]): Starts the upstream stream.
+
+        Yields:
+            str: The stream's deltas, from the beginning even when joining late.
+        """
+        broadcast = self._async_streams.get(key)
+        if broadcast is None:
+            broadcast = self._async_streams[key] = _Broadcast(asyncio.Condition())
+            broadcast.task = asyncio.ensure_future(self._pump(key, broadcast, call))
+        else:
+            self.shared += 1
+
+        broadcast.listeners += 1
+        index = 0
+        try:
+            while True:
+                async with broadcast.condition:
+                    await broadcast.condition.wait_for(lambda: len(broadcast.parts) > index or broadcast.finished)
+                    new_parts = broadcast.parts[index:]
+                    finished = broadcast.finished
+                for delta in new_parts:
+                    yield delta
+                index += len(new_parts)
+                if finished and index == len(broadcast.parts):
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+        finally:
+            broadcast.listeners -= 1
+            if not broadcast.listeners and not broadcast.finished:
+                broadcast.task.cancel()
+
+    async def _pump(self, key: str, broadcast: _Broadcast, call: Callable[[], AsyncIterator[str]]) -> None:
+        stream = call()
+        try:
+            async for delta in stream:
+                async with broadcast.condition:
+                    broadcast.parts.append(delta)
+                    broadcast.condition.notify_all()
+        except Exception as e:
+            broadcast.error = e
+        except asyncio.CancelledError:
+            # Late joiners must not see a partial reply as complete
+            broadcast.error = RuntimeError("The shared stream was abandoned")
+            raise
+        finally:
+            await stream.aclose()
+            del self._async_streams[key]
+            async with broadcast.condition:
+                broadcast.finished = True
+                broadcast.condition.notify_all()
@@ -0,0 +1,214 @@
+import time
+from typing import Any, Awaitable, Callable, List, Tuple
+
+from src.utils.chunking import MessageChunker
+from src.utils.metrics import CHUNK_SEND_LATENCY
+
+# Discord allows roughly five edits per five seconds per channel; Slack's chat.update is a Tier 3 method.
+DISCORD_EDIT_INTERVAL = 1.0
+SLACK_EDIT_INTERVAL = 1.2
+
+
+class ReplyBuffer:
+    def __init__(self, limit: int, measure: str = "chars") -> None:
+        """
+        Accumulates streamed text and splits it into platform-sized messages.
+
+        Args:
+            limit (int): The maximum size of a single message.
+            measure (str): "chars" or "bytes", depending on how the platform counts its limit. Defaults to "chars".
+        """
+        self.chunker = MessageChunker(limit, measure)
+        self.final: List[str] = []
+
+    @property
+    def tail(self) -> str:
+        """
+        Returns the message that is still growing.
+        """
+        return self.chunker.pending
+
+    @property
+    def messages(self) -> List[str]:
+        """
+        Returns every message so far; only the last one is still growing.
+        """
+        return self.final + [self.tail]
+
+    def feed(self, delta: str) -> None:
+        """
+        Appends a text delta, rolling over to a new message when the current one is full.
+
+        Messages are split as in `chunk_message`, so code blocks open at a rollover are closed and
+        reopened with their language.
+
+        Args:
+            delta (str): The text to append.
+        """
+        self.final.extend(self.chunker.feed(delta))
+
+    def close(self) -> None:
+        """
+        Completes the last message once the stream has ended, closing any open code block.
+        """
+        self.final.extend(self.chunker.close())
+
+
+class _ProgressiveReply:
+    def __init__(self, limit: int, min_interval: float, measure: str = "chars", platform: str = "discord") -> None:
+        """
+        Shared bookkeeping for replies that are posted once and then edited as text streams in.
+
+        Args:
+            limit (int): The maximum size of a single message.
+            min_interval (float): Minimum number of seconds between flushes, to respect platform rate limits.
+            measure (str): "chars" or "bytes", depending on how the platform counts its limit. Defaults to "chars".
+            platform (str): The platform label of the send/edit latency metrics. Defaults to "discord".
+        """
+        self.buffer = ReplyBuffer(limit, measure)
+        self.platform: str = platform
+        self.min_interval: float = min_interval
+        self.handles: List[Any] = []
+        self.posted: List[str] = []
+        self.last_flush: float = float("-inf")
+
+    def _due(self) -> bool:
+        return time.monotonic() - self.last_flush >= self.min_interval
+
+    def _pending(self) -> List[Tuple[int, str]]:
+        """
+        Returns the (index, text) pairs of messages that must be posted or edited.
+        """
+        messages = self.buffer.messages
+        if not messages[-1].strip():
+            messages.pop()  # Nothing to show yet for a message that has just been opened
+        return [
+            (i, text)
+            for i, text in enumerate(messages)
+            if i >= len(self.posted) or self.posted[i] != text
+        ]
+
+    def _mark_posted(self, index: int, text: str, handle: Any = None) -> None:
+        if index < len(self.posted):
+            self.posted[index] = text
+        else:
+            self.handles.append(handle)
+            self.posted.append(text)
+
+
+class AsyncProgressiveReply(_ProgressiveReply):
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[Any]],
+        edit: Callable[[Any, str], Awaitable[Any]],
+        limit: int = 1990,
+        min_interval: float = DISCORD_EDIT_INTERVAL,
+        measure: str = "chars",
+        platform: str = "discord"
+    ) -> None:
+        """
+        Streams a reply into a channel by posting a message and editing it as deltas arrive.
+
+        Args:
+            send (Callable[[str], Awaitable[Any]]): Posts a new message and returns a handle to it.
+            edit (Callable[[Any, str], Awaitable[Any]]): Replaces the content of a posted message.
+            limit (int): The maximum size of a single message. Defaults to 1990.
+            min_interval (float): Minimum number of seconds between edits.
+            measure (str): "chars" or "bytes", depending on how the platform counts its limit. Defaults to "chars".
+            platform (str): The platform label of the send/edit latency metrics. Defaults to "discord".
+        """
+        super().__init__(limit, min_interval, measure, platform)
+        self.send = send
+        self.edit = edit
+
+    async def feed(self, delta: str) -> None:
+        """
+        Adds a delta and flushes if the throttle interval has elapsed.
+
+        Args:
+            delta (str): The text to append.
+        """
+        self.buffer.feed(delta)
+        if self._due():
+            await self.flush()
+
+    async def flush(self) -> None:
+        """
+        Posts new messages and edits changed ones.
+        """
+        for index, text in self._pending():
+            if index < len(self.handles):
+                with CHUNK_SEND_LATENCY.time(platform=self.platform, operation="edit"):
+                    await self.edit(self.handles[index], text)
+                self._mark_posted(index, text)
+            else:
+                with CHUNK_SEND_LATENCY.time(platform=self.platform, operation="send"):
+                    handle = await self.send(text)
+                self._mark_posted(index, text, handle)
+        self.last_flush = time.monotonic()
+
+    async def finish(self) -> None:
+        """
+        Flushes any text still buffered after the stream ends.
+        """
+        self.buffer.close()
+        await self.flush()
+
+
+class ProgressiveReply(_ProgressiveReply):
+    def __init__(
+        self,
+        send: Callable[[str], Any],
+        edit: Callable[[Any, str], Any],
+        limit: int = 4000,
+        min_interval: float = SLACK_EDIT_INTERVAL,
+        measure: str = "bytes",
+        platform: str = "slack"
+    ) -> None:
+        """
+        Blocking counterpart of `AsyncProgressiveReply`, for synchronous handlers such as the Slack bot.
+
+        Args:
+            send (Callable[[str], Any]): Posts a new message and returns a handle to it.
+            edit (Callable[[Any, str], Any]): Replaces the content of a posted message.
+            limit (int): The maximum size of a single message. Defaults to 4000.
+            min_interval (float): Minimum number of seconds between edits.
+            measure (str): "chars" or "bytes", depending on how the platform counts its limit. Defaults to "bytes".
+            platform (str): The platform label of the send/edit latency metrics. Defaults to "slack".
+        """
+        super().__init__(limit, min_interval, measure, platform)
+        self.send = send
+        self.edit = edit
+
+    def feed(self, delta: str) -> None:
+        """
+        Adds a delta and flushes if the throttle interval has elapsed.
+
+        Args:
+            delta (str): The text to append.
+        """
+        self.buffer.feed(delta)
+        if self._due():
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Posts new messages and edits changed ones.
+        """
+        for index, text in self._pending():
+            if index < len(self.handles):
+                with CHUNK_SEND_LATENCY.time(platform=self.platform, operation="edit"):
+                    self.edit(self.handles[index], text)
+                self._mark_posted(index, text)
+            else:
+                with CHUNK_SEND_LATENCY.time(platform=self.platform, operation="send"):
+                    handle = self.send(text)
+                self._mark_posted(index, text, handle)
+        self.last_flush = time.monotonic()
+
+    def finish(self) -> None:
+        """
+        Flushes any text still buffered after the stream ends.
+        """
+        self.buffer.close()
+        self.flush()
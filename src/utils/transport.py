@@ -0,0 +1,294 @@
+import os
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+import httpx
+from botocore.config import Config
+
+# OpenAI: one connection pool per process, shared by every GPTCompletions and GPTAssistant, so concurrent
+# conversations reuse warm TLS connections instead of each model client opening its own
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", str(OPENAI_MAX_CONNECTIONS)))
+# httpx drops idle connections after 5s by default, which between chat turns means a new TLS handshake
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "120"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+# Bedrock: botocore pools 10 connections by default, fewer than the threads BEDROCK_EXECUTOR runs requests on
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", os.getenv("BEDROCK_MAX_WORKERS", "32")))
+BEDROCK_CONNECT_TIMEOUT = float(os.getenv("BEDROCK_CONNECT_TIMEOUT", "5"))
+BEDROCK_READ_TIMEOUT = float(os.getenv("BEDROCK_READ_TIMEOUT", "60"))
+# "adaptive" also rate-limits the client while Bedrock throttles it; the scheduler retries what still fails
+BEDROCK_RETRY_MODE = os.getenv("BEDROCK_RETRY_MODE", "adaptive")
+BEDROCK_MAX_ATTEMPTS = int(os.getenv("BEDROCK_MAX_ATTEMPTS", "3"))
+
+
+class PoolStats:
+    def __init__(self, max_connections: int) -> None:
+        """
+        Counts the requests and new connections of one HTTP connection pool.
+
+        Args:
+            max_connections (int): The pool's connection limit.
+        """
+        self.max_connections: int = max_connections
+        self.in_flight: int = 0
+        self.peak_in_flight: int = 0
+        self.requests: int = 0
+        self.connections_opened: int = 0
+        self.tls_handshakes: int = 0
+        self._lock = threading.Lock()
+
+    def started(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finished(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def event(self, name: str) -> None:
+        # httpcore trace events; a pool that keeps its connections alive rarely connects
+        with self._lock:
+            if name == "connection.connect_tcp.complete":
+                self.connections_opened += 1
+            elif name == "connection.start_tls.complete":
+                self.tls_handshakes += 1
+
+    def stats(self, pool: Any = None) -> Dict[str, Any]:
+        """
+        Returns the pool's counters, and its open connections if `pool` is an httpcore connection pool.
+
+        Returns:
+            Dict[str, Any]: Requests in flight (and their peak), totals and utilization of the limit.
+        """
+        stats = {
+            "max_connections": self.max_connections,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "tls_handshakes": self.tls_handshakes,
+            "utilization": self.in_flight / self.max_connections if self.max_connections else 0.0,
+        }
+        connections = getattr(pool, "connections", None)
+        if connections is not None:
+            stats["connections"] = len(connections)
+            stats["idle_connections"] = sum(1 for connection in connections if connection.is_idle())
+        return stats
+
+
+class _CountedStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, done: Callable[[], None]) -> None:
+        self._stream = stream
+        self._done: Optional[Callable[[], None]] = done
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            if self._done is not None:
+                self._done, done = None, self._done
+                done()
+
+
+class _AsyncCountedStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, done: Callable[[], None]) -> None:
+        self._stream = stream
+        self._done: Optional[Callable[[], None]] = done
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._done is not None:
+                self._done, done = None, self._done
+                done()
+
+
+class CountingTransport(httpx.HTTPTransport):
+    def __init__(self, stats: PoolStats, **kwargs: Any) -> None:
+        """
+        An httpx transport that records its pool's usage in `stats`. A request stays in flight until its
+        response is closed, so streamed completions count for as long as they hold their connection.
+        """
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.extensions["trace"] = lambda name, info: self.stats.event(name)
+        self.stats.started()
+        try:
+            response = super().handle_request(request)
+        except BaseException:
+            self.stats.finished()
+            raise
+        return httpx.Response(
+            response.status_code, headers=response.headers, extensions=response.extensions,
+            stream=_CountedStream(response.stream, self.stats.finished),
+        )
+
+
+class AsyncCountingTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, stats: PoolStats, **kwargs: Any) -> None:
+        """
+        Async counterpart of CountingTransport.
+        """
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        async def trace(name: str, info: Dict[str, Any]) -> None:
+            self.stats.event(name)
+
+        request.extensions["trace"] = trace
+        self.stats.started()
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            self.stats.finished()
+            raise
+        return httpx.Response(
+            response.status_code, headers=response.headers, extensions=response.extensions,
+            stream=_AsyncCountedStream(response.stream, self.stats.finished),
+        )
+
+
+_lock = threading.Lock()
+_openai_http_client: Optional[httpx.Client] = None
+_async_openai_http_client: Optional[httpx.AsyncClient] = None
+# Pool stats collectors by client name, read by `http_pool_stats`
+_POOLS: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def _openai_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+    )
+
+
+def _openai_timeout() -> httpx.Timeout:
+    return httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT)
+
+
+def register_pool(name: str, collect: Callable[[], Dict[str, Any]]) -> None:
+    """
+    Adds a connection pool to `http_pool_stats`.
+
+    Args:
+        name (str): The client's name, e.g. "bedrock".
+        collect (Callable[[], Dict[str, Any]]): Returns the pool's stats.
+    """
+    _POOLS[name] = collect
+
+
+def openai_client_options() -> Dict[str, Any]:
+    """
+    Returns the keyword arguments for `OpenAI(...)` that share the process-wide pooled HTTP client.
+
+    Returns:
+        Dict[str, Any]: The http_client, timeout and max_retries options.
+    """
+    global _openai_http_client
+    with _lock:
+        if _openai_http_client is None:
+            from openai import DefaultHttpxClient  # Keeps the SDK's own client defaults, e.g. redirects
+
+            stats = PoolStats(OPENAI_MAX_CONNECTIONS)
+            transport = CountingTransport(stats, limits=_openai_limits())
+            _openai_http_client = DefaultHttpxClient(transport=transport, timeout=_openai_timeout())
+            register_pool("openai", lambda: stats.stats(getattr(transport, "_pool", None)))
+    return {"http_client": _openai_http_client, "timeout": _openai_timeout(), "max_retries": OPENAI_MAX_RETRIES}
+
+
+def async_openai_client_options() -> Dict[str, Any]:
+    """
+    Returns the keyword arguments for `AsyncOpenAI(...)` that share the process-wide pooled HTTP client.
+
+    The async pool's connections belong to the event loop that opened them, so it serves the bots'
+    single loop; use separate clients when running several loops.
+
+    Returns:
+        Dict[str, Any]: The http_client, timeout and max_retries options.
+    """
+    global _async_openai_http_client
+    with _lock:
+        if _async_openai_http_client is None:
+            from openai import DefaultAsyncHttpxClient
+
+            stats = PoolStats(OPENAI_MAX_CONNECTIONS)
+            transport = AsyncCountingTransport(stats, limits=_openai_limits())
+            _async_openai_http_client = DefaultAsyncHttpxClient(transport=transport, timeout=_openai_timeout())
+            register_pool("openai_async", lambda: stats.stats(getattr(transport, "_pool", None)))
+    return {"http_client": _async_openai_http_client, "timeout": _openai_timeout(), "max_retries": OPENAI_MAX_RETRIES}
+
+
+def bedrock_client_config() -> Config:
+    """
+    Returns the botocore configuration of Bedrock clients: a pool as large as the request threads,
+    connect/read timeouts, TCP keep-alive and adaptive retries.
+
+    Returns:
+        Config: The client configuration.
+    """
+    return Config(
+        max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS,
+        connect_timeout=BEDROCK_CONNECT_TIMEOUT,
+        read_timeout=BEDROCK_READ_TIMEOUT,
+        retries={"mode": BEDROCK_RETRY_MODE, "max_attempts": BEDROCK_MAX_ATTEMPTS},
+        tcp_keepalive=True,
+    )
+
+
+def botocore_pool_stats(client: Any) -> Dict[str, Any]:
+    """
+    Reads the connection pool usage of a boto3 client from its urllib3 pools.
+
+    Args:
+        client (Any): A boto3 client.
+
+    Returns:
+        Dict[str, Any]: Connections in use, idle and opened, requests sent and utilization of the limit.
+    """
+    max_connections = client.meta.config.max_pool_connections
+    # botocore keeps its urllib3 PoolManager private; read it defensively
+    manager = getattr(getattr(getattr(client, "_endpoint", None), "http_session", None), "_manager", None)
+    pools = [manager.pools[key] for key in manager.pools.keys()] if manager is not None else []
+    in_use = idle = opened = requests = 0
+    for pool in pools:
+        # The queue holds idle connections plus None for each connection not opened yet
+        queued = list(pool.pool.queue) if pool.pool is not None else []
+        idle += sum(1 for connection in queued if connection is not None)
+        in_use += pool.pool.maxsize - len(queued) if pool.pool is not None else 0
+        opened += pool.num_connections
+        requests += pool.num_requests
+    return {
+        "max_connections": max_connections,
+        "in_use": in_use,
+        "idle_connections": idle,
+        "connections_opened": opened,
+        "requests": requests,
+        "utilization": in_use / max_connections if max_connections else 0.0,
+    }
+
+
+def http_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Returns the usage of every HTTP connection pool created so far.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Pool stats keyed by client name.
+    """
+    return {name: collect() for name, collect in list(_POOLS.items())}
@@ -1,6 +1,8 @@
 from pathlib import Path
 import sys
-from typing import Optional, List, Dict
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional, List, Dict
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(ROOT_DIR))
@@ -8,74 +10,253 @@ sys.path.append(str(ROOT_DIR))
 from model_config import MODEL_CONFIG, CHANNEL_CONFIG
 from src.chatgpt.chatgpt import GPTCompletions
 from src.bedrock.aws_bedrock_models import BedrockCompletions
+from src.state.conversation_store import GPT_STATE_DIR
+from src.state.shared_backend import get_shared_backend
+from src.utils.compaction import Compactor
+from src.utils.chunking import iter_chunks
+from src.utils.log import get_logger
+from src.utils.reassembly import ChunkReassembler
+from src.utils.response_cache import ResponseCache
+from src.utils.semantic_cache import SemanticCache, build_embedder
 
-def chunk_message(message: str, chunk_size: int = 1990) -> List[str]:
+logger = get_logger(__name__)
+
+# Shared by callers of handle_chunked_message that don't bring their own
+DEFAULT_REASSEMBLER = ChunkReassembler()
+
+# Fraction of a model's context_budget that unsummarized turns may take before they are compacted
+COMPACTION_TRIGGER_RATIO = 0.75
+
+# Models used to summarize conversations, keyed by their MODEL_CONFIG name and shared by every compactor
+SUMMARIZERS: Dict[str, "LazyModel"] = {}
+
+def chunk_message(message: str, chunk_size: int = 1990, measure: str = "chars") -> List[str]:
     """
-    Splits a message into chunks of a specified size and handles code blocks spanning across chunks.
+    Splits a message into chunks of a specified size on natural boundaries, closing and reopening
+    code blocks (with their language) that span across chunks.
 
     Args:
         message (str): The message to be split into chunks.
         chunk_size (int): The maximum size of each chunk. Defaults to 1990.
+        measure (str): "chars" to count characters (Discord), or "bytes" to count UTF-8 bytes (Slack). Defaults to "chars".
 
     Returns:
         List[str]: A list of message chunks.
     """
-    chunks: List[str] = []
-    open_code_block: bool = False  # Tracks if a code block is open
-    
-    for i in range(0, len(message), chunk_size):
-        chunk = message[i:i + chunk_size]
-        if open_code_block:
-            chunk = "\n```python\n" + chunk
-        backtick_count = chunk.count("```")
-        if backtick_count % 2 != 0:
-            chunk += "\n```"
-            open_code_block = True
-        else:
-            open_code_block = False
-        chunks.append(chunk)
-        
-    return chunks
-
-def handle_chunked_message(user_id: str, content: str, user_chunks: dict = None) -> Optional[str]:
+    return list(iter_chunks(message, chunk_size, measure))
+
+def handle_chunked_message(user_id: str, content: str, reassembler: Optional[ChunkReassembler] = None) -> Optional[str]:
     """
     Handle messages split into chunks.
 
     Args:
         user_id (str): The ID of the user sending the message.
         content (str): The content of the message, potentially split into chunks.
-        user_chunks (dict, optional): A dictionary to store chunks for each user. Defaults to an empty dictionary.
+        reassembler (ChunkReassembler, optional): Buffers the chunks of each user. Defaults to a shared one.
 
     Returns:
         Optional[str]: The complete message when chunks are combined, or None if not yet complete.
+
+    Raises:
+        ReassemblyError: If the chunks can't be combined into the original message.
+    """
+    if reassembler is None:
+        reassembler = DEFAULT_REASSEMBLER
+    return reassembler.add(user_id, content)
+
+def build_cache(cache_config: Optional[dict]) -> Optional[ResponseCache]:
+    """
+    Build a response cache from a model's "cache" configuration entry.
+
+    With SHARED_STATE_URL set, the cache also gets a tier shared by every bot process, unless the
+    entry sets "shared" to False. A "semantic" entry adds a tier matching reworded questions.
+
+    Args:
+        cache_config (Optional[dict]): The cache settings, or None to disable caching.
+
+    Returns:
+        Optional[ResponseCache]: The configured cache, or None if caching is disabled.
+    """
+    if not cache_config:
+        return None
+    return ResponseCache(
+        max_entries=cache_config.get("max_entries", 512),
+        ttl=cache_config.get("ttl"),
+        disk_path=GPT_STATE_DIR / "response_cache.db" if cache_config.get("disk") else None,
+        shared=get_shared_backend() if cache_config.get("shared", True) else None,
+        semantic=build_semantic_cache(cache_config.get("semantic"))
+    )
+
+def build_semantic_cache(semantic_config: Optional[dict]) -> Optional[SemanticCache]:
+    """
+    Build a semantic cache tier from the "semantic" entry of a model's cache configuration.
+
+    Args:
+        semantic_config (Optional[dict]): The semantic cache settings, or None to disable it.
+
+    Returns:
+        Optional[SemanticCache]: The configured tier, or None if it is disabled.
+    """
+    if not semantic_config:
+        return None
+    return SemanticCache(
+        max_entries=semantic_config.get("max_entries", 1024),
+        threshold=semantic_config.get("threshold", 0.9),
+        ttl=semantic_config.get("ttl", 3600),
+        scope=semantic_config.get("scope", "conversation"),
+        embed=build_embedder(semantic_config.get("embedding", "hashing"))
+    )
+
+def build_compactor(
+    compaction_config: Optional[dict], context_budget: Optional[int], model_config: Optional[Dict[str, dict]] = None
+) -> Optional[Compactor]:
+    """
+    Build a conversation compactor from a model's "compaction" configuration entry.
+
+    Args:
+        compaction_config (Optional[dict]): The compaction settings, or None to disable compaction.
+        context_budget (Optional[int]): The model's prompt token budget, which the default trigger derives from.
+        model_config (Optional[Dict[str, dict]]): The configurations the summarizer is looked up in.
+            Defaults to MODEL_CONFIG.
+
+    Returns:
+        Optional[Compactor]: The configured compactor, or None if compaction is disabled.
+    """
+    if not compaction_config:
+        return None
+    trigger_tokens = compaction_config.get("trigger_tokens")
+    if trigger_tokens is None:
+        if not context_budget:
+            raise ValueError("Compaction needs either a trigger_tokens setting or a context_budget")
+        trigger_tokens = int(context_budget * COMPACTION_TRIGGER_RATIO)
+    name = compaction_config["model"]
+    if name not in SUMMARIZERS:
+        # The summarizer answers one-off prompts only, so it needs no cache or compaction of its own
+        summarizer_config = (model_config if model_config is not None else MODEL_CONFIG)[name]
+        SUMMARIZERS[name] = LazyModel(name, {**summarizer_config, "cache": None, "compaction": None})
+    return Compactor(
+        SUMMARIZERS[name],
+        trigger_tokens=trigger_tokens,
+        keep_recent=compaction_config.get("keep_recent", 8),
+        batch_tokens=compaction_config.get("batch_tokens", 8000)
+    )
+
+def forget_summarizers(names: Iterable[str]) -> None:
+    """
+    Drop shared summarizers, e.g. after their configuration changed, so the next compactor built rebuilds them.
+
+    Args:
+        names (Iterable[str]): The summarizers' MODEL_CONFIG names.
+    """
+    for name in names:
+        SUMMARIZERS.pop(name, None)
+
+def build_model(config: dict, model_config: Optional[Dict[str, dict]] = None) -> object:
+    """
+    Build a single model instance from its MODEL_CONFIG entry.
+
+    Args:
+        config (dict): The model's configuration.
+        model_config (Optional[Dict[str, dict]]): All model configurations, for the compaction summarizer.
+            Defaults to MODEL_CONFIG.
+
+    Returns:
+        object: The initialized GPTCompletions or BedrockCompletions instance.
+    """
+    if config["class"] == "GPTCompletions":
+        return GPTCompletions(
+            config["system_prompt"],
+            context_budget=config.get("context_budget"),
+            cache=build_cache(config.get("cache")),
+            compactor=build_compactor(config.get("compaction"), config.get("context_budget"), model_config),
+            prompt_cache=config.get("prompt_cache", False)
+        )
+    elif config["class"] == "BedrockCompletions":
+        return BedrockCompletions(
+            model=config["model"],
+            system_prompt=config["system_prompt"],
+            state_file=config["state_file"],
+            context_budget=config.get("context_budget"),
+            cache=build_cache(config.get("cache")),
+            compactor=build_compactor(config.get("compaction"), config.get("context_budget"), model_config),
+            prompt_cache=config.get("prompt_cache", False)
+        )
+    raise ValueError(f"Unknown model class: {config['class']}")
+
+class LazyModel:
+    def __init__(self, name: str, config: dict, model_config: Optional[Dict[str, dict]] = None) -> None:
+        """
+        A handle that builds its model on first use and forwards attribute access to it.
+
+        Args:
+            name (str): The model's key in MODEL_CONFIG.
+            config (dict): The model's configuration.
+            model_config (Optional[Dict[str, dict]]): All model configurations. Defaults to MODEL_CONFIG.
+        """
+        self.name = name
+        self.config = config
+        self.model_config = model_config
+        self._instance: Optional[object] = None
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self) -> bool:
+        """Whether the underlying model has been built."""
+        return self._instance is not None
+
+    def get(self) -> object:
+        """
+        Return the underlying model, building it if needed. Safe to call from several threads.
+
+        Returns:
+            object: The initialized model instance.
+        """
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = build_model(self.config, self.model_config)
+        return self._instance
+
+    def __getattr__(self, attr: str):
+        return getattr(self.get(), attr)
+
+def warm_up(models: Dict[str, object], max_workers: int = 8) -> None:
+    """
+    Build every lazy model concurrently, so no user request pays for client construction.
+
+    Args:
+        models (Dict[str, object]): The models returned by `initialize_models`.
+        max_workers (int): Maximum number of models built at the same time. Defaults to 8.
+    """
+    lazy = [model for model in models.values() if isinstance(model, LazyModel) and not model.initialized]
+    if not lazy:
+        return
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-init") as executor:
+        futures = {executor.submit(model.get): model for model in lazy}
+        for future, model in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                logger.error("model_warm_up_failed", extra={"fields": {"model": model.name, "reason": str(e)}})
+
+def initialize_models(lazy: bool = True, model_config: Optional[Dict[str, dict]] = None) -> Dict[str, object]:
+    """
+    Initialize models based on the provided configuration.
+
+    Args:
+        lazy (bool): Return handles that build each model on first use instead of building them now.
+            Eager initialization builds all models concurrently. Defaults to True.
+        model_config (Optional[Dict[str, dict]]): The model configurations, e.g. from a ConfigRegistry.
+            Defaults to MODEL_CONFIG.
+
+    Returns:
+        Dict[str, object]: The models keyed by their MODEL_CONFIG name.
     """
-    if user_chunks is None:
-        user_chunks = {}  # Initialize user_chunks if not provided
-
-    if content.startswith("$$START$$"):
-        user_chunks[user_id] = [content.replace("$$START$$", "").strip()]
-    elif content.startswith("$$CONTINUE$$"):
-        if user_id in user_chunks:
-            user_chunks[user_id].append(content.replace("$$CONTINUE$$", "").strip())
-    elif content.startswith("$$END$$"):
-        if user_id in user_chunks:
-            user_chunks[user_id].append(content.replace("$$END$$", "").strip())
-            full_message = " ".join(user_chunks[user_id])
-            del user_chunks[user_id]  # Clear the user's chunk storage
-            return full_message
-
-    return None
-
-def initialize_models() -> Dict[str, object]:
-    """Initialize models based on the provided configuration."""
-    models: Dict[str, object] = {}  # Initialize the models dictionary here
-    for model_name, config in MODEL_CONFIG.items():
-        if config["class"] == "GPTCompletions":
-            models[model_name] = GPTCompletions(config["system_prompt"])
-        elif config["class"] == "BedrockCompletions":
-            models[model_name] = BedrockCompletions(
-                model=config["model"],
-                system_prompt=config["system_prompt"],
-                state_file=config["state_file"]
-            )
-    return models  # Return the initialized models
\ No newline at end of file
+    model_config = model_config if model_config is not None else MODEL_CONFIG
+    models: Dict[str, object] = {
+        model_name: LazyModel(model_name, config, model_config) for model_name, config in model_config.items()
+    }
+    if lazy:
+        return models
+    warm_up(models)
+    return {model_name: model.get() for model_name, model in models.items()}
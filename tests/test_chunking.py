@@ -0,0 +1,156 @@
+"""
+Property tests for the message chunker, on seeded random markdown (prose, fenced code in several
+languages, emoji and CJK text) with both character and byte limits. Run with:
+
+    python -m pytest tests/test_chunking.py
+"""
+import bisect
+import random
+import sys
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from src.utils.chunking import FENCE_CLOSE, FENCE_PATTERN, MessageChunker, iter_chunks
+
+LANGUAGES = ["python", "js", "rust", "", "c++", "bash"]
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "naïve", "café", "😀", "👩‍💻", "漢字", "テスト", "x" * 40]
+# (measure, limit) pairs: Discord counts characters, Slack bytes; small limits split code blocks often
+LIMITS = [("chars", 120), ("chars", 500), ("chars", 1990), ("bytes", 200), ("bytes", 800), ("bytes", 4000)]
+
+
+def random_markdown(rng: random.Random, blocks: int) -> str:
+    parts = []
+    for _ in range(blocks):
+        if rng.random() < 0.3:
+            language = rng.choice(LANGUAGES)
+            lines = ["    " * rng.randint(0, 3) + " ".join(rng.choices(WORDS, k=rng.randint(0, 12)))
+                     for _ in range(rng.randint(1, 60))]
+            parts.append(f"```{language}\n" + "\n".join(lines) + "\n```")
+        else:
+            sentences = [" ".join(rng.choices(WORDS, k=rng.randint(1, 30))) + rng.choice([".", "!", "?", ""])
+                         for _ in range(rng.randint(1, 20))]
+            parts.append(" ".join(sentences))
+    return "\n\n".join(parts)
+
+
+def random_deltas(rng: random.Random, text: str) -> List[str]:
+    deltas, i = [], 0
+    while i < len(text):
+        step = rng.randint(1, 64)
+        deltas.append(text[i:i + step])
+        i += step
+    return deltas
+
+
+def size(text: str, measure: str) -> int:
+    return len(text) if measure == "chars" else len(text.encode("utf-8"))
+
+
+def block_states(text: str) -> Tuple[List[int], List[Optional[str]]]:
+    """Returns the start of every fence in `text` and the open block's language right after each one."""
+    starts, states, language = [], [], None
+    for match in FENCE_PATTERN.finditer(text):
+        language = match.group(1) if language is None else None
+        starts.append(match.start())
+        states.append(language)
+    return starts, states
+
+
+@pytest.fixture(scope="module")
+def documents() -> List[str]:
+    rng = random.Random(0)
+    return [random_markdown(rng, rng.randint(1, 30)) for _ in range(60)]
+
+
+@pytest.mark.parametrize("measure, limit", LIMITS)
+def test_every_chunk_fits_the_limit(documents: List[str], measure: str, limit: int) -> None:
+    for text in documents:
+        for chunk in iter_chunks(text, limit, measure):
+            assert size(chunk, measure) <= limit
+            assert chunk.strip()
+
+
+@pytest.mark.parametrize("measure, limit", LIMITS)
+def test_every_chunk_has_balanced_fences(documents: List[str], measure: str, limit: int) -> None:
+    for text in documents:
+        for chunk in iter_chunks(text, limit, measure):
+            assert len(FENCE_PATTERN.findall(chunk)) % 2 == 0, chunk
+
+
+@pytest.mark.parametrize("measure, limit", LIMITS)
+def test_removing_added_fences_gives_back_the_text(documents: List[str], measure: str, limit: int) -> None:
+    for text in documents:
+        starts, states = block_states(text)
+
+        def open_block(position: int) -> Optional[str]:
+            index = bisect.bisect_left(starts, position)
+            return states[index - 1] if index else None
+
+        # Each chunk, minus the fences the chunker added, must be the next piece of the original text
+        cursor = 0
+        for chunk in iter_chunks(text, limit, measure):
+            while True:
+                body, language = chunk, open_block(cursor)
+                if language is not None and body.startswith(f"```{language}\n"):
+                    body = body[len(f"```{language}\n"):]
+                if text.startswith(body, cursor) and open_block(cursor + len(body)) is None:
+                    break
+                trimmed = body[:-len(FENCE_CLOSE)]
+                if (body.endswith(FENCE_CLOSE) and text.startswith(trimmed, cursor)
+                        and open_block(cursor + len(trimmed)) is not None):
+                    body = trimmed
+                    break
+                # Blank stretches are dropped rather than sent as messages
+                assert cursor < len(text) and text[cursor].isspace(), f"chunk doesn't continue the text: {chunk[:60]!r}"
+                cursor += 1
+            cursor += len(body)
+        assert not text[cursor:].strip(), "text lost at the end"
+
+
+@pytest.mark.parametrize("measure, limit", LIMITS)
+def test_streamed_deltas_give_the_same_chunks_as_the_whole_text(documents: List[str], measure: str, limit: int) -> None:
+    rng = random.Random(limit)
+    for text in documents:
+        whole = list(iter_chunks(text, limit, measure))
+        assert list(iter_chunks(random_deltas(rng, text), limit, measure)) == whole
+        assert list(iter_chunks(list(text[:2000]), limit, measure)) == list(iter_chunks(text[:2000], limit, measure))
+
+
+def test_feed_only_returns_messages_that_will_not_change() -> None:
+    text = random_markdown(random.Random(1), 20)
+    chunker = MessageChunker(300)
+    streamed = []
+    for delta in random_deltas(random.Random(2), text):
+        streamed.extend(chunker.feed(delta))
+    streamed.extend(chunker.close())
+    assert streamed == list(iter_chunks(text, 300))
+
+
+def test_a_continued_code_block_is_reopened_with_its_language() -> None:
+    code = "\n".join(f"print({i})" for i in range(100))
+    chunks = list(iter_chunks(f"Here you go:\n\n```python\n{code}\n```\n\nDone.", 200))
+    assert len(chunks) > 2
+    for chunk in chunks[1:-1]:
+        assert chunk.startswith("```python\n") and chunk.endswith(FENCE_CLOSE)
+
+
+def test_multibyte_characters_are_never_split() -> None:
+    text = "👩‍💻漢字😀" * 400
+    chunks = list(iter_chunks(text, 100, "bytes"))
+    assert all(size(chunk, "bytes") <= 100 for chunk in chunks)
+    assert "".join(chunks) == text
+
+
+def test_blank_text_gives_no_messages() -> None:
+    assert list(iter_chunks("")) == []
+    assert list(iter_chunks(["  ", "\n\n", "\t"])) == []
+
+
+def test_unknown_measure_is_rejected() -> None:
+    with pytest.raises(ValueError):
+        MessageChunker(100, "words")
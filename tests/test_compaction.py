@@ -0,0 +1,80 @@
+"""
+Tests for the conversation compactor's batch boundaries. Run with:
+
+    python -m pytest tests/test_compaction.py
+"""
+import random
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from src.utils.compaction import Compactor
+
+
+class Summarizer:
+    def complete(self, prompt: str) -> str:
+        return "summary"
+
+
+class Session:
+    def __init__(self, messages: List[Dict[str, Any]]) -> None:
+        self.message_history = messages
+        self.context_window = None
+        self.conversation_key = ("test", "channel", "user")
+        self.summary: Optional[Dict[str, Any]] = None
+        self.generation = 0
+        self.applied: List[int] = []
+
+    def summary_start(self) -> int:
+        return self.summary["upto"] if self.summary else 0
+
+    def apply_summary(self, summary: Dict[str, Any], generation: int) -> bool:
+        self.summary = summary
+        self.applied.append(summary["upto"])
+        return True
+
+
+def conversation(rng: random.Random, turns: int) -> List[Dict[str, Any]]:
+    messages = []
+    for _ in range(turns):
+        messages.append({"role": "user", "content": "question " * rng.randint(1, 200)})
+        # Some turns have several assistant messages, e.g. a reply resumed after an interruption
+        for _ in range(rng.choice([1, 1, 1, 2])):
+            messages.append({"role": "assistant", "content": "answer " * rng.randint(1, 600)})
+    return messages
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_every_summary_ends_just_before_a_user_message(seed: int) -> None:
+    rng = random.Random(seed)
+    session = Session(conversation(rng, rng.randint(10, 40)))
+    compactor = Compactor(Summarizer(), trigger_tokens=1000, keep_recent=4, batch_tokens=rng.choice([300, 1000, 3000]))
+    try:
+        future = compactor.maybe_compact(session)
+        assert future is not None and future.result()
+    finally:
+        compactor._executor.shutdown(wait=True)
+    assert session.applied
+    for upto in session.applied:
+        assert session.message_history[upto]["role"] == "user"
+
+
+def test_a_turn_over_the_batch_limit_is_summarized_alone() -> None:
+    messages = [
+        {"role": "user", "content": "short"},
+        {"role": "assistant", "content": "word " * 2000},
+        {"role": "user", "content": "short"},
+        {"role": "assistant", "content": "short"},
+    ] * 3
+    session = Session(messages)
+    compactor = Compactor(Summarizer(), trigger_tokens=100, keep_recent=2, batch_tokens=500)
+    try:
+        assert compactor.maybe_compact(session).result()
+    finally:
+        compactor._executor.shutdown(wait=True)
+    assert session.applied == [2, 4, 6, 8, 10]
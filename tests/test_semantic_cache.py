@@ -0,0 +1,70 @@
+"""
+Tests for the semantic response cache: reworded questions reuse a reply, while negated questions and
+questions that differ only in their numbers never do. Run with:
+
+    python -m pytest tests/test_semantic_cache.py
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from src.utils.semantic_cache import SemanticCache, exact_terms
+
+
+def request(question: str) -> dict:
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": question},
+        ],
+        "temperature": 0,
+    }
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("Is it safe to delete the production database?", "Is it not safe to delete the production database?"),
+    ("Is it safe to delete the production database?", "Isn't it safe to delete the production database?"),
+    ("Should I run the migration now?", "Should I never run the migration now?"),
+    ("How do I reverse a list in Python?", "How do I reverse a list in Python without slicing?"),
+    ("Can I restart the server during the deploy?", "I cannot restart the server during the deploy?"),
+])
+def test_negated_questions_never_share_a_reply(cached: str, asked: str) -> None:
+    cache = SemanticCache(scope="prompt")
+    cache.put(request(cached), "cached reply")
+    assert cache.get(request(asked)) is None
+    assert cache.get(request(cached)) == "cached reply"
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("What is 15% of 200?", "What is 25% of 200?"),
+    ("Explain string handling in Python 2", "Explain string handling in Python 3"),
+    ("How do I keep the last 10 lines of a log file?", "How do I keep the last 100 lines of a log file?"),
+    ("Convert 3.5 hours to minutes", "Convert 5.3 hours to minutes"),
+    ("What is 2 to the power of 8?", "What is 8 to the power of 2?"),
+])
+def test_questions_with_other_numbers_never_share_a_reply(cached: str, asked: str) -> None:
+    cache = SemanticCache(scope="prompt")
+    cache.put(request(cached), "cached reply")
+    assert cache.get(request(asked)) is None
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("How do I reverse a list in Python?", "how can I reverse a list in python??"),
+    ("Is it not safe to delete the production database?", "is it NOT safe to delete the production database"),
+    ("How do I keep the last 10 lines of a log file?", "How to keep the last 10 lines of a log file"),
+])
+def test_reworded_questions_share_a_reply(cached: str, asked: str) -> None:
+    cache = SemanticCache(scope="prompt")
+    cache.put(request(cached), "cached reply")
+    assert cache.get(request(asked)) == "cached reply"
+
+
+def test_exact_terms_count_negations_and_keep_numbers_in_order() -> None:
+    assert exact_terms("Is it safe to delete 3 of the 12 tables?") == ("0", "3", "12")
+    assert exact_terms("It isn't safe and I can't, so no.") == ("3",)
+    assert exact_terms("Isn’t 2.5 bigger than 2,000?") == ("1", "2.5", "2,000")